@@ -3,6 +3,40 @@ hedwig
 ~~~~~~~~
 """
 
-
 # semantic versioning (http://semver.org/)
 VERSION = '9.0.2-dev'
+
+
+def warmup() -> None:
+    """
+    Does the one-time work that's otherwise paid for by the first message: imports logging and instrumentation
+    libraries, loads settings, validator and callbacks, and creates configured publisher and consumer backends along
+    with their clients. Call this during initialization, e.g. at module level of a Lambda function so it runs during the
+    init phase.
+
+    Importing :mod:`hedwig` doesn't import any of these, so this is the only place where they're loaded eagerly.
+    """
+    from hedwig.backends.utils import get_consumer_backend, get_publisher_backend
+    from hedwig.callback import _callbacks
+    from hedwig.conf import settings
+    from hedwig.models import _validator
+    from hedwig.utils import _import_structlog
+
+    _import_structlog()
+    try:
+        import hedwig.instrumentation  # noqa
+    except ImportError:
+        pass
+
+    _validator()
+    _callbacks()
+    # side-effect: resolves import strings
+    _ = settings.HEDWIG_DEFAULT_HEADERS, settings.HEDWIG_PRE_PROCESS_HOOK, settings.HEDWIG_POST_PROCESS_HOOK
+
+    if settings.HEDWIG_SYNC:
+        # messages are dispatched to the consumer backend in-process
+        return
+    if settings._is_set('HEDWIG_PUBLISHER_BACKEND'):
+        get_publisher_backend().warmup()
+    if settings._is_set('HEDWIG_CONSUMER_BACKEND'):
+        get_consumer_backend().warmup()
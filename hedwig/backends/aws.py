@@ -1,54 +1,190 @@
+import asyncio
 import base64
+import collections
 import dataclasses
+import importlib
 import logging
+import math
 import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime, timezone
 from time import time
-from typing import cast, Optional, Generator, List, Union, Dict, Iterator
-from unittest import mock
+from typing import (
+    cast,
+    Any,
+    Optional,
+    Generator,
+    List,
+    Union,
+    Dict,
+    Iterator,
+    NamedTuple,
+    Deque,
+    Callable,
+    TypeVar,
+    Tuple,
+    TYPE_CHECKING,
+)
 
-import boto3
 import funcy
-from botocore.config import Config
+from botocore.exceptions import ClientError
 from retrying import retry
 
 from hedwig.backends.base import HedwigConsumerBaseBackend, HedwigPublisherBaseBackend
-from hedwig.backends.exceptions import PartialFailure
+from hedwig.backends.exceptions import PublishBatchEntryFailure
+from hedwig.backends.redrive import RedriveProgress
 from hedwig.conf import settings
-from hedwig.models import Message
-from hedwig.utils import log
+from hedwig.models import Message, _validator
+from hedwig.utils import dataclass_slots, log
+from hedwig.validators.base import MetaAttributes
+
+if TYPE_CHECKING:  # pragma: no cover
+    from unittest import mock
+
+
+class _LazyModule:
+    """
+    Stands in for a module that's slow to import, and imports it on first attribute access
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(importlib.import_module(self._name), name)
+
+    def __dir__(self) -> List[str]:
+        # lets the module be auto-specced, e.g. by `mock.patch(..., autospec=True)`
+        return dir(importlib.import_module(self._name))
+
+
+# boto3 is slow to import, so it's only imported once a client is created. It's still an attribute of this module, so it
+# may be patched in tests.
+boto3: Any = _LazyModule('boto3')
+
+
+def _epoch_ms_to_datetime(value: Union[datetime, int]) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
 
 
-@dataclasses.dataclass(frozen=True)
 class AWSMetadata:
     """
-    AWS specific metadata for a Message
+    AWS specific metadata for a Message. Times may be passed as datetimes or as epoch milliseconds, which are only
+    converted to datetimes when read.
     """
 
+    __slots__ = ('receipt', '_first_receive_time', '_sent_time', 'receive_count')
+
     receipt: str
     """
     AWS receipt identifier
     """
 
-    first_receive_time: datetime
+    receive_count: int
     """
-    The time the message was first received from the queue. The value
+    The receive count received from SQS.
+    The first delivery of a given message will have this value as 1. The value
     is calculated as best effort and is approximate.
     """
 
-    sent_time: datetime
+    def __init__(
+        self,
+        receipt: str,
+        first_receive_time: Union[datetime, int],
+        sent_time: Union[datetime, int],
+        receive_count: int,
+    ) -> None:
+        self.receipt = receipt
+        self._first_receive_time = first_receive_time
+        self._sent_time = sent_time
+        self.receive_count = receive_count
+
+    @property
+    def first_receive_time(self) -> datetime:
+        """
+        The time the message was first received from the queue. The value
+        is calculated as best effort and is approximate.
+        """
+        return _epoch_ms_to_datetime(self._first_receive_time)
+
+    @property
+    def sent_time(self) -> datetime:
+        """
+        Time this message was originally sent to AWS
+        """
+        return _epoch_ms_to_datetime(self._sent_time)
+
+    def _astuple(self) -> Tuple[str, datetime, datetime, int]:
+        return self.receipt, self.first_receive_time, self.sent_time, self.receive_count
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, AWSMetadata):
+            return NotImplemented
+        return self._astuple() == other._astuple()
+
+    def __hash__(self) -> int:
+        return hash(self._astuple())
+
+    def __repr__(self) -> str:
+        return (
+            f'AWSMetadata(receipt={self.receipt!r}, first_receive_time={self.first_receive_time!r}, '
+            f'sent_time={self.sent_time!r}, receive_count={self.receive_count!r})'
+        )
+
+
+@dataclass_slots
+@dataclasses.dataclass
+class SQSMessage:
     """
-    Time this message was originally sent to AWS
+    A message received from SQS by :class:`AWSSQSConsumerBackend`. Attribute names match ``boto3`` SQS ``Message``
+    resources, but only the system attributes Hedwig needs, plus those configured in
+    ``HEDWIG_CONSUMER_AWS_ATTRIBUTE_NAMES``, are fetched.
     """
 
-    receive_count: int
+    queue_url: str
+    message_id: str
+    receipt_handle: str
+    body: str
+    attributes: Dict[str, str]
     """
-    The receive count received from SQS.
-    The first delivery of a given message will have this value as 1. The value
-    is calculated as best effort and is approximate.
+    SQS message system attributes
+    """
+    message_attributes: Dict[str, Dict[str, str]]
+    """
+    SQS message attributes, in the format returned by SQS, e.g. ``{'key': {'DataType': 'String', 'StringValue': 'value'}}``
     """
 
+    @classmethod
+    def _from_response(cls, queue_url: str, message: dict) -> 'SQSMessage':
+        return cls(
+            queue_url,
+            message['MessageId'],
+            message['ReceiptHandle'],
+            message['Body'],
+            message.get('Attributes') or {},
+            message.get('MessageAttributes') or {},
+        )
+
+    @classmethod
+    def _from_lambda_record(cls, record: dict) -> 'SQSMessage':
+        _, _, _, region, account_id, queue_name = record['eventSourceARN'].split(':')
+        return cls(
+            f'https://sqs.{region}.amazonaws.com/{account_id}/{queue_name}',
+            record['messageId'],
+            record['receiptHandle'],
+            record['body'],
+            record.get('attributes') or {},
+            # Lambda events use camel case keys, e.g. `stringValue` instead of `StringValue`
+            {
+                name: {key[0].upper() + key[1:]: value for key, value in o.items() if not key.endswith('ListValues')}
+                for name, o in (record.get('messageAttributes') or {}).items()
+            },
+        )
+
 
 class AWSSNSPublisherBackend(HedwigPublisherBaseBackend):
     def __init__(self):
@@ -57,6 +193,8 @@ class AWSSNSPublisherBackend(HedwigPublisherBaseBackend):
     @property
     def sns_client(self):
         if self._sns_client is None:
+            from botocore.config import Config
+
             config = Config(connect_timeout=settings.AWS_CONNECT_TIMEOUT_S, read_timeout=settings.AWS_READ_TIMEOUT_S)
             self._sns_client = boto3.client(
                 'sns',
@@ -69,6 +207,9 @@ class AWSSNSPublisherBackend(HedwigPublisherBaseBackend):
             )
         return self._sns_client
 
+    def warmup(self) -> None:
+        _ = self.sns_client
+
     @classmethod
     def _get_sns_topic(cls, message: Message) -> str:
         topic = cls.topic(message)
@@ -78,16 +219,21 @@ class AWSSNSPublisherBackend(HedwigPublisherBaseBackend):
             account_id = settings.AWS_ACCOUNT_ID
         return f'arn:aws:sns:{settings.AWS_REGION}:{account_id}:hedwig-{topic}'
 
+    @staticmethod
+    def _message_attributes(attributes: Dict[str, str]) -> Dict[str, Dict[str, str]]:
+        return {str(k): {'DataType': 'String', 'StringValue': str(v)} for k, v in attributes.items()}
+
     @retry(stop_max_attempt_number=3, stop_max_delay=3000)
-    def _publish_over_sns(self, topic: str, message_payload: str, attributes: Dict[str, str]) -> str:
+    def _publish_over_sns(self, topic: str, message_payload: str, attributes: Dict[str, str]) -> Union[str, Future]:
         # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/sns.html#SNS.Topic.publish
-        message_attributes = {str(k): {'DataType': 'String', 'StringValue': str(v)} for k, v in attributes.items()}
         response = self.sns_client.publish(
-            TopicArn=topic, Message=message_payload, MessageAttributes=message_attributes
+            TopicArn=topic, Message=message_payload, MessageAttributes=self._message_attributes(attributes)
         )
         return response['MessageId']
 
-    def _mock_queue_message(self, message: Message) -> mock.Mock:
+    def _mock_queue_message(self, message: Message) -> 'mock.Mock':
+        from unittest import mock
+
         sqs_message = mock.Mock()
         payload, attributes = message.serialize()
         # SQS requires UTF-8 encoded string
@@ -106,7 +252,7 @@ class AWSSNSPublisherBackend(HedwigPublisherBaseBackend):
         sqs_message.receipt_handle = 'test-receipt'
         return sqs_message
 
-    def _publish(self, message: Message, payload: Union[str, bytes], attributes: Dict[str, str]) -> str:
+    def _publish(self, message: Message, payload: Union[str, bytes], attributes: Dict[str, str]) -> Union[str, Future]:
         topic = self._get_sns_topic(message)
         # SNS requires UTF-8 encoded string
         if isinstance(payload, bytes):
@@ -115,26 +261,230 @@ class AWSSNSPublisherBackend(HedwigPublisherBaseBackend):
         return self._publish_over_sns(topic, payload, attributes)
 
 
+class BatchSettings(NamedTuple):
+    """
+    Batching configuration for :class:`AWSSNSAsyncPublisherBackend`. Defaults to the limits of SNS PublishBatch API.
+    """
+
+    max_messages: int = 10
+    """
+    Maximum number of messages in a batch
+    """
+
+    max_bytes: int = 256 * 1024
+    """
+    Maximum total size of a batch in bytes, including message attributes
+    """
+
+    max_latency: float = 0.01
+    """
+    Maximum number of seconds a message may wait in a batch before it's published
+    """
+
+
+class _Batch:
+    def __init__(self, topic: str) -> None:
+        self.topic = topic
+        self.entries: List[dict] = []
+        self.futures: List[Future] = []
+        self.size = 0
+        self.created = time()
+
+    def add(self, entry: dict, size: int, future: Future) -> None:
+        self.entries.append(entry)
+        self.futures.append(future)
+        self.size += size
+
+
+class AWSSNSAsyncPublisherBackend(AWSSNSPublisherBackend):
+    """
+    A publisher that buffers messages per topic and publishes them using SNS PublishBatch API from a background
+    thread. Batches are published when they're full, or when the oldest message has waited for `max_latency` seconds.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.batch_settings = BatchSettings(*settings.HEDWIG_PUBLISHER_AWS_BATCH_SETTINGS)
+        self._batches: Dict[str, _Batch] = {}
+        self._ready: Deque[_Batch] = deque()
+        self._condition = threading.Condition()
+        self._flush_thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _entry_size(message_payload: str, attributes: Dict[str, str]) -> int:
+        # SNS counts message body as well as attribute names, types and values towards the size limit
+        return len(message_payload.encode('utf8')) + sum(
+            len(str(k).encode('utf8')) + len(str(v).encode('utf8')) + len('String') for k, v in attributes.items()
+        )
+
+    def _seal(self, batch: _Batch) -> None:
+        # must be called with lock held
+        if self._batches.get(batch.topic) is batch:
+            del self._batches[batch.topic]
+        self._ready.append(batch)
+
+    def _publish_over_sns(self, topic: str, message_payload: str, attributes: Dict[str, str]) -> Union[str, Future]:
+        entry = {'Message': message_payload, 'MessageAttributes': self._message_attributes(attributes)}
+        size = self._entry_size(message_payload, attributes)
+        future: Future = Future()
+        with self._condition:
+            if self._flush_thread is None:
+                self._flush_thread = threading.Thread(target=self._flush_loop, name='hedwig-sns-publisher', daemon=True)
+                self._flush_thread.start()
+            batch = self._batches.get(topic)
+            if batch is not None and batch.size + size > self.batch_settings.max_bytes:
+                self._seal(batch)
+                batch = None
+            if batch is None:
+                batch = self._batches[topic] = _Batch(topic)
+            batch.add(entry, size, future)
+            if len(batch.entries) >= self.batch_settings.max_messages:
+                self._seal(batch)
+            self._condition.notify()
+        return future
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    now = time()
+                    for batch in list(self._batches.values()):
+                        if now - batch.created >= self.batch_settings.max_latency:
+                            self._seal(batch)
+                    if self._ready:
+                        break
+                    timeout = None
+                    if self._batches:
+                        timeout = min(b.created for b in self._batches.values()) + self.batch_settings.max_latency - now
+                    self._condition.wait(timeout)
+                batches = list(self._ready)
+                self._ready.clear()
+            for batch in batches:
+                try:
+                    self._commit(batch)
+                except Exception as e:
+                    # keep the thread alive, otherwise later messages are never published
+                    log(__name__, logging.ERROR, 'Exception in publisher thread', exc_info=True)
+                    for future in batch.futures:
+                        if not future.done():
+                            future.set_exception(e)
+
+    def flush(self) -> None:
+        """
+        Publishes all pending messages immediately from the calling thread.
+        """
+        with self._condition:
+            for batch in list(self._batches.values()):
+                self._seal(batch)
+            batches = list(self._ready)
+            self._ready.clear()
+        for batch in batches:
+            self._commit(batch)
+
+    @retry(stop_max_attempt_number=3, stop_max_delay=3000)
+    def _publish_batch_over_sns(self, topic: str, entries: List[dict]) -> dict:
+        # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/sns.html#SNS.Client.publish_batch
+        return self.sns_client.publish_batch(TopicArn=topic, PublishBatchRequestEntries=entries)
+
+    def _commit(self, batch: _Batch) -> None:
+        # messages cancelled while buffered, e.g. on timeout in `publish_async`, aren't published. Futures can't be
+        # cancelled once running.
+        pending = [(e, f) for e, f in zip(batch.entries, batch.futures) if f.set_running_or_notify_cancel()]
+        if not pending:
+            return
+        entries = [{'Id': str(i), **entry} for i, (entry, _) in enumerate(pending)]
+        futures = [future for _, future in pending]
+        try:
+            response = self._publish_batch_over_sns(batch.topic, entries)
+        except Exception as e:
+            log(__name__, logging.ERROR, 'Exception while publishing batch', exc_info=True)
+            for future in futures:
+                future.set_exception(e)
+            return
+        for success in response.get('Successful', []):
+            futures[int(success['Id'])].set_result(success['MessageId'])
+        # only the failed entries should fail, rest of the batch was published successfully
+        for failure in response.get('Failed', []):
+            futures[int(failure['Id'])].set_exception(PublishBatchEntryFailure(failure))
+
+
+T = TypeVar('T')
+
+
+def _is_queue_does_not_exist(error: ClientError) -> bool:
+    return error.response.get('Error', {}).get('Code') in (
+        'AWS.SimpleQueueService.NonExistentQueue',
+        'QueueDoesNotExist',
+    )
+
+
+class AckBatchSettings(NamedTuple):
+    """
+    Batching configuration for acknowledgements in :class:`AWSSQSConsumerBackend`. Defaults to the limits of SQS
+    DeleteMessageBatch API.
+    """
+
+    max_messages: int = 10
+    """
+    Maximum number of acknowledgements in a batch
+    """
+
+    max_latency: float = 1.0
+    """
+    Maximum number of seconds an acknowledgement may be buffered before it's sent
+    """
+
+
+class LeaseSettings(NamedTuple):
+    """
+    Configuration for automatic visibility timeout extension of in-flight messages in :class:`AWSSQSConsumerBackend`.
+    """
+
+    extend_after_ratio: float = 0.5
+    """
+    Fraction of the visibility timeout after which visibility of in-flight messages is extended
+    """
+
+    max_lease_s: int = 43200
+    """
+    Maximum number of seconds a message is kept in-flight. Defaults to the SQS limit of 12 hours.
+    """
+
+
 class AWSSQSConsumerBackend(HedwigConsumerBaseBackend):
     WAIT_TIME_SECONDS = 20
+    # system attributes read by Hedwig
+    ATTRIBUTE_NAMES = ('ApproximateFirstReceiveTimestamp', 'SentTimestamp', 'ApproximateReceiveCount')
 
     def __init__(self, dlq=False):
-        self._sqs_resource = None
         self._sqs_client = None
         self.queue_name = f'HEDWIG-{settings.HEDWIG_QUEUE}{"-DLQ" if dlq else ""}'
-
-    @property
-    def sqs_resource(self):
-        if self._sqs_resource is None:
-            self._sqs_resource = boto3.resource(
-                'sqs',
-                region_name=settings.AWS_REGION,
-                aws_access_key_id=settings.AWS_ACCESS_KEY,
-                aws_secret_access_key=settings.AWS_SECRET_KEY,
-                aws_session_token=settings.AWS_SESSION_TOKEN,
-                endpoint_url=settings.AWS_ENDPOINT_SQS,
-            )
-        return self._sqs_resource
+        self._queue_url: Optional[str] = None
+        self._queue_visibility_timeout_s: Optional[int] = None
+        self._main_queue_url: Optional[str] = None
+        self._attribute_names = list(
+            dict.fromkeys((*self.ATTRIBUTE_NAMES, *settings.HEDWIG_CONSUMER_AWS_ATTRIBUTE_NAMES))
+        )
+        # number of SQS API calls made by this backend, by operation name. Compare with `messages_processed` to find
+        # API calls per message.
+        self.api_calls: Dict[str, int] = collections.Counter()
+        self.ack_batch_settings: Optional[AckBatchSettings] = None
+        if settings.HEDWIG_CONSUMER_AWS_ACK_BATCH_SETTINGS is not None:
+            self.ack_batch_settings = AckBatchSettings(*settings.HEDWIG_CONSUMER_AWS_ACK_BATCH_SETTINGS)
+        self._acks: List = []
+        self._acks_lock = threading.Lock()
+        self._acks_timer: Optional[threading.Timer] = None
+        # number of API calls saved by batching acknowledgements
+        self.ack_api_calls_saved = 0
+        self.lease_settings: Optional[LeaseSettings] = None
+        if settings.HEDWIG_CONSUMER_AWS_LEASE_SETTINGS is not None:
+            self.lease_settings = LeaseSettings(*settings.HEDWIG_CONSUMER_AWS_LEASE_SETTINGS)
+        # in-flight messages by receipt handle, with the time they were received
+        self._leases: Dict[str, Tuple[object, float]] = {}
+        self._leases_lock = threading.Lock()
+        self._lease_visibility_timeout_s: Optional[int] = None
+        self._lease_thread: Optional[threading.Thread] = None
+        self._lease_stop = threading.Event()
 
     @property
     def sqs_client(self):
@@ -147,13 +497,58 @@ class AWSSQSConsumerBackend(HedwigConsumerBaseBackend):
                 aws_session_token=settings.AWS_SESSION_TOKEN,
                 endpoint_url=settings.AWS_ENDPOINT_SQS,
             )
+            self._sqs_client.meta.events.register('before-call.sqs', self._count_api_call)
         return self._sqs_client
 
-    def _get_queue(self):
-        return self.sqs_resource.get_queue_by_name(QueueName=self.queue_name)
+    def warmup(self) -> None:
+        _ = self.sqs_client
+
+    def _count_api_call(self, model, **kwargs) -> None:
+        self.api_calls[model.name] += 1
+
+    def _get_queue_url(self) -> str:
+        if self._queue_url is None:
+            self._queue_url = self.sqs_client.get_queue_url(QueueName=self.queue_name)['QueueUrl']
+        return cast(str, self._queue_url)
+
+    def _get_queue_visibility_timeout(self) -> int:
+        if self._queue_visibility_timeout_s is None:
+            attributes = self.sqs_client.get_queue_attributes(
+                QueueUrl=self._get_queue_url(), AttributeNames=['VisibilityTimeout']
+            )['Attributes']
+            self._queue_visibility_timeout_s = int(attributes['VisibilityTimeout'])
+        return cast(int, self._queue_visibility_timeout_s)
+
+    def _get_main_queue_url(self) -> str:
+        if self._main_queue_url is None:
+            self._main_queue_url = self.sqs_client.get_queue_url(QueueName=f'HEDWIG-{settings.HEDWIG_QUEUE}')[
+                'QueueUrl'
+            ]
+        return cast(str, self._main_queue_url)
+
+    def _refresh_queues(self) -> None:
+        self._queue_url = None
+        self._queue_visibility_timeout_s = None
+        self._main_queue_url = None
+
+    def _call_with_queue_refresh(self, fn: Callable[[], T]) -> T:
+        """
+        Calls fn, and if the queue isn't found, e.g. because it was re-created, resolves the queue again and retries.
+        """
+        try:
+            return fn()
+        except ClientError as e:
+            if not _is_queue_does_not_exist(e):
+                raise
+            log(__name__, logging.INFO, 'Queue not found, resolving queue again', extra={'queue_name': self.queue_name})
+            self._refresh_queues()
+            return fn()
 
     def pull_messages(
-        self, num_messages: int = 10, visibility_timeout: int = None, shutdown_event: Optional[threading.Event] = None
+        self,
+        num_messages: int = 10,
+        visibility_timeout: Optional[int] = None,
+        shutdown_event: Optional[threading.Event] = None,
     ) -> Union[Generator, List]:
         """
 
@@ -162,95 +557,307 @@ class AWSSQSConsumerBackend(HedwigConsumerBaseBackend):
         :param visibility_timeout:
         :return:
         """
+        wait_time_s = self.WAIT_TIME_SECONDS
+        batch_due_in_s = self._batch_due_in_s()
+        if batch_due_in_s is not None:
+            # return in time for the consumer loop to process pending batches
+            wait_time_s = min(wait_time_s, math.ceil(batch_due_in_s))
         params = {
             'MaxNumberOfMessages': num_messages,
-            'WaitTimeSeconds': self.WAIT_TIME_SECONDS,
-            'AttributeNames': ['All'],
+            'WaitTimeSeconds': wait_time_s,
+            'AttributeNames': self._attribute_names,
             'MessageAttributeNames': ['All'],
         }
         if visibility_timeout is not None:
             params['VisibilityTimeout'] = visibility_timeout
-        return self._get_queue().receive_messages(**params)
+        queue_messages = self._call_with_queue_refresh(lambda: self._receive_messages(params))
+        if self.lease_settings is not None:
+            self._lease(queue_messages, visibility_timeout)
+        return queue_messages
+
+    def _receive_messages(self, params: dict) -> List[SQSMessage]:
+        queue_url = self._get_queue_url()
+        response = self.sqs_client.receive_message(QueueUrl=queue_url, **params)
+        return [SQSMessage._from_response(queue_url, message) for message in response.get('Messages', [])]
+
+    def _lease(self, queue_messages: List, visibility_timeout: Optional[int]) -> None:
+        if visibility_timeout is None:
+            visibility_timeout = self._get_queue_visibility_timeout()
+        self._lease_visibility_timeout_s = visibility_timeout
+        now = time()
+        with self._leases_lock:
+            for queue_message in queue_messages:
+                self._leases[queue_message.receipt_handle] = (queue_message, now)
+        if self._lease_thread is None:
+            self._lease_thread = threading.Thread(target=self._lease_loop, name='hedwig-sqs-lease', daemon=True)
+            self._lease_thread.start()
+
+    def _release(self, queue_message) -> None:
+        with self._leases_lock:
+            self._leases.pop(queue_message.receipt_handle, None)
+
+    def _lease_loop(self) -> None:
+        assert self.lease_settings is not None
+        while not self._lease_stop.wait(
+            max(cast(int, self._lease_visibility_timeout_s) * self.lease_settings.extend_after_ratio, 1)
+        ):
+            try:
+                self.extend_leases()
+            except Exception:
+                log(__name__, logging.ERROR, 'Exception while extending visibility timeout', exc_info=True)
+
+    def _stop_leasing(self) -> None:
+        """
+        Stops the lease thread once messages are no longer processed, e.g. on shutdown
+        """
+        if self._lease_thread is None:
+            return
+        self._lease_stop.set()
+        self._lease_thread.join()
+        self._lease_thread = None
+        # leasing restarts with the next pull
+        self._lease_stop = threading.Event()
+        with self._leases_lock:
+            self._leases.clear()
+
+    def fetch_and_process_messages(self, *args, **kwargs) -> None:
+        try:
+            super().fetch_and_process_messages(*args, **kwargs)
+        finally:
+            self._stop_leasing()
 
-    def process_message(self, queue_message) -> None:
+    async def fetch_and_process_messages_async(self, *args, **kwargs) -> None:
+        try:
+            await super().fetch_and_process_messages_async(*args, **kwargs)
+        finally:
+            await asyncio.get_event_loop().run_in_executor(None, self._stop_leasing)
+
+    def requeue_dead_letter(self, *args, **kwargs) -> RedriveProgress:
+        try:
+            return super().requeue_dead_letter(*args, **kwargs)
+        finally:
+            self._stop_leasing()
+
+    def extend_leases(self) -> None:
+        """
+        Extends visibility timeout of all in-flight messages, one ChangeMessageVisibilityBatch call per 10 messages.
+        """
+        assert self.lease_settings is not None
+        visibility_timeout_s = cast(int, self._lease_visibility_timeout_s)
+        expire_before = time() - self.lease_settings.max_lease_s
+        with self._leases_lock:
+            for receipt in [r for r, (_, received) in self._leases.items() if received < expire_before]:
+                del self._leases[receipt]
+            receipts = list(self._leases)
+        for chunk in funcy.chunks(10, receipts):
+            entries = {str(i): receipt for i, receipt in enumerate(chunk)}
+            result = self._call_with_queue_refresh(
+                lambda: self.sqs_client.change_message_visibility_batch(
+                    QueueUrl=self._get_queue_url(),
+                    Entries=[
+                        {'Id': k, 'ReceiptHandle': receipt, 'VisibilityTimeout': visibility_timeout_s}
+                        for k, receipt in entries.items()
+                    ],
+                )
+            )
+            for failure in result.get('Failed') or []:
+                log(
+                    __name__,
+                    logging.WARNING,
+                    'Failed to extend visibility timeout',
+                    extra={'receipt': entries[failure['Id']], 'failure': failure},
+                )
+                with self._leases_lock:
+                    self._leases.pop(entries[failure['Id']], None)
+
+    @staticmethod
+    def _message_handler_args(queue_message) -> Tuple[Union[str, bytes], Dict[str, str], AWSMetadata]:
         attributes = {k: o['StringValue'] for k, o in (queue_message.message_attributes or {}).items()}
         # body is always UTF-8 string
         message_payload = queue_message.body
         if attributes.get("hedwig_encoding") == "base64":
             message_payload = base64.decodebytes(message_payload.encode())
         receipt = queue_message.receipt_handle
-        self.message_handler(
+        return (
             message_payload,
             attributes,
             AWSMetadata(
                 receipt,
-                datetime.fromtimestamp(
-                    int(queue_message.attributes['ApproximateFirstReceiveTimestamp']) / 1000, tz=timezone.utc
-                ),
-                datetime.fromtimestamp(int(queue_message.attributes['SentTimestamp']) / 1000, tz=timezone.utc),
+                int(queue_message.attributes['ApproximateFirstReceiveTimestamp']),
+                int(queue_message.attributes['SentTimestamp']),
                 int(queue_message.attributes['ApproximateReceiveCount']),
             ),
         )
 
+    def process_message(self, queue_message) -> None:
+        self.message_handler(*self._message_handler_args(queue_message))
+
+    async def process_message_async(self, queue_message) -> None:
+        await self.message_handler_async(*self._message_handler_args(queue_message))
+
     def ack_message(self, queue_message) -> None:
-        queue_message.delete()
+        self._release(queue_message)
+        if self.ack_batch_settings is None:
+            self.sqs_client.delete_message(QueueUrl=queue_message.queue_url, ReceiptHandle=queue_message.receipt_handle)
+            return
+
+        with self._acks_lock:
+            self._acks.append(queue_message)
+            if len(self._acks) >= self.ack_batch_settings.max_messages:
+                acks = self._take_acks()
+            else:
+                acks = []
+                if self._acks_timer is None:
+                    self._acks_timer = threading.Timer(self.ack_batch_settings.max_latency, self.flush_acks)
+                    self._acks_timer.daemon = True
+                    self._acks_timer.start()
+        if acks:
+            self._delete_messages(acks)
+
+    def _take_acks(self) -> List:
+        # must be called with lock held
+        acks, self._acks = self._acks, []
+        if self._acks_timer is not None:
+            self._acks_timer.cancel()
+            self._acks_timer = None
+        return acks
+
+    def flush_acks(self) -> None:
+        if self.ack_batch_settings is None:
+            return
+        with self._acks_lock:
+            acks = self._take_acks()
+        if acks:
+            self._delete_messages(acks)
+
+    def _delete_messages(self, queue_messages: List) -> None:
+        max_messages = self.ack_batch_settings.max_messages if self.ack_batch_settings else 10
+        # all messages come from the same queue
+        queue_url = queue_messages[0].queue_url
+        for chunk in funcy.chunks(max_messages, queue_messages):
+            self._delete_message_batch(queue_url, chunk)
+
+    def _delete_message_batch(self, queue_url: str, queue_messages: List) -> None:
+        entries = {str(i): queue_message for i, queue_message in enumerate(queue_messages)}
+        deleted = 0
+        # retry failures that aren't the caller's fault once, e.g. throttling
+        for attempt in range(2):
+            try:
+                result = self.sqs_client.delete_message_batch(
+                    QueueUrl=queue_url,
+                    Entries=[{'Id': k, 'ReceiptHandle': m.receipt_handle} for k, m in entries.items()],
+                )
+            except Exception:
+                log(__name__, logging.ERROR, 'Exception while deleting messages', exc_info=True)
+                break
+
+            failed = result.get('Failed') or []
+            deleted += len(entries) - len(failed)
+            retryable = {f['Id']: entries[f['Id']] for f in failed if not f.get('SenderFault') and attempt == 0}
+            for failure in failed:
+                if failure['Id'] not in retryable:
+                    log(
+                        __name__,
+                        logging.ERROR,
+                        'Failed to delete message',
+                        extra={'queue_message': entries[failure['Id']], 'failure': failure},
+                    )
+            if not retryable:
+                break
+            entries = retryable
+        # one delete_message call per message would've been needed without batching
+        self.ack_api_calls_saved += max(deleted - 1, 0)
 
     def nack_message(self, queue_message) -> None:
         # let visibility timeout take care of it
-        pass
+        self._release(queue_message)
 
     def extend_visibility_timeout(self, visibility_timeout_s: int, metadata: AWSMetadata) -> None:
         """
         Extends visibility timeout of a message on a given priority queue for long running tasks.
         """
         receipt = metadata.receipt
-        queue_url = self.sqs_client.get_queue_url(QueueName=self.queue_name)['QueueUrl']
-        self.sqs_client.change_message_visibility(
-            QueueUrl=queue_url, ReceiptHandle=receipt, VisibilityTimeout=visibility_timeout_s
+        self._call_with_queue_refresh(
+            lambda: self.sqs_client.change_message_visibility(
+                QueueUrl=self._get_queue_url(), ReceiptHandle=receipt, VisibilityTimeout=visibility_timeout_s
+            )
         )
 
-    def requeue_dead_letter(self, num_messages: int = 10, visibility_timeout: int = None) -> None:
-        """
-        Re-queues everything in the Hedwig DLQ back into the Hedwig queue.
-
-        :param num_messages: Maximum number of messages to fetch in one SQS call. Defaults to 10.
-        :param visibility_timeout: The number of seconds the message should remain invisible to other queue readers.
-        Defaults to None, which is queue default
-        """
-        sqs_queue = self.sqs_resource.get_queue_by_name(QueueName=f'HEDWIG-{settings.HEDWIG_QUEUE}')
-        dead_letter_queue = self._get_queue()
-
-        log(__name__, logging.INFO, "Re-queueing messages from {} to {}".format(dead_letter_queue.url, sqs_queue.url))
-        while True:
-            queue_messages = self.pull_messages(num_messages=num_messages, visibility_timeout=visibility_timeout)
-            queue_messages = cast(list, queue_messages)
-
-            if not queue_messages:
-                break
-
-            log(__name__, logging.INFO, "got {} messages from dlq".format(len(queue_messages)))
-
-            result = sqs_queue.send_messages(
-                Entries=[
-                    funcy.merge(
-                        {'Id': queue_message.message_id, 'MessageBody': queue_message.body},
-                        {'MessageAttributes': queue_message.message_attributes}
-                        if queue_message.message_attributes
-                        else {},
-                    )
-                    for queue_message in queue_messages
-                ]
+    def _redrive_pull(self, num_messages: int, visibility_timeout: Optional[int]) -> list:
+        return cast(list, self.pull_messages(num_messages=num_messages, visibility_timeout=visibility_timeout))
+
+    def _redrive_publish(self, queue_messages: list) -> list:
+        requeued: list = []
+        for chunk in funcy.chunks(10, queue_messages):
+            entries = {str(i): queue_message for i, queue_message in enumerate(chunk)}
+            result = self._call_with_queue_refresh(
+                lambda: self.sqs_client.send_message_batch(
+                    QueueUrl=self._get_main_queue_url(),
+                    Entries=[
+                        funcy.merge(
+                            {'Id': k, 'MessageBody': m.body},
+                            {'MessageAttributes': m.message_attributes} if m.message_attributes else {},
+                        )
+                        for k, m in entries.items()
+                    ],
+                )
             )
-            if result.get('Failed'):
-                raise PartialFailure(result)
-
-            dead_letter_queue.delete_messages(
+            failed = set()
+            for failure in result.get('Failed') or []:
+                failed.add(failure['Id'])
+                log(
+                    __name__,
+                    logging.ERROR,
+                    'Failed to re-queue message',
+                    extra={'message_id': entries[failure['Id']].message_id, 'failure': failure},
+                )
+            requeued.extend(m for k, m in entries.items() if k not in failed)
+        return requeued
+
+    def _redrive_ack(self, queue_messages: list) -> None:
+        for queue_message in queue_messages:
+            self._release(queue_message)
+        self._delete_messages(queue_messages)
+
+    def _redrive_release(self, queue_messages: list) -> None:
+        for queue_message in queue_messages:
+            self._release(queue_message)
+        for chunk in funcy.chunks(10, queue_messages):
+            entries = {str(i): queue_message for i, queue_message in enumerate(chunk)}
+            result = self.sqs_client.change_message_visibility_batch(
+                QueueUrl=chunk[0].queue_url,
                 Entries=[
-                    {'Id': message.message_id, 'ReceiptHandle': message.receipt_handle} for message in queue_messages
-                ]
+                    {'Id': k, 'ReceiptHandle': m.receipt_handle, 'VisibilityTimeout': 0} for k, m in entries.items()
+                ],
             )
-
-            log(__name__, logging.INFO, "Re-queued {} messages".format(len(queue_messages)))
+            for failure in result.get('Failed') or []:
+                log(
+                    __name__,
+                    logging.WARNING,
+                    'Failed to release message',
+                    extra={'message_id': entries[failure['Id']].message_id, 'failure': failure},
+                )
+
+    def _redrive_done(self, queue_messages: list) -> None:
+        # messages that weren't removed become visible once their visibility timeout expires
+        for queue_message in queue_messages:
+            self._release(queue_message)
+
+    def _redrive_message_id(self, queue_message) -> str:
+        return queue_message.message_id
+
+    def _redrive_meta_attributes(self, queue_message) -> MetaAttributes:
+        message_payload, attributes, _ = self._message_handler_args(queue_message)
+        return _validator()._deserialize_meta_attributes(message_payload, attributes)
+
+    def _redrive_backlog(self) -> Optional[int]:
+        attributes = self._call_with_queue_refresh(
+            lambda: self.sqs_client.get_queue_attributes(
+                QueueUrl=self._get_queue_url(),
+                AttributeNames=['ApproximateNumberOfMessages', 'ApproximateNumberOfMessagesNotVisible'],
+            )
+        )['Attributes']
+        return int(attributes['ApproximateNumberOfMessages']) + int(attributes['ApproximateNumberOfMessagesNotVisible'])
 
     @staticmethod
     def pre_process_hook_kwargs(queue_message) -> dict:
@@ -261,8 +868,65 @@ class AWSSQSConsumerBackend(HedwigConsumerBaseBackend):
         return {'sqs_queue_message': queue_message}
 
 
+class AWSSQSLambdaConsumerBackend(AWSSQSConsumerBackend):
+    """
+    Consumer for Lambda functions triggered by an SQS event source. Records are processed on a pool of
+    ``HEDWIG_CONSUMER_AWS_LAMBDA_CONCURRENCY`` threads, and records that failed are reported as partial batch failures,
+    so only those are retried. The event source mapping must have ``ReportBatchItemFailures`` enabled.
+    """
+
+    def __init__(self, dlq=False):
+        super().__init__(dlq=dlq)
+        self.concurrency: int = settings.HEDWIG_CONSUMER_AWS_LAMBDA_CONCURRENCY
+        self._batch_item_failures: List[str] = []
+
+    def pull_messages(
+        self,
+        num_messages: int = 10,
+        visibility_timeout: Optional[int] = None,
+        shutdown_event: Optional[threading.Event] = None,
+    ) -> Union[Generator, List]:
+        raise RuntimeError("invalid operation for backend")  # pragma: no cover
+
+    def process_messages(self, lambda_event) -> dict:
+        """
+        Processes all records of an SQS event.
+        :return: partial batch response for Lambda
+        """
+        if self.concurrency < 1:
+            raise ValueError("Invalid concurrency")
+        queue_messages = [SQSMessage._from_lambda_record(record) for record in lambda_event['Records']]
+        self._batch_item_failures = []
+        self._start_batching()
+        try:
+            if self.concurrency > 1 and len(queue_messages) > 1:
+                with ThreadPoolExecutor(
+                    max_workers=min(self.concurrency, len(queue_messages)), thread_name_prefix='hedwig-consumer'
+                ) as executor:
+                    # re-raise unexpected exceptions, so the whole batch is retried
+                    list(executor.map(self._process_queue_message, queue_messages))
+            else:
+                for queue_message in queue_messages:
+                    self._process_queue_message(queue_message)
+        finally:
+            # pending batches are processed before returning
+            self._stop_batching()
+        return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in self._batch_item_failures]}
+
+    def warmup(self) -> None:
+        # a client is only needed if visibility timeout is extended
+        pass
+
+    def ack_message(self, queue_message) -> None:
+        # Lambda deletes messages that weren't reported as failures
+        pass
+
+    def nack_message(self, queue_message) -> None:
+        self._batch_item_failures.append(queue_message.message_id)
+
+
 class AWSSNSConsumerBackend(HedwigConsumerBaseBackend):
-    def requeue_dead_letter(self, num_messages: int = 10, visibility_timeout: int = None) -> None:
+    def requeue_dead_letter(self, *args, **kwargs) -> RedriveProgress:
         raise RuntimeError("invalid operation for backend")  # pragma: no cover
 
     def pull_messages(
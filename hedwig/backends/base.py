@@ -1,15 +1,20 @@
 import abc
+import asyncio
 import logging
 import threading
+import time
 import uuid
-from concurrent.futures import Future
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Optional, Union, Generator, List, Any, Dict, Tuple, Iterator
+from functools import partial
+from typing import Optional, Union, Generator, List, Any, Dict, Tuple, Iterator, Set, Callable, cast
 
+from hedwig.backends.redrive import RateLimiter, Redrive, RedriveFilter, RedriveProgress, RedriveSettings
 from hedwig.conf import settings
 from hedwig.exceptions import ValidationError, IgnoreException, LoggingException, RetryException
 from hedwig.models import Message
 from hedwig.utils import log
+from hedwig.validators.base import MetaAttributes
 
 
 class HedwigPublisherBaseBackend:
@@ -22,6 +27,11 @@ class HedwigPublisherBaseBackend:
         version_pattern = f'{message.major_version}.*'
         return settings.HEDWIG_MESSAGE_ROUTING[(message.type, version_pattern)]
 
+    def warmup(self) -> None:
+        """
+        Creates clients ahead of time, so the first publish doesn't pay for it
+        """
+
     def _dispatch_sync(self, message: Message) -> None:
         from hedwig.backends.utils import get_consumer_backend
 
@@ -47,6 +57,12 @@ class HedwigPublisherBaseBackend:
         string) as serialized by the validator.
         """
 
+    def _serialize(self, message: Message) -> Tuple[Union[str, bytes], Dict[str, str]]:
+        """
+        Serialize a message into payload and attributes in the format expected by `_publish`
+        """
+        return message.serialize()
+
     @contextmanager
     def _maybe_instrument(self, message: Message, instrumentation_headers: Dict) -> Iterator:
         try:
@@ -68,16 +84,16 @@ class HedwigPublisherBaseBackend:
             return str(uuid.uuid4())
 
         default_headers = settings.HEDWIG_DEFAULT_HEADERS(message=message)
-        if default_headers:
-            new_headers = {**default_headers, **message.headers}
-            message = message.with_headers(new_headers)
 
         instrumentation_headers: Dict[str, str] = {}
         with self._maybe_instrument(message, instrumentation_headers):
-            new_headers = {**message.headers, **instrumentation_headers}
-            message = message.with_headers(new_headers)
+            if default_headers or instrumentation_headers:
+                # message headers take precedence over default headers
+                message = message.with_headers(
+                    {**(default_headers or {}), **message.headers, **instrumentation_headers}
+                )
 
-            payload, attributes = message.serialize()
+            payload, attributes = self._serialize(message)
 
             result = self._publish(message, payload, attributes)
 
@@ -86,7 +102,36 @@ class HedwigPublisherBaseBackend:
         return result
 
 
+class _BatchDeferred(Exception):
+    """
+    Raised by message handler when a message is collected into a batch for a batch callback
+    """
+
+    def __init__(self, message: Message) -> None:
+        super().__init__()
+        self.message = message
+
+
 class HedwigConsumerBaseBackend:
+    _messages_processed: int = 0
+    # guards _messages_processed, which is incremented by worker threads when messages are processed concurrently
+    _messages_processed_lock = threading.Lock()
+
+    # pending batches for batch callbacks, keyed by callback function; only set while fetching messages
+    _batches: Optional[Dict[Callable, List[Tuple[Message, Any]]]] = None
+    # monotonic time at which each pending batch is due
+    _batch_deadlines: Dict[Callable, float]
+    _batches_lock: threading.Lock
+    # set while fetching messages concurrently, so due batches are processed by worker threads
+    _batch_executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def messages_processed(self) -> int:
+        """
+        Number of messages processed by this backend, regardless of outcome.
+        """
+        return self._messages_processed
+
     @staticmethod
     def pre_process_hook_kwargs(queue_message) -> dict:
         return {}
@@ -119,74 +164,392 @@ class HedwigConsumerBaseBackend:
 
         self._maybe_update_instrumentation(message)
 
-        message.exec_callback()
+        if self._batches is not None and message.callback.is_batch:
+            raise _BatchDeferred(message)
+
+        start = time.monotonic()
+        try:
+            message.exec_callback()
+        finally:
+            self._record_callback_duration(message, time.monotonic() - start)
+
+    async def message_handler_async(
+        self, message_payload: Union[str, bytes], attributes: dict, provider_metadata
+    ) -> None:
+        message = self._build_message(message_payload, attributes, provider_metadata)
+        _log_received_message(message)
+
+        self._maybe_update_instrumentation(message)
+
+        start = time.monotonic()
+        try:
+            await message.exec_callback_async()
+        finally:
+            self._record_callback_duration(message, time.monotonic() - start)
+
+    def _record_callback_duration(self, message: Message, duration_s: float) -> None:
+        """
+        Called after every callback execution, regardless of outcome
+        """
+
+    def _process_queue_message(self, queue_message) -> None:
+        try:
+            self._process_queue_message_with_hooks(queue_message)
+        finally:
+            with self._messages_processed_lock:
+                self._messages_processed += 1
+
+    def _process_queue_message_with_hooks(self, queue_message) -> None:
+        with self._maybe_instrument(**self.pre_process_hook_kwargs(queue_message)):
+            if not self._run_pre_process_hook(queue_message):
+                return
+
+            try:
+                self.process_message(queue_message)
+            except _BatchDeferred as e:
+                # acked or nacked once the batch is processed
+                self._add_to_batch(e.message, queue_message)
+                return
+            except Exception as e:
+                if not self._handle_process_exception(queue_message, e):
+                    return
+
+            self._finish_message(queue_message)
+
+    def _finish_message(self, queue_message) -> None:
+        if not self._run_post_process_hook(queue_message):
+            return
+
+        self._ack_message(queue_message)
+
+    def _start_batching(self) -> None:
+        self._batches = {}
+        self._batch_deadlines = {}
+        self._batches_lock = threading.Lock()
+
+    def _stop_batching(self) -> None:
+        self._batch_executor = None
+        self.flush_batches()
+        with self._batches_lock:
+            self._batches = None
+
+    def _add_to_batch(self, message: Message, queue_message) -> None:
+        callback = message.callback
+        batch_settings = callback.batch_settings
+        entries: List[Tuple[Message, Any]] = []
+        with self._batches_lock:
+            if self._batches is None:
+                # not fetching messages anymore
+                entries = [(message, queue_message)]
+            else:
+                batch = self._batches.setdefault(callback.fn, [])
+                batch.append((message, queue_message))
+                if len(batch) >= batch_settings.max_messages:
+                    entries = self._take_batch(callback.fn)
+                elif callback.fn not in self._batch_deadlines:
+                    self._batch_deadlines[callback.fn] = time.monotonic() + batch_settings.max_latency_s
+        if entries:
+            self._process_batch(entries)
+
+    def _take_batch(self, fn: Callable) -> List[Tuple[Message, Any]]:
+        """
+        Must be called with batches lock held.
+        """
+        if self._batches is None:
+            return []
+        self._batch_deadlines.pop(fn, None)
+        return self._batches.pop(fn, [])
+
+    def _flush_batch(self, fn: Callable) -> None:
+        with self._batches_lock:
+            entries = self._take_batch(fn)
+        if entries:
+            self._process_batch(entries)
+
+    def flush_batches(self) -> None:
+        """
+        Processes any pending batches for batch callbacks right away. This is called on shutdown.
+        """
+        if self._batches is None:
+            return
+        for fn in list(self._batches):
+            self._flush_batch(fn)
+
+    def flush_due_batches(self) -> None:
+        """
+        Processes pending batches that have waited for `max_latency_s`. This is called from the consumer loop between
+        messages, so batch callbacks run on the consumer thread, or on worker threads when fetching concurrently.
+        Backends whose `pull_messages` may block for a long time without returning messages should call this while
+        waiting.
+        """
+        if self._batches is None:
+            return
+        now = time.monotonic()
+        with self._batches_lock:
+            due = [self._take_batch(fn) for fn, deadline in list(self._batch_deadlines.items()) if deadline <= now]
+        for entries in due:
+            if not entries:
+                continue
+            if self._batch_executor is not None:
+                self._batch_executor.submit(self._process_batch, entries)
+            else:
+                self._process_batch(entries)
+
+    def _batch_due_in_s(self) -> Optional[float]:
+        """
+        Number of seconds until the next pending batch is due, or None if there's no pending batch
+        """
+        if self._batches is None:
+            return None
+        with self._batches_lock:
+            if not self._batch_deadlines:
+                return None
+            return max(min(self._batch_deadlines.values()) - time.monotonic(), 0)
+
+    def _process_batch(self, entries: List[Tuple[Message, Any]]) -> None:
+        messages = [message for message, _ in entries]
+        callback = messages[0].callback
+        start = time.monotonic()
+        try:
+            failures = callback.call_batch(messages)
+        except Exception as e:
+            failures = {message.id: e for message in messages}
+        finally:
+            duration_s = (time.monotonic() - start) / len(messages)
+            for message in messages:
+                self._record_callback_duration(message, duration_s)
+
+        for message, queue_message in entries:
+            error = failures.get(message.id)
+            if error is not None:
+                try:
+                    # re-raise so exception is logged with traceback
+                    raise error
+                except Exception as e:
+                    if not self._handle_process_exception(queue_message, e):
+                        continue
+            self._finish_message(queue_message)
+
+    def _run_pre_process_hook(self, queue_message) -> bool:
+        """
+        :return: False if the message was nacked
+        """
+        try:
+            settings.HEDWIG_PRE_PROCESS_HOOK(**self.pre_process_hook_kwargs(queue_message))
+        except Exception:
+            log(
+                __name__,
+                logging.ERROR,
+                'Exception in pre process hook for message',
+                exc_info=True,
+                extra={'queue_message': queue_message},
+            )
+            self.nack_message(queue_message)
+            return False
+        return True
+
+    def _handle_process_exception(self, queue_message, e: Exception) -> bool:
+        """
+        Must be called from an except block.
+        :return: False if the message was nacked
+        """
+        if isinstance(e, IgnoreException):
+            log(__name__, logging.INFO, 'Ignoring task', extra={'queue_message': queue_message})
+            return True
+        if isinstance(e, LoggingException):
+            # log with message and extra
+            log(__name__, logging.ERROR, str(e), extra=e.extra, exc_info=True)
+        elif isinstance(e, RetryException):
+            # Retry without logging exception
+            log(__name__, logging.INFO, 'Retrying due to exception')
+        else:
+            log(__name__, logging.ERROR, 'Exception while processing message', exc_info=True)
+        self.nack_message(queue_message)
+        return False
+
+    def _run_post_process_hook(self, queue_message) -> bool:
+        """
+        :return: False if the message was nacked
+        """
+        try:
+            settings.HEDWIG_POST_PROCESS_HOOK(**self.post_process_hook_kwargs(queue_message))
+        except Exception:
+            log(
+                __name__,
+                logging.ERROR,
+                'Exception in post process hook for message',
+                extra={'queue_message': queue_message},
+                exc_info=True,
+            )
+            self.nack_message(queue_message)
+            return False
+        return True
+
+    def _ack_message(self, queue_message) -> None:
+        try:
+            self.ack_message(queue_message)
+        except Exception:
+            log(
+                __name__,
+                logging.ERROR,
+                'Exception while deleting message',
+                extra={'queue_message': queue_message},
+                exc_info=True,
+            )
+
+    async def _process_queue_message_async(self, queue_message) -> None:
+        try:
+            with self._maybe_instrument(**self.pre_process_hook_kwargs(queue_message)):
+                if not self._run_pre_process_hook(queue_message):
+                    return
+
+                try:
+                    await self.process_message_async(queue_message)
+                except Exception as e:
+                    if not self._handle_process_exception(queue_message, e):
+                        return
+
+                if not self._run_post_process_hook(queue_message):
+                    return
+
+                # acks may make blocking API calls
+                await asyncio.get_event_loop().run_in_executor(None, self._ack_message, queue_message)
+        finally:
+            self._messages_processed += 1
+
+    def _fetch_and_process_messages_concurrently(
+        self,
+        num_messages: int,
+        visibility_timeout: int,
+        shutdown_event: threading.Event,
+        concurrency: int,
+        rate_limiter: Optional[RateLimiter],
+    ) -> None:
+        slots = threading.BoundedSemaphore(concurrency)
+
+        def _release_slot(_: Future) -> None:
+            slots.release()
+
+        # exiting the executor waits for in-flight messages to finish processing
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='hedwig-consumer') as executor:
+            self._batch_executor = executor
+            try:
+                while not shutdown_event.is_set():
+                    # don't pull more messages until at least one worker is free
+                    slots.acquire()
+                    slots.release()
+
+                    queue_messages = self.pull_messages(
+                        num_messages=num_messages, visibility_timeout=visibility_timeout, shutdown_event=shutdown_event
+                    )
+                    for queue_message in queue_messages:
+                        # block until a worker is available so messages aren't pulled faster than they can be processed
+                        slots.acquire()
+                        if rate_limiter is not None:
+                            rate_limiter.acquire()
+                        executor.submit(self._process_queue_message, queue_message).add_done_callback(_release_slot)
+                        self.flush_due_batches()
+                    self.flush_due_batches()
+            finally:
+                self._batch_executor = None
 
     def fetch_and_process_messages(
-        self, num_messages: int = 10, visibility_timeout: int = None, shutdown_event: Optional[threading.Event] = None
+        self,
+        num_messages: int = 10,
+        visibility_timeout: int = None,
+        shutdown_event: Optional[threading.Event] = None,
+        concurrency: int = 1,
+        max_messages_per_s: Optional[float] = None,
     ) -> None:
         if not shutdown_event:
             shutdown_event = threading.Event()  # pragma: no cover
-        while not shutdown_event.is_set():
-            queue_messages = self.pull_messages(
-                num_messages=num_messages, visibility_timeout=visibility_timeout, shutdown_event=shutdown_event
-            )
-            for queue_message in queue_messages:
-                with self._maybe_instrument(**self.pre_process_hook_kwargs(queue_message)):
-                    try:
-                        settings.HEDWIG_PRE_PROCESS_HOOK(**self.pre_process_hook_kwargs(queue_message))
-                    except Exception:
-                        log(
-                            __name__,
-                            logging.ERROR,
-                            'Exception in pre process hook for message',
-                            exc_info=True,
-                            extra={'queue_message': queue_message},
-                        )
-                        self.nack_message(queue_message)
-                        continue
+        if concurrency < 1:
+            raise ValueError("Invalid concurrency")
+        rate_limiter = RateLimiter(max_messages_per_s) if max_messages_per_s else None
+        self._start_batching()
+        try:
+            if concurrency > 1:
+                self._fetch_and_process_messages_concurrently(
+                    num_messages, visibility_timeout, shutdown_event, concurrency, rate_limiter
+                )
+                return
+            while not shutdown_event.is_set():
+                queue_messages = self.pull_messages(
+                    num_messages=num_messages, visibility_timeout=visibility_timeout, shutdown_event=shutdown_event
+                )
+                for queue_message in queue_messages:
+                    if rate_limiter is not None:
+                        rate_limiter.acquire()
+                    self._process_queue_message(queue_message)
+                    self.flush_due_batches()
+                self.flush_due_batches()
+                self.flush_acks()
+        finally:
+            # pending batches are processed before shutting down
+            self._stop_batching()
+            self.flush_acks()
+
+    async def fetch_and_process_messages_async(
+        self,
+        num_messages: int = 10,
+        visibility_timeout: Optional[int] = None,
+        shutdown_event: Optional[asyncio.Event] = None,
+        concurrency: int = 10,
+    ) -> None:
+        """
+        Fetches and processes messages on the running event loop, with up to `concurrency` callbacks in flight. API
+        calls to pull and ack messages run in the loop's default executor.
+        """
+        if concurrency < 1:
+            raise ValueError("Invalid concurrency")
+        if not shutdown_event:
+            shutdown_event = asyncio.Event()  # pragma: no cover
 
-                    try:
-                        self.process_message(queue_message)
-                    except IgnoreException:
-                        log(__name__, logging.INFO, 'Ignoring task', extra={'queue_message': queue_message})
-                    except LoggingException as e:
-                        # log with message and extra
-                        log(__name__, logging.ERROR, str(e), extra=e.extra, exc_info=True)
-                        self.nack_message(queue_message)
-                        continue
-                    except RetryException:
-                        # Retry without logging exception
-                        log(__name__, logging.INFO, 'Retrying due to exception')
-                        self.nack_message(queue_message)
-                        continue
-                    except Exception:
-                        log(__name__, logging.ERROR, 'Exception while processing message', exc_info=True)
-                        self.nack_message(queue_message)
-                        continue
+        loop = asyncio.get_event_loop()
+        # pull_messages expects a thread-safe event
+        pull_shutdown_event = threading.Event()
+        shutdown_waiter = asyncio.ensure_future(shutdown_event.wait())
+        shutdown_waiter.add_done_callback(lambda _: pull_shutdown_event.set())
 
-                    try:
-                        settings.HEDWIG_POST_PROCESS_HOOK(**self.post_process_hook_kwargs(queue_message))
-                    except Exception:
-                        log(
-                            __name__,
-                            logging.ERROR,
-                            'Exception in post process hook for message',
-                            extra={'queue_message': queue_message},
-                            exc_info=True,
-                        )
-                        self.nack_message(queue_message)
-                        continue
+        slots = asyncio.Semaphore(concurrency)
+        tasks: Set[asyncio.Future] = set()
+        done = object()
 
-                    try:
-                        self.ack_message(queue_message)
-                    except Exception:
-                        log(
-                            __name__,
-                            logging.ERROR,
-                            'Exception while deleting message',
-                            extra={'queue_message': queue_message},
-                            exc_info=True,
-                        )
+        async def _process(queue_message) -> None:
+            try:
+                await self._process_queue_message_async(queue_message)
+            finally:
+                slots.release()
+
+        try:
+            while not shutdown_event.is_set():
+                queue_messages = await loop.run_in_executor(
+                    None,
+                    partial(
+                        self.pull_messages,
+                        num_messages=num_messages,
+                        visibility_timeout=cast(int, visibility_timeout),
+                        shutdown_event=pull_shutdown_event,
+                    ),
+                )
+                # streaming backends return a generator that blocks while waiting for messages
+                queue_messages_iter = iter(queue_messages)
+                while True:
+                    # don't pull more messages until a slot is free so messages aren't pulled faster than they can be
+                    # processed
+                    await slots.acquire()
+                    queue_message = await loop.run_in_executor(None, next, queue_messages_iter, done)
+                    if queue_message is done:
+                        slots.release()
+                        break
+                    task = asyncio.ensure_future(_process(queue_message))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        finally:
+            shutdown_waiter.cancel()
+            if tasks:
+                await asyncio.wait(tasks)
+            await loop.run_in_executor(None, self.flush_acks)
 
     def extend_visibility_timeout(self, visibility_timeout_s: int, metadata) -> None:
         """
@@ -194,16 +557,75 @@ class HedwigConsumerBaseBackend:
         """
         raise NotImplementedError
 
-    def requeue_dead_letter(self, num_messages: int = 10, visibility_timeout: int = None) -> None:
+    def requeue_dead_letter(
+        self,
+        num_messages: int = 10,
+        visibility_timeout: int = None,
+        redrive_settings: Optional[RedriveSettings] = None,
+        progress_callback: Optional[Callable[[RedriveProgress], None]] = None,
+        redrive_filter: Optional[RedriveFilter] = None,
+    ) -> RedriveProgress:
         """
-        Re-queues everything in the Hedwig DLQ back into the Hedwig queue.
+        Re-queues everything in the Hedwig DLQ, or only messages that match a filter, back into the Hedwig queue.
+        Messages that fail to re-queue are left in the DLQ, and made visible again right away.
 
         :param num_messages: Maximum number of messages to fetch in one call. Defaults to 10.
         :param visibility_timeout: The number of seconds the message should remain invisible to other queue readers.
         Defaults to None, which is queue default
+        :param redrive_settings: Concurrency, rate limit and progress reporting configuration
+        :param progress_callback: Called with progress periodically, and once done
+        :param redrive_filter: Selects messages to re-queue
+        :return: final progress
+        :raise: :class:`hedwig.backends.exceptions.PartialFailure` if any message failed to re-queue
+        """
+        return Redrive(
+            self, num_messages, visibility_timeout, redrive_settings, progress_callback, redrive_filter
+        ).run()
+
+    def _redrive_pull(self, num_messages: int, visibility_timeout: Optional[int]) -> list:
+        """
+        Pulls messages from the DLQ for re-queueing. Returns an empty list once the DLQ is drained.
+        """
+        raise NotImplementedError
+
+    def _redrive_publish(self, queue_messages: list) -> list:
+        """
+        Publishes DLQ messages to the Hedwig topic or queue, and returns the ones that were published successfully
+        """
+        raise NotImplementedError
+
+    def _redrive_ack(self, queue_messages: list) -> None:
+        """
+        Removes re-queued messages from the DLQ, batching calls where possible
+        """
+        raise NotImplementedError
+
+    def _redrive_release(self, queue_messages: list) -> None:
+        """
+        Makes messages that weren't re-queued visible in the DLQ again
+        """
+        raise NotImplementedError
+
+    def _redrive_done(self, queue_messages: list) -> None:
+        """
+        Called with every DLQ message pulled once re-queueing is done with it, whether or not it was removed
+        """
+
+    def _redrive_message_id(self, queue_message) -> str:
+        raise NotImplementedError
+
+    def _redrive_meta_attributes(self, queue_message) -> MetaAttributes:
+        """
+        Decodes meta attributes of a DLQ message for filtering, without validating the message
         """
         raise NotImplementedError
 
+    def _redrive_backlog(self) -> Optional[int]:
+        """
+        Approximate number of messages in the DLQ, including ones received but not removed yet, if known
+        """
+        return None
+
     def pull_messages(
         self, num_messages: int = 10, visibility_timeout: int = None, shutdown_event: Optional[threading.Event] = None
     ) -> Union[Generator, List]:
@@ -219,7 +641,10 @@ class HedwigConsumerBaseBackend:
     def process_message(self, queue_message) -> None:
         raise NotImplementedError
 
-    def process_messages(self, lambda_event) -> None:
+    async def process_message_async(self, queue_message) -> None:
+        raise NotImplementedError
+
+    def process_messages(self, lambda_event) -> Optional[dict]:
         # for lambda backend
         raise NotImplementedError
 
@@ -229,6 +654,17 @@ class HedwigConsumerBaseBackend:
     def nack_message(self, queue_message) -> None:
         raise NotImplementedError
 
+    def warmup(self) -> None:
+        """
+        Creates clients ahead of time, so the first message doesn't pay for it
+        """
+
+    def flush_acks(self) -> None:
+        """
+        Flushes any buffered acknowledgements. This is called after every batch of pulled messages has been processed,
+        and on shutdown.
+        """
+
     @staticmethod
     def _build_message(message_payload: Union[str, bytes], attributes: dict, provider_metadata: Any) -> Message:
         try:
@@ -8,3 +8,15 @@ class PartialFailure(Exception):
         self.failure_count = len(result['Failed'])
         self.result = result
         super().__init__(*args)
+
+
+class PublishBatchEntryFailure(Exception):
+    """
+    Error indicating a message in a PublishBatch API call failed to publish
+    """
+
+    def __init__(self, failure, *args):
+        self.code = failure.get('Code')
+        self.sender_fault = failure.get('SenderFault')
+        self.failure = failure
+        super().__init__(failure.get('Message'), *args)
@@ -1,14 +1,17 @@
+import asyncio
 import dataclasses
 import logging
+import math
 import threading
+from collections import defaultdict, deque
 from concurrent.futures import Future
 from contextlib import ExitStack, contextmanager
 from datetime import datetime
 from queue import Empty, Queue
 from time import time
-from typing import Dict, Generator, List, Optional, Union, cast
-from unittest import mock
+from typing import Deque, Dict, Generator, List, NamedTuple, Optional, Tuple, Union, cast
 
+import funcy
 from google.api_core.exceptions import DeadlineExceeded
 from google.auth import default as google_auth_default
 from google.auth import environment_vars as google_env_vars
@@ -21,13 +24,18 @@ from google.protobuf.timestamp_pb2 import Timestamp
 from hedwig.backends.base import HedwigConsumerBaseBackend, HedwigPublisherBaseBackend
 from hedwig.backends.utils import override_env
 from hedwig.conf import settings
-from hedwig.models import Message
-from hedwig.utils import log
+from hedwig.models import Message, _validator
+from hedwig.utils import dataclass_slots, log
+from hedwig.validators.base import MetaAttributes
 
 # the default visibility timeout
 # ideally find by calling PubSub REST API
 DEFAULT_VISIBILITY_TIMEOUT_S = 20
 
+# bounds for lease extension enforced by Pub/Sub
+MIN_LEASE_EXTENSION_S = 10
+MAX_LEASE_EXTENSION_S = 600
+
 
 @contextmanager
 def _seed_credentials() -> Generator[None, None, None]:
@@ -64,6 +72,7 @@ def get_google_cloud_project() -> str:
     return settings.GOOGLE_CLOUD_PROJECT
 
 
+@dataclass_slots
 @dataclasses.dataclass(frozen=True)
 class GoogleMetadata:
     """
@@ -104,6 +113,11 @@ class GooglePubSubAsyncPublisherBackend(HedwigPublisherBaseBackend):
                 self._publisher = pubsub_v1.PublisherClient(batch_settings=settings.HEDWIG_PUBLISHER_GCP_BATCH_SETTINGS)
         return self._publisher
 
+    def warmup(self) -> None:
+        _ = self.publisher
+        # project used in topic paths may need to be discovered from credentials
+        get_google_cloud_project()
+
     def publish_to_topic(self, topic_path: str, data: bytes, attrs: Dict[str, str]) -> Union[str, Future]:
         """
         Publishes to a Google Pub/Sub topic and returns a future that represents the publish API call. These API calls
@@ -124,11 +138,9 @@ class GooglePubSubAsyncPublisherBackend(HedwigPublisherBaseBackend):
         return self.publisher.topic_path(project, f'hedwig-{topic}')
 
     def _mock_queue_message(self, message: Message) -> "MessageWrapper":
-        payload, attributes = message.serialize()
-        # Pub/Sub requires bytes
-        if isinstance(payload, str):
-            payload = payload.encode('utf8')
-            attributes['hedwig_encoding'] = 'utf8'
+        from unittest import mock
+
+        payload, attributes = self._serialize(message)
         publish_time = Timestamp()
         publish_time.GetCurrentTime()
         pubsub_message = PubsubMessage(
@@ -142,6 +154,13 @@ class GooglePubSubAsyncPublisherBackend(HedwigPublisherBaseBackend):
         gcp_message = MessageWrapper(subscriber_message, 'test-subscription')
         return gcp_message
 
+    def _serialize(self, message: Message) -> Tuple[bytes, Dict[str, str]]:
+        # Pub/Sub requires bytes, text payloads are encoded directly to bytes
+        payload, attributes, encoding = message.serialize_bytes()
+        if encoding is not None:
+            attributes['hedwig_encoding'] = encoding
+        return payload, attributes
+
     def _publish(self, message: Message, payload: Union[str, bytes], attributes: Dict[str, str]) -> Union[str, Future]:
         topic_path = self._get_topic_path(message)
         # Pub/Sub requires bytes
@@ -157,9 +176,12 @@ class GooglePubSubPublisherBackend(GooglePubSubAsyncPublisherBackend):
 
 
 class MessageWrapper:
-    def __init__(self, message: SubscriberMessage, subscription_path: str):
+    def __init__(
+        self, message: SubscriberMessage, subscription_path: str, stream_closed: Optional[threading.Event] = None
+    ):
         self._message = message
         self._subscription_path = subscription_path
+        self._stream_closed = stream_closed
 
     @property
     def message(self) -> SubscriberMessage:
@@ -169,16 +191,148 @@ class MessageWrapper:
     def subscription_path(self) -> str:
         return self._subscription_path
 
+    @property
+    def stream_closed(self) -> bool:
+        """
+        True if the streaming pull this message was received on has been closed, and the message must be acked or
+        nacked directly
+        """
+        return self._stream_closed is not None and self._stream_closed.is_set()
+
+
+class WorkQueue:
+    """
+    A thread-safe queue of messages received on streaming pulls for the main thread to pick up, bounded by number of
+    messages and total payload bytes. Every subscription is guaranteed a fair share of the bounds so a busy subscription
+    can't starve the others, and messages are picked from subscriptions in round-robin order.
+    """
+
+    def __init__(self, max_messages: int, max_bytes: int) -> None:
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self._queues: Dict[str, Deque[Tuple[MessageWrapper, int]]] = {}
+        self._bytes: Dict[str, int] = defaultdict(int)
+        # subscription paths in round-robin order
+        self._order: Deque[str] = deque()
+        self._cond = threading.Condition()
+
+    @property
+    def depth(self) -> int:
+        """
+        Number of messages in the queue
+        """
+        with self._cond:
+            return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def bytes(self) -> int:
+        """
+        Total payload bytes of messages in the queue
+        """
+        with self._cond:
+            return sum(self._bytes.values())
+
+    def messages(self) -> List[MessageWrapper]:
+        """
+        Snapshot of messages in the queue
+        """
+        with self._cond:
+            return [item for queue in self._queues.values() for item, _ in queue]
+
+    def depth_by_subscription(self) -> Dict[str, int]:
+        with self._cond:
+            return {subscription_path: len(queue) for subscription_path, queue in self._queues.items()}
+
+    def register(self, subscription_path: str) -> None:
+        """
+        Registers a subscription so it's counted for fair shares before it receives any messages
+        """
+        with self._cond:
+            if subscription_path not in self._queues:
+                self._queues[subscription_path] = deque()
+                self._order.append(subscription_path)
+
+    def resize(self, max_messages: int, max_bytes: int) -> None:
+        with self._cond:
+            self.max_messages = max_messages
+            self.max_bytes = max_bytes
+            self._cond.notify_all()
+
+    def wakeup(self) -> None:
+        """
+        Wakes up blocked producers so they can re-check whether they should stop waiting
+        """
+        with self._cond:
+            self._cond.notify_all()
+
+    def _fits(self, subscription_path: str, size: int) -> bool:
+        # must be called with lock held
+        queue = self._queues[subscription_path]
+        if not queue:
+            # always admit one message so a message larger than the bounds can't block a subscription forever
+            return True
+        share_messages = max(1, self.max_messages // len(self._queues))
+        share_bytes = max(1, self.max_bytes // len(self._queues))
+        num_bytes = self._bytes[subscription_path]
+        if len(queue) < share_messages and num_bytes + size <= share_bytes:
+            return True
+        # beyond its fair share, a subscription may only use space not reserved for other subscriptions
+        reserved_messages = reserved_bytes = 0
+        for other, other_queue in self._queues.items():
+            if other != subscription_path:
+                reserved_messages += max(0, share_messages - len(other_queue))
+                reserved_bytes += max(0, share_bytes - self._bytes[other])
+        total_messages = sum(len(q) for q in self._queues.values())
+        total_bytes = sum(self._bytes.values())
+        return (
+            total_messages + 1 + reserved_messages <= self.max_messages
+            and total_bytes + size + reserved_bytes <= self.max_bytes
+        )
+
+    def put(
+        self, subscription_path: str, item: MessageWrapper, size: int, stop_event: Optional[threading.Event] = None
+    ) -> None:
+        """
+        Adds a message to the queue, blocking until there's space for it, or until stop_event is set
+        """
+        self.register(subscription_path)
+        with self._cond:
+            while not self._fits(subscription_path, size) and not (stop_event is not None and stop_event.is_set()):
+                self._cond.wait()
+            self._queues[subscription_path].append((item, size))
+            self._bytes[subscription_path] += size
+            self._cond.notify_all()
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> MessageWrapper:
+        """
+        Removes and returns the next message, raises `queue.Empty` if no message is available
+        """
+        with self._cond:
+            if block:
+                self._cond.wait_for(lambda: any(self._queues.values()), timeout)
+            for _ in range(len(self._order)):
+                subscription_path = self._order[0]
+                self._order.rotate(-1)
+                queue = self._queues[subscription_path]
+                if queue:
+                    item, size = queue.popleft()
+                    self._bytes[subscription_path] -= size
+                    self._cond.notify_all()
+                    return item
+            raise Empty
+
 
 class PubSubMessageScheduler(Scheduler):
     """
     A scheduler to use with streaming pull that simply queues all messages for the main thread to pick them up.
     """
 
-    def __init__(self, work_queue: Queue, subscription_path: str):
+    def __init__(self, work_queue: WorkQueue, subscription_path: str):
         self._queue: Queue = Queue()
-        self._work_queue: Queue = work_queue
+        self._work_queue: WorkQueue = work_queue
         self._subscription_path: str = subscription_path
+        self._closing = threading.Event()
+        self._closed = threading.Event()
 
     @property
     def queue(self) -> Queue:
@@ -188,12 +342,96 @@ class PubSubMessageScheduler(Scheduler):
 
     def schedule(self, callback, message: SubscriberMessage, *args, **kwargs) -> None:
         # callback is unused since we never set it in pull_messages
-        self._work_queue.put(MessageWrapper(message, self._subscription_path))
+        # blocks the stream while the work queue is full
+        self._work_queue.put(
+            self._subscription_path,
+            MessageWrapper(message, self._subscription_path, self._closed),
+            len(message.data),
+            stop_event=self._closing,
+        )
+
+    def close(self) -> None:
+        """
+        Stops blocking the stream on a full work queue so the stream can be shut down
+        """
+        self._closing.set()
+        self._work_queue.wakeup()
 
-    def shutdown(self, await_msg_callbacks=False) -> None:
+    def shutdown(self, await_msg_callbacks=False) -> List[SubscriberMessage]:
         """Shuts down the scheduler and immediately end all pending callbacks."""
         # ideally we'd nack the messages in work queue, but that might take some time to finish.
         # instead, it's faster to actually process all the messages
+        self._closed.set()
+        self.close()
+        return []
+
+
+class FlowControlSettings(NamedTuple):
+    """
+    Flow control configuration for :class:`GooglePubSubConsumerBackend`.
+    """
+
+    max_bytes: int = 100 * 1024 * 1024
+    """
+    Maximum total size of received but not yet processed messages
+    """
+
+    max_messages_limit: Optional[int] = None
+    """
+    If set, maximum number of received but not yet processed messages is sized dynamically from observed callback
+    durations, between ``num_messages`` and this limit. Otherwise, ``num_messages`` is used as is.
+    """
+
+    adjust_interval_s: float = 60
+    """
+    Interval in seconds at which flow control is re-computed from observed callback durations. Streaming pulls are
+    re-opened if it changed. Set to 0 to only compute it when streaming pulls are opened.
+    """
+
+    adjust_threshold: float = 0.25
+    """
+    Minimum relative change in lease extension or number of messages for streaming pulls to be re-opened, so small
+    changes in callback durations don't re-open streams on every adjustment
+    """
+
+
+class CallbackDurations:
+    """
+    Tracks recent callback durations in seconds by message type
+    """
+
+    MAX_SAMPLES = 1000
+
+    def __init__(self) -> None:
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.MAX_SAMPLES))
+        self._lock = threading.Lock()
+
+    def add(self, msg_type: str, duration_s: float) -> None:
+        with self._lock:
+            self._samples[msg_type].append(duration_s)
+
+    def percentile(self, percent: int, msg_type: Optional[str] = None) -> Optional[float]:
+        """
+        Percentile of callback durations for the given message type, or across all message types. None if no durations
+        have been recorded.
+        """
+        with self._lock:
+            if msg_type is None:
+                samples = sorted(d for durations in self._samples.values() for d in durations)
+            else:
+                samples = sorted(self._samples.get(msg_type, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, len(samples) * percent // 100)]
+
+    def max_percentile(self, percent: int) -> Optional[float]:
+        """
+        Highest percentile of callback durations across message types
+        """
+        with self._lock:
+            msg_types = list(self._samples)
+        values = [self.percentile(percent, msg_type) for msg_type in msg_types]
+        return max((v for v in values if v is not None), default=None)
 
 
 class GooglePubSubConsumerBackend(HedwigConsumerBaseBackend):
@@ -228,6 +466,18 @@ class GooglePubSubConsumerBackend(HedwigConsumerBaseBackend):
                 cloud_project, f'hedwig-{settings.HEDWIG_QUEUE}-dlq'
             )
 
+        self.flow_control_settings = FlowControlSettings(*settings.HEDWIG_CONSUMER_GCP_FLOW_CONTROL_SETTINGS)
+        self.callback_durations = CallbackDurations()
+        # set while pulling messages, exposes depth and bytes of messages waiting to be processed
+        self.work_queue: Optional[WorkQueue] = None
+        # messages handed out by pull_messages that haven't been acked or nacked yet, by ack id
+        self._outstanding: Dict[str, MessageWrapper] = {}
+        self._outstanding_lock = threading.Lock()
+        # extends leases of messages received on closed streaming pulls, since the Pub/Sub client stops extending them
+        self._lease_extension_s = DEFAULT_VISIBILITY_TIMEOUT_S
+        self._lease_thread: Optional[threading.Thread] = None
+        self._lease_stop = threading.Event()
+
     @property
     def subscriber(self):
         if self._subscriber is None:
@@ -235,6 +485,9 @@ class GooglePubSubConsumerBackend(HedwigConsumerBaseBackend):
                 self._subscriber = pubsub_v1.SubscriberClient()
         return self._subscriber
 
+    def warmup(self) -> None:
+        _ = self.subscriber
+
     @property
     def publisher(self):
         if self._publisher is None:
@@ -253,46 +506,192 @@ class GooglePubSubConsumerBackend(HedwigConsumerBaseBackend):
         if not shutdown_event:
             shutdown_event = threading.Event()  # pragma: no cover
 
-        work_queue: Queue = Queue()
-        futures: List[Future] = []
-        flow_control: FlowControl = FlowControl(
-            max_messages=num_messages,
-            max_duration_per_lease_extension=visibility_timeout or DEFAULT_VISIBILITY_TIMEOUT_S,
-        )
-
-        for subscription_path in self._subscription_paths:
-            # need a separate scheduler per subscription since the queue is tied to subscription path
-            scheduler: PubSubMessageScheduler = PubSubMessageScheduler(work_queue, subscription_path)
-            futures.append(
-                self.subscriber.subscribe(
-                    subscription_path, callback=None, flow_control=flow_control, scheduler=scheduler
-                )
-            )
+        flow_control = self._flow_control(num_messages, visibility_timeout)
+        self._lease_extension_s = flow_control.max_duration_per_lease_extension
+        # shared by all subscriptions, and bounded by the same limits as a single stream
+        work_queue = self.work_queue = WorkQueue(flow_control.max_messages, flow_control.max_bytes)
+        schedulers = self._subscribe(work_queue, flow_control)
 
+        adjust_interval_s = self.flow_control_settings.adjust_interval_s
+        adjust_at = time() + adjust_interval_s
         while not shutdown_event.is_set():
+            timeout: float = 1
+            batch_due_in_s = self._batch_due_in_s()
+            if batch_due_in_s is not None:
+                timeout = min(timeout, batch_due_in_s)
             try:
-                message = work_queue.get(timeout=1)
-                yield message
+                message = work_queue.get(timeout=timeout)
+                yield self._track(message)
             except Empty:
-                pass
+                # nothing was received, so the consumer loop doesn't get to process pending batches
+                self.flush_due_batches()
 
-        for future in futures:
-            future.cancel()
+            if adjust_interval_s and time() >= adjust_at:
+                adjust_at = time() + adjust_interval_s
+                new_flow_control = self._flow_control(num_messages, visibility_timeout)
+                if self._flow_control_changed(flow_control, new_flow_control):
+                    log(
+                        __name__,
+                        logging.INFO,
+                        "Re-opening streaming pulls with new flow control",
+                        extra={'flow_control': new_flow_control._asdict()},
+                    )
+                    # messages already received from the old streams stay in the work queue, and are acked directly
+                    self._unsubscribe(schedulers)
+                    flow_control = new_flow_control
+                    self._lease_extension_s = flow_control.max_duration_per_lease_extension
+                    self._start_leasing()
+                    work_queue.resize(flow_control.max_messages, flow_control.max_bytes)
+                    schedulers = self._subscribe(work_queue, flow_control)
+
+        self._unsubscribe(schedulers)
+        self._start_leasing()
 
         # drain the queue
         try:
             while True:
-                yield work_queue.get(block=False)
+                yield self._track(work_queue.get(block=False))
         except Empty:
             pass
 
-    def process_message(self, queue_message: MessageWrapper) -> None:
+    def _track(self, queue_message: MessageWrapper) -> MessageWrapper:
+        with self._outstanding_lock:
+            self._outstanding[queue_message.message.ack_id] = queue_message
+        return queue_message
+
+    def _untrack(self, queue_message: MessageWrapper) -> None:
+        with self._outstanding_lock:
+            self._outstanding.pop(queue_message.message.ack_id, None)
+
+    def _flow_control_changed(self, flow_control: FlowControl, new_flow_control: FlowControl) -> bool:
+        threshold = self.flow_control_settings.adjust_threshold
+        return any(
+            abs(new - old) > threshold * old
+            for old, new in (
+                (flow_control.max_messages, new_flow_control.max_messages),
+                (flow_control.max_duration_per_lease_extension, new_flow_control.max_duration_per_lease_extension),
+            )
+        )
+
+    def _start_leasing(self) -> None:
+        if self._lease_thread is None:
+            self._lease_thread = threading.Thread(target=self._lease_loop, name='hedwig-pubsub-lease', daemon=True)
+            self._lease_thread.start()
+
+    def _lease_loop(self) -> None:
+        while True:
+            try:
+                self.extend_closed_stream_leases()
+            except Exception:
+                log(__name__, logging.ERROR, 'Exception while extending ack deadline', exc_info=True)
+            if self._lease_stop.wait(max(self._lease_extension_s / 2, 1)):
+                return
+
+    def extend_closed_stream_leases(self) -> None:
+        """
+        Extends ack deadlines of messages received on streaming pulls that have been closed, whether they're being
+        processed or still waiting in the work queue
+        """
+        with self._outstanding_lock:
+            queue_messages = list(self._outstanding.values())
+        if self.work_queue is not None:
+            queue_messages.extend(self.work_queue.messages())
+        ack_ids: Dict[str, List[str]] = defaultdict(list)
+        for queue_message in queue_messages:
+            if queue_message.stream_closed:
+                ack_ids[queue_message.subscription_path].append(queue_message.message.ack_id)
+        for subscription_path, subscription_ack_ids in ack_ids.items():
+            # limited by request size
+            for chunk in funcy.chunks(1000, subscription_ack_ids):
+                self.subscriber.modify_ack_deadline(
+                    subscription=subscription_path, ack_ids=chunk, ack_deadline_seconds=self._lease_extension_s
+                )
+
+    def _stop_leasing(self) -> None:
+        """
+        Stops the lease thread once messages are no longer processed, e.g. on shutdown
+        """
+        if self._lease_thread is not None:
+            self._lease_stop.set()
+            self._lease_thread.join()
+            self._lease_thread = None
+            # leasing restarts once streams are closed again
+            self._lease_stop = threading.Event()
+        with self._outstanding_lock:
+            self._outstanding.clear()
+
+    def fetch_and_process_messages(self, *args, **kwargs) -> None:
+        try:
+            super().fetch_and_process_messages(*args, **kwargs)
+        finally:
+            self._stop_leasing()
+
+    async def fetch_and_process_messages_async(self, *args, **kwargs) -> None:
+        try:
+            await super().fetch_and_process_messages_async(*args, **kwargs)
+        finally:
+            await asyncio.get_event_loop().run_in_executor(None, self._stop_leasing)
+
+    def _subscribe(
+        self, work_queue: WorkQueue, flow_control: FlowControl
+    ) -> List[Tuple[PubSubMessageScheduler, Future]]:
+        schedulers: List[Tuple[PubSubMessageScheduler, Future]] = []
+        for subscription_path in self._subscription_paths:
+            work_queue.register(subscription_path)
+        for subscription_path in self._subscription_paths:
+            # need a separate scheduler per subscription since the queue is tied to subscription path
+            scheduler: PubSubMessageScheduler = PubSubMessageScheduler(work_queue, subscription_path)
+            future = self.subscriber.subscribe(
+                subscription_path, callback=None, flow_control=flow_control, scheduler=scheduler
+            )
+            schedulers.append((scheduler, future))
+        return schedulers
+
+    @staticmethod
+    def _unsubscribe(schedulers: List[Tuple[PubSubMessageScheduler, Future]]) -> None:
+        for scheduler, future in schedulers:
+            # unblock the stream first, otherwise it can't shut down while the work queue is full
+            scheduler.close()
+            future.cancel()
+
+    def _flow_control(self, num_messages: int, visibility_timeout: Optional[int]) -> FlowControl:
+        """
+        Flow control for streaming pulls. Unless visibility timeout is explicitly set, lease extensions are sized to
+        the p99 callback duration of the slowest message type, so most messages are processed without needing an
+        extension. If enabled, the maximum number of outstanding messages is sized so these can be processed within one
+        lease at the observed p50 callback duration.
+        """
+        lease_extension_s = visibility_timeout
+        if not lease_extension_s:
+            p99 = self.callback_durations.max_percentile(99)
+            if p99 is None:
+                lease_extension_s = DEFAULT_VISIBILITY_TIMEOUT_S
+            else:
+                lease_extension_s = min(max(math.ceil(p99), MIN_LEASE_EXTENSION_S), MAX_LEASE_EXTENSION_S)
+
+        max_messages = num_messages
+        max_messages_limit = self.flow_control_settings.max_messages_limit
+        p50 = self.callback_durations.percentile(50)
+        if max_messages_limit and p50:
+            max_messages = min(max(math.ceil(lease_extension_s / p50), num_messages), max_messages_limit)
+
+        return FlowControl(
+            max_bytes=self.flow_control_settings.max_bytes,
+            max_messages=max_messages,
+            max_duration_per_lease_extension=lease_extension_s,
+        )
+
+    def _record_callback_duration(self, message: Message, duration_s: float) -> None:
+        self.callback_durations.add(message.type, duration_s)
+
+    @staticmethod
+    def _message_handler_args(queue_message: MessageWrapper) -> Tuple[Union[str, bytes], dict, GoogleMetadata]:
         # body is always bytes
         message_payload = queue_message.message.data
         attributes = queue_message.message.attributes
         if attributes.get("hedwig_encoding") == "utf8":
             message_payload = message_payload.decode('utf8')
-        self.message_handler(
+        return (
             message_payload,
             attributes,
             GoogleMetadata(
@@ -303,11 +702,31 @@ class GooglePubSubConsumerBackend(HedwigConsumerBaseBackend):
             ),
         )
 
+    def process_message(self, queue_message: MessageWrapper) -> None:
+        self.message_handler(*self._message_handler_args(queue_message))
+
+    async def process_message_async(self, queue_message: MessageWrapper) -> None:
+        await self.message_handler_async(*self._message_handler_args(queue_message))
+
     def ack_message(self, queue_message: MessageWrapper) -> None:
+        self._untrack(queue_message)
+        if queue_message.stream_closed:
+            self.subscriber.acknowledge(
+                subscription=queue_message.subscription_path, ack_ids=[queue_message.message.ack_id]
+            )
+            return
         queue_message.message.ack()
 
     def nack_message(self, queue_message: MessageWrapper) -> None:
         log(__name__, logging.INFO, "nacking message")
+        self._untrack(queue_message)
+        if queue_message.stream_closed:
+            self.subscriber.modify_ack_deadline(
+                subscription=queue_message.subscription_path,
+                ack_ids=[queue_message.message.ack_id],
+                ack_deadline_seconds=0,
+            )
+            return
         queue_message.message.nack()
 
     @staticmethod
@@ -330,62 +749,81 @@ class GooglePubSubConsumerBackend(HedwigConsumerBaseBackend):
             ack_deadline_seconds=visibility_timeout_s,
         )
 
-    def requeue_dead_letter(self, num_messages: int = 10, visibility_timeout: int = None) -> None:
-        """
-        Re-queues everything in the Hedwig DLQ back into the Hedwig queue.
-
-        :param num_messages: Maximum number of messages to fetch in one call. Defaults to 10.
-        :param visibility_timeout: The number of seconds the message should remain invisible to other queue readers.
-        Defaults to None, which is queue default
-        """
-        topic_path = pubsub_v1.PublisherClient.topic_path(get_google_cloud_project(), f'hedwig-{settings.HEDWIG_QUEUE}')
+    def _redrive_subscription_path(self) -> str:
         assert len(self._subscription_paths) == 1, "multiple subscriptions found"
-        subscription_path = self._subscription_paths[0]
+        return self._subscription_paths[0]
 
-        log(__name__, logging.INFO, "Re-queueing messages from {} to {}".format(subscription_path, topic_path))
-        while True:
+    def _redrive_pull(self, num_messages: int, visibility_timeout: Optional[int]) -> list:
+        subscription_path = self._redrive_subscription_path()
+        try:
+            queue_messages: List[ReceivedMessage] = self.subscriber.pull(
+                subscription=subscription_path,
+                max_messages=num_messages,
+                retry=None,
+                timeout=settings.GOOGLE_PUBSUB_READ_TIMEOUT_S,
+            ).received_messages
+        except DeadlineExceeded:
+            return []
+        if queue_messages and visibility_timeout:
+            self.subscriber.modify_ack_deadline(
+                subscription=subscription_path,
+                ack_ids=[queue_message.ack_id for queue_message in queue_messages],
+                ack_deadline_seconds=visibility_timeout,
+            )
+        return list(queue_messages)
+
+    def _redrive_publish(self, queue_messages: list) -> list:
+        topic_path = pubsub_v1.PublisherClient.topic_path(get_google_cloud_project(), f'hedwig-{settings.HEDWIG_QUEUE}')
+        futures: List[Future] = []
+        # publish everything before waiting on any result, so the publisher client can batch messages
+        for queue_message in queue_messages:
             try:
-                queue_messages: List[ReceivedMessage] = self.subscriber.pull(
-                    subscription=subscription_path,
-                    max_messages=num_messages,
-                    retry=None,
-                    timeout=settings.GOOGLE_PUBSUB_READ_TIMEOUT_S,
-                ).received_messages
-            except DeadlineExceeded:
-                break
-
-            if not queue_messages:
-                break
-
-            log(__name__, logging.INFO, "got {} messages from dlq".format(len(queue_messages)))
-            for queue_message in queue_messages:
-                try:
-                    if visibility_timeout:
-                        self.subscriber.modify_ack_deadline(
-                            subscription=subscription_path,
-                            ack_ids=[queue_message.ack_id],
-                            ack_deadline_seconds=visibility_timeout,
-                        )
-
-                    future = self.publisher.publish(
+                futures.append(
+                    self.publisher.publish(
                         topic_path, data=queue_message.message.data, **queue_message.message.attributes
                     )
-                    # wait for success
-                    future.result()
-                    log(
-                        __name__,
-                        logging.DEBUG,
-                        'Re-queued message from DLQ {} to {}'.format(subscription_path, topic_path),
-                        extra={'message_id': queue_message.message.message_id},
-                    )
+                )
+            except Exception as e:
+                future: Future = Future()
+                future.set_exception(e)
+                futures.append(future)
+        requeued = []
+        for queue_message, future in zip(queue_messages, futures):
+            try:
+                future.result()
+            except Exception:
+                log(
+                    __name__,
+                    logging.ERROR,
+                    'Exception in requeue message to {}'.format(topic_path),
+                    exc_info=True,
+                    extra={'message_id': queue_message.message.message_id},
+                )
+            else:
+                requeued.append(queue_message)
+        return requeued
 
-                    self.subscriber.acknowledge(subscription=subscription_path, ack_ids=[queue_message.ack_id])
-                except Exception:
-                    log(
-                        __name__,
-                        logging.ERROR,
-                        'Exception in requeue message from {} to {}'.format(subscription_path, topic_path),
-                        exc_info=True,
-                    )
+    def _redrive_ack(self, queue_messages: list) -> None:
+        self.subscriber.acknowledge(
+            subscription=self._redrive_subscription_path(),
+            ack_ids=[queue_message.ack_id for queue_message in queue_messages],
+        )
 
-            log(__name__, logging.INFO, "Re-queued {} messages".format(len(queue_messages)))
+    def _redrive_release(self, queue_messages: list) -> None:
+        # limited by request size
+        for chunk in funcy.chunks(1000, queue_messages):
+            self.subscriber.modify_ack_deadline(
+                subscription=self._redrive_subscription_path(),
+                ack_ids=[queue_message.ack_id for queue_message in chunk],
+                ack_deadline_seconds=0,
+            )
+
+    def _redrive_message_id(self, queue_message) -> str:
+        return queue_message.message.message_id
+
+    def _redrive_meta_attributes(self, queue_message) -> MetaAttributes:
+        message = queue_message.message
+        message_payload = message.data
+        if message.attributes.get("hedwig_encoding") == "utf8":
+            message_payload = message_payload.decode('utf8')
+        return _validator()._deserialize_meta_attributes(message_payload, message.attributes)
@@ -0,0 +1,363 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, TYPE_CHECKING
+
+from hedwig.backends.exceptions import PartialFailure
+from hedwig.exceptions import ValidationError
+from hedwig.models import Version, _validator
+from hedwig.utils import log
+
+if TYPE_CHECKING:  # pragma: no cover
+    from hedwig.backends.base import HedwigConsumerBaseBackend
+    from hedwig.validators.base import MetaAttributes
+
+
+def _epoch_ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+
+class RedriveSettings(NamedTuple):
+    """
+    Configuration for re-queueing messages from the Hedwig DLQ
+    """
+
+    concurrency: int = 1
+    """
+    Number of threads that receive, publish and acknowledge messages in parallel
+    """
+
+    max_messages_per_s: Optional[float] = None
+    """
+    Maximum number of messages re-queued per second across all threads. Defaults to None (unlimited).
+    """
+
+    progress_interval_s: float = 10
+    """
+    Number of seconds between progress reports
+    """
+
+
+class RedriveFilter(NamedTuple):
+    """
+    Selects messages re-queued from the Hedwig DLQ. A message must match all conditions that are set. If
+    ``HEDWIG_USE_TRANSPORT_MESSAGE_ATTRIBUTES`` is set, messages are matched using transport message attributes alone,
+    without decoding the payload.
+    """
+
+    message_type: Optional[str] = None
+    """
+    Message type
+    """
+
+    major_version: Optional[int] = None
+    """
+    Major version of the message schema
+    """
+
+    publisher: Optional[str] = None
+    """
+    Publisher name
+    """
+
+    headers: Optional[Dict[str, str]] = None
+    """
+    Header values
+    """
+
+    published_after: Optional[datetime] = None
+    """
+    Only messages published at or after this (timezone aware) time
+    """
+
+    published_before: Optional[datetime] = None
+    """
+    Only messages published before this (timezone aware) time
+    """
+
+    release_non_matching: bool = False
+    """
+    If True, messages that don't match are made visible in the DLQ again right away. Otherwise, they're left untouched
+    until their visibility timeout expires.
+    """
+
+    def matches(self, meta_attrs: 'MetaAttributes', message_type: str, version: Version) -> bool:
+        if self.message_type is not None and message_type != self.message_type:
+            return False
+        if self.major_version is not None and version.major != self.major_version:
+            return False
+        if self.publisher is not None and meta_attrs.publisher != self.publisher:
+            return False
+        if self.headers and any(meta_attrs.headers.get(k) != v for k, v in self.headers.items()):
+            return False
+        if self.published_after is not None and meta_attrs.timestamp < _epoch_ms(self.published_after):
+            return False
+        if self.published_before is not None and meta_attrs.timestamp >= _epoch_ms(self.published_before):
+            return False
+        return True
+
+
+class RedriveProgress(NamedTuple):
+    """
+    Progress of re-queueing messages from the Hedwig DLQ
+    """
+
+    requeued: int
+    """
+    Number of messages re-queued
+    """
+
+    failed: int
+    """
+    Number of messages that failed to re-queue, and were left in the DLQ
+    """
+
+    elapsed_s: float
+    """
+    Number of seconds since re-queueing started
+    """
+
+    backlog: Optional[int]
+    """
+    Approximate number of messages remaining in the DLQ, or None if the backend can't estimate it
+    """
+
+    skipped: int = 0
+    """
+    Number of messages that didn't match the filter
+    """
+
+    @property
+    def messages_per_s(self) -> float:
+        return self.requeued / self.elapsed_s if self.elapsed_s else 0.0
+
+    @property
+    def eta_s(self) -> Optional[float]:
+        """
+        Estimated number of seconds until the DLQ is drained
+        """
+        if self.backlog is None or not self.messages_per_s:
+            return None
+        return self.backlog / self.messages_per_s
+
+
+class RateLimiter:
+    """
+    Spaces out acquired permits evenly, shared across threads
+    """
+
+    def __init__(self, max_per_s: float) -> None:
+        self._interval_s = 1 / max_per_s
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, permits: int = 1) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + permits * self._interval_s
+        if start > now:
+            time.sleep(start - now)
+
+
+class Redrive:
+    """
+    Re-queues messages from the DLQ of a consumer backend using the backend's `_redrive_*` methods. Every thread runs
+    a receive, publish, acknowledge loop until the DLQ is empty, so receiving and publishing are pipelined across
+    threads. Messages are tracked by id, so a message that's received more than once, e.g. by two threads, is
+    published at most once. Messages that failed to re-queue are made visible in the DLQ again right away.
+    """
+
+    def __init__(
+        self,
+        backend: 'HedwigConsumerBaseBackend',
+        num_messages: int = 10,
+        visibility_timeout: Optional[int] = None,
+        redrive_settings: Optional[RedriveSettings] = None,
+        progress_callback: Optional[Callable[[RedriveProgress], None]] = None,
+        redrive_filter: Optional[RedriveFilter] = None,
+    ) -> None:
+        self.backend = backend
+        self.num_messages = num_messages
+        self.visibility_timeout = visibility_timeout
+        self.settings = redrive_settings or RedriveSettings()
+        self.progress_callback = progress_callback
+        self.filter = redrive_filter
+        self._rate_limiter: Optional[RateLimiter] = None
+        if self.settings.max_messages_per_s:
+            self._rate_limiter = RateLimiter(self.settings.max_messages_per_s)
+        # message ids by outcome
+        self._in_flight: Set[str] = set()
+        self._requeued: Set[str] = set()
+        self._failed: Set[str] = set()
+        self._skipped: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._errors: List[Exception] = []
+        self._start = time.monotonic()
+
+    def progress(self) -> RedriveProgress:
+        with self._lock:
+            requeued, failed, skipped = len(self._requeued), len(self._failed), len(self._skipped)
+        return RedriveProgress(
+            requeued, failed, time.monotonic() - self._start, self.backend._redrive_backlog(), skipped
+        )
+
+    def _report(self) -> RedriveProgress:
+        progress = self.progress()
+        log(
+            __name__,
+            logging.INFO,
+            "Re-queued {} messages, {} failed, {} skipped".format(progress.requeued, progress.failed, progress.skipped),
+            extra={
+                'messages_per_s': round(progress.messages_per_s, 1),
+                'backlog': progress.backlog,
+                'eta_s': progress.eta_s,
+            },
+        )
+        if self.progress_callback is not None:
+            self.progress_callback(progress)
+        return progress
+
+    def _matches(self, queue_message) -> bool:
+        assert self.filter is not None
+        try:
+            meta_attrs = self.backend._redrive_meta_attributes(queue_message)
+            message_type, version = _validator()._decode_message_type(meta_attrs.schema)
+        except ValidationError:
+            log(__name__, logging.WARNING, 'Invalid message skipped', exc_info=True)
+            return False
+        return self.filter.matches(meta_attrs, message_type, version)
+
+    def _release_skipped(self) -> bool:
+        return self.filter is not None and self.filter.release_non_matching
+
+    def _claim(self, queue_messages: list) -> list:
+        """
+        Claims messages that weren't received before. Messages received again are acknowledged if they were re-queued
+        already, released again if they failed or were skipped and need to be released, and otherwise left alone.
+        """
+        claimed = []
+        redundant = []
+        released = []
+        with self._lock:
+            for queue_message in queue_messages:
+                message_id = self.backend._redrive_message_id(queue_message)
+                if message_id in self._requeued:
+                    redundant.append(queue_message)
+                elif message_id in self._failed or (message_id in self._skipped and self._release_skipped()):
+                    released.append(queue_message)
+                elif message_id not in self._in_flight and message_id not in self._skipped:
+                    self._in_flight.add(message_id)
+                    claimed.append(queue_message)
+        if redundant:
+            # received again before the earlier copy was removed
+            self.backend._redrive_ack(redundant)
+        if released:
+            self.backend._redrive_release(released)
+        return claimed
+
+    def _select(self, queue_messages: list) -> list:
+        """
+        Splits off claimed messages that don't match the filter
+        """
+        assert self.filter is not None
+        matching: list = []
+        skipped: list = []
+        for queue_message in queue_messages:
+            (matching if self._matches(queue_message) else skipped).append(queue_message)
+        with self._lock:
+            for queue_message in skipped:
+                message_id = self.backend._redrive_message_id(queue_message)
+                self._in_flight.discard(message_id)
+                self._skipped.add(message_id)
+        if skipped and self._release_skipped():
+            self.backend._redrive_release(skipped)
+        return matching
+
+    def _requeue(self, queue_messages: list) -> None:
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire(len(queue_messages))
+        requeued = self.backend._redrive_publish(queue_messages)
+        if requeued:
+            self.backend._redrive_ack(requeued)
+        requeued_ids = {self.backend._redrive_message_id(queue_message) for queue_message in requeued}
+        failed = []
+        with self._lock:
+            for queue_message in queue_messages:
+                message_id = self.backend._redrive_message_id(queue_message)
+                self._in_flight.discard(message_id)
+                # failed messages are left in the DLQ, and not retried if they're received again
+                (self._requeued if message_id in requeued_ids else self._failed).add(message_id)
+                if message_id not in requeued_ids:
+                    failed.append(queue_message)
+        if failed:
+            self.backend._redrive_release(failed)
+
+    def _drained(self) -> bool:
+        """
+        Whether only messages that were received before are left in the DLQ. Called when a pull returned no new
+        messages, so if the backend can't count messages, e.g. on Google Pub/Sub, the DLQ is considered drained, since
+        messages that were left in the DLQ are redelivered.
+        """
+        backlog = self.backend._redrive_backlog()
+        if backlog is None:
+            return True
+        with self._lock:
+            return backlog <= len(self._in_flight) + len(self._failed) + len(self._skipped)
+
+    def _redrive_loop(self) -> None:
+        try:
+            while not self._stop.is_set():
+                queue_messages = self.backend._redrive_pull(self.num_messages, self.visibility_timeout)
+                if not queue_messages:
+                    break
+                try:
+                    claimed = self._claim(queue_messages)
+                    matching = self._select(claimed) if claimed and self.filter is not None else claimed
+                    if matching:
+                        self._requeue(matching)
+                finally:
+                    self.backend._redrive_done(queue_messages)
+                if not claimed and self._drained():
+                    break
+        except Exception as e:
+            log(__name__, logging.ERROR, 'Exception while re-queueing messages', exc_info=True)
+            self._errors.append(e)
+            self._stop.set()
+
+    def run(self) -> RedriveProgress:
+        """
+        Re-queues messages until the DLQ is empty, reporting progress periodically.
+
+        :return: final progress
+        :raise: the first exception raised in any thread, other than failures to publish individual messages
+        :raise: :class:`hedwig.backends.exceptions.PartialFailure` if any message failed to re-queue
+        """
+        self._start = time.monotonic()
+        threads = [
+            threading.Thread(target=self._redrive_loop, name=f'hedwig-redrive-{i}', daemon=True)
+            for i in range(self.settings.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(self.settings.progress_interval_s)
+                    if thread.is_alive():
+                        self._report()
+        finally:
+            self._stop.set()
+        progress = self._report()
+        if self._errors:
+            raise self._errors[0]
+        if self._failed:
+            raise PartialFailure(
+                {
+                    'Successful': [{'Id': message_id} for message_id in self._requeued],
+                    'Failed': [{'Id': message_id} for message_id in self._failed],
+                }
+            )
+        return progress
@@ -1,15 +1,41 @@
+import asyncio
 import inspect
+import re
 import typing
-from functools import lru_cache
+from functools import lru_cache, partial
 
 from hedwig.exceptions import ConfigurationError, CallbackNotFound
 from hedwig.models import Message
 from hedwig.conf import settings
 
+_version_pattern_re = re.compile(r"^([0-9]+)\.\*$")
+
+
+class BatchSettings(typing.NamedTuple):
+    # maximum number of messages passed to the callback in one call
+    max_messages: int = 10
+
+    # maximum time to wait for a batch to fill up before calling the callback
+    max_latency_s: float = 1.0
+
+
+def batch_callback(max_messages: int = 10, max_latency_s: float = 1.0) -> typing.Callable:
+    """
+    Decorator that configures batching for a batch callback, i.e. a callback that accepts a parameter called
+    'messages'. Batch callbacks that aren't decorated use default batch settings.
+    """
+
+    def decorator(fn: typing.Callable) -> typing.Callable:
+        fn._hedwig_batch_settings = BatchSettings(max_messages, max_latency_s)  # type: ignore
+        return fn
+
+    return decorator
+
 
 class Callback:
     def __init__(self, fn: typing.Callable) -> None:
         self._fn = fn
+        self._is_batch = False
         signature = inspect.signature(fn)
         message_found = False
         for p in signature.parameters.values():
@@ -24,11 +50,17 @@ class Callback:
                 if p.annotation is not inspect.Signature.empty and p.annotation is not Message:
                     raise ConfigurationError("Signature for 'message' param must be `hedwig.Message`")
                 message_found = True
+            elif p.name == 'messages':
+                if p.annotation not in (inspect.Signature.empty, list, typing.List[Message]):
+                    raise ConfigurationError("Signature for 'messages' param must be `List[hedwig.Message]`")
+                self._is_batch = True
             else:
                 raise ConfigurationError(f"Unknown param '{p.name}' not allowed")
 
-        if not message_found:
-            raise ConfigurationError("Callback must accept a parameter called 'message'")
+        if message_found and self._is_batch:
+            raise ConfigurationError("Callback must accept only one of 'message' or 'messages'")
+        if not message_found and not self._is_batch:
+            raise ConfigurationError("Callback must accept a parameter called 'message' or 'messages'")
 
     @property
     def fn(self) -> typing.Callable:
@@ -37,26 +69,104 @@ class Callback:
         """
         return self._fn
 
+    @property
+    def is_coroutine(self) -> bool:
+        """
+        return: True if task function is a coroutine function, i.e. declared with `async def`
+        """
+        return inspect.iscoroutinefunction(self.fn)
+
+    @property
+    def is_batch(self) -> bool:
+        """
+        return: True if task function accepts a list of messages
+        """
+        return self._is_batch
+
+    @property
+    def batch_settings(self) -> BatchSettings:
+        """
+        return: Batch settings for a batch callback
+        """
+        return getattr(self.fn, '_hedwig_batch_settings', BatchSettings())
+
+    def _run(self, arg) -> typing.Any:
+        if self.is_coroutine:
+            loop = asyncio.new_event_loop()
+            try:
+                return loop.run_until_complete(self.fn(arg))
+            finally:
+                loop.close()
+        return self.fn(arg)
+
+    @staticmethod
+    def _raise_batch_failure(message: Message, failures: typing.Optional[typing.Mapping[str, Exception]]) -> None:
+        if failures and message.id in failures:
+            raise failures[message.id]
+
     def call(self, message: Message) -> None:
         """
-        Calls the task with this message
+        Calls the task with this message. Coroutine functions are run to completion on a new event loop. Batch
+        callbacks are called with a batch of just this message.
+
+        :param message: The message
+        """
+        if self.is_batch:
+            self._raise_batch_failure(message, self._run([message]))
+            return
+        self._run(message)
+
+    def call_batch(self, messages: typing.List[Message]) -> typing.Mapping[str, Exception]:
+        """
+        Calls a batch task with these messages.
+
+        :param messages: The messages
+        :return: Failures reported by the task, as a mapping of message id to exception
+        """
+        assert self.is_batch
+        return self._run(messages) or {}
+
+    async def call_async(self, message: Message) -> None:
+        """
+        Calls the task with this message from an event loop. Regular functions are run in the loop's default executor
+        so they don't block the event loop.
 
         :param message: The message
         """
-        self.fn(message)
+        arg: typing.Any = [message] if self.is_batch else message
+        if self.is_coroutine:
+            result = await self.fn(arg)
+        else:
+            result = await asyncio.get_event_loop().run_in_executor(None, partial(self.fn, arg))
+        if self.is_batch:
+            self._raise_batch_failure(message, result)
 
     def __str__(self) -> str:
         return f'Hedwig task: {self.fn.__name__}'
 
     @classmethod
-    @lru_cache(maxsize=20)
     def find_by_message(cls, msg_type: str, major_version: int) -> 'Callback':
         """
         Finds a callback by message type
         :return: Callback
         :raises CallbackNotFound: if task isn't registered
         """
-        version_pattern = f'{major_version}.*'
-        if (msg_type, version_pattern) not in settings.HEDWIG_CALLBACKS:
+        try:
+            return _callbacks()[msg_type, major_version]
+        except KeyError:
             raise CallbackNotFound(msg_type, major_version)
-        return Callback(settings.HEDWIG_CALLBACKS[msg_type, version_pattern])
+
+
+@lru_cache(maxsize=1)
+def _callbacks() -> typing.Dict[typing.Tuple[str, int], Callback]:
+    """
+    Dispatch table of callbacks by message type and major version, built once from `HEDWIG_CALLBACKS`. This is
+    rebuilt after `settings.clear_cache()`.
+    """
+    callbacks = {}
+    for (msg_type, version_pattern), fn in settings.HEDWIG_CALLBACKS.items():
+        m = _version_pattern_re.match(version_pattern)
+        if not m:
+            raise ConfigurationError(f"Invalid version '{version_pattern}' for callback: '{msg_type}'")
+        callbacks[msg_type, int(m.group(1))] = Callback(fn)
+    return callbacks
@@ -1,13 +1,60 @@
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from hedwig.backends.redrive import RedriveFilter, RedriveProgress, RedriveSettings
 from hedwig.backends.utils import get_consumer_backend
 
 
-def requeue_dead_letter(num_messages: int = 10, visibility_timeout: int = None) -> None:
+def requeue_dead_letter(
+    num_messages: int = 10,
+    visibility_timeout: int = None,
+    concurrency: int = 1,
+    max_messages_per_s: Optional[float] = None,
+    progress_interval_s: float = 10,
+    progress_callback: Optional[Callable[[RedriveProgress], None]] = None,
+    message_type: Optional[str] = None,
+    major_version: Optional[int] = None,
+    publisher: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    published_after: Optional[datetime] = None,
+    published_before: Optional[datetime] = None,
+    release_non_matching: bool = False,
+) -> RedriveProgress:
     """
-    Re-queues everything in the Hedwig DLQ back into the Hedwig queue.
+    Re-queues everything in the Hedwig DLQ back into the Hedwig queue. Messages that fail to re-queue are left in the
+    DLQ, and :class:`hedwig.backends.exceptions.PartialFailure` is raised once everything else is re-queued. Progress
+    is logged periodically.
+
+    If any filter is set, only messages that match all filters are re-queued. Filters use transport message attributes
+    when ``HEDWIG_USE_TRANSPORT_MESSAGE_ATTRIBUTES`` is set, so payloads aren't decoded.
 
     :param num_messages: Maximum number of messages to fetch in one call. Defaults to 10.
     :param visibility_timeout: The number of seconds the message should remain invisible to other queue readers.
         Defaults to None, which is queue default
+    :param concurrency: Number of threads that receive and re-queue messages in parallel. Defaults to 1.
+    :param max_messages_per_s: Maximum number of messages re-queued per second. Defaults to None (unlimited).
+    :param progress_interval_s: Number of seconds between progress reports. Defaults to 10.
+    :param progress_callback: Called with :class:`hedwig.backends.redrive.RedriveProgress` on every progress report
+    :param message_type: Only re-queue messages of this type
+    :param major_version: Only re-queue messages with this major version
+    :param publisher: Only re-queue messages from this publisher
+    :param headers: Only re-queue messages with these header values
+    :param published_after: Only re-queue messages published at or after this (timezone aware) time
+    :param published_before: Only re-queue messages published before this (timezone aware) time
+    :param release_non_matching: Make messages that don't match filters visible in the DLQ again right away, instead
+        of waiting for their visibility timeout to expire. Defaults to False.
+    :return: final progress
+    :raise: :class:`hedwig.backends.exceptions.PartialFailure` if any message failed to re-queue
     """
+    filters = (message_type, major_version, publisher, headers, published_after, published_before)
+    redrive_filter = None
+    if any(value is not None for value in filters):
+        redrive_filter = RedriveFilter(*filters, release_non_matching=release_non_matching)
     consumer_backend = get_consumer_backend(dlq=True)
-    consumer_backend.requeue_dead_letter(num_messages, visibility_timeout)
+    return consumer_backend.requeue_dead_letter(
+        num_messages,
+        visibility_timeout,
+        RedriveSettings(concurrency, max_messages_per_s, progress_interval_s),
+        progress_callback,
+        redrive_filter,
+    )
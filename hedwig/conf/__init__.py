@@ -37,16 +37,25 @@ _DEFAULTS: dict = {
     'GOOGLE_CLOUD_PROJECT': None,
     'GOOGLE_PUBSUB_READ_TIMEOUT_S': 5,
     'HEDWIG_CALLBACKS': {},
+    'HEDWIG_CONSUMER_AWS_ACK_BATCH_SETTINGS': None,
+    'HEDWIG_CONSUMER_AWS_ATTRIBUTE_NAMES': (),
+    'HEDWIG_CONSUMER_AWS_LAMBDA_CONCURRENCY': 1,
+    'HEDWIG_CONSUMER_AWS_LEASE_SETTINGS': None,
     'HEDWIG_CONSUMER_BACKEND': None,
+    'HEDWIG_CONSUMER_GCP_FLOW_CONTROL_SETTINGS': (),
     'HEDWIG_DATA_VALIDATOR_CLASS': 'hedwig.validators.jsonschema.JSONSchemaValidator',
     'HEDWIG_DEFAULT_HEADERS': 'hedwig.conf.default_headers_hook',
     'HEDWIG_MESSAGE_ROUTING': {},
     'HEDWIG_PRE_PROCESS_HOOK': 'hedwig.conf.noop_hook',
     'HEDWIG_POST_PROCESS_HOOK': 'hedwig.conf.noop_hook',
     'HEDWIG_PUBLISHER': None,
+    'HEDWIG_PUBLISHER_AWS_BATCH_SETTINGS': (),
     'HEDWIG_PUBLISHER_BACKEND': None,
     'HEDWIG_PUBLISHER_GCP_BATCH_SETTINGS': (),
+    'HEDWIG_PUBLISHER_VALIDATION': 'full',
+    'HEDWIG_PUBLISHER_VALIDATION_SAMPLE_RATE': 0.01,
     'HEDWIG_QUEUE': None,
+    'HEDWIG_JSON_CODEC_CLASS': 'hedwig.validators.jsonschema.JSONCodec',
     'HEDWIG_JSONSCHEMA_FILE': None,
     'HEDWIG_PROTOBUF_MESSAGES': None,
     'HEDWIG_SYNC': False,
@@ -60,6 +69,7 @@ _IMPORT_STRINGS = (
     'HEDWIG_CONSUMER_BACKEND',
     'HEDWIG_DATA_VALIDATOR_CLASS',
     'HEDWIG_DEFAULT_HEADERS',
+    'HEDWIG_JSON_CODEC_CLASS',
     'HEDWIG_PRE_PROCESS_HOOK',
     'HEDWIG_POST_PROCESS_HOOK',
     'HEDWIG_PUBLISHER_BACKEND',
@@ -167,6 +177,16 @@ class _LazySettings:
                 except AttributeError:
                     raise RuntimeError
 
+    def _is_set(self, attr: str) -> bool:
+        """
+        Is a setting set to a non-empty value? Import strings aren't resolved.
+        """
+        self._ensure_configured()
+        try:
+            return bool(self._get_setting_from_object(attr))
+        except RuntimeError:
+            return bool(self._defaults[attr])
+
     def __getattr__(self, attr: str) -> typing.Any:
         self._ensure_configured()
 
@@ -198,15 +218,17 @@ class _LazySettings:
         Clear settings cache - useful for testing only
         """
         from hedwig.backends.utils import get_publisher_backend, get_consumer_backend
-        from hedwig.callback import Callback
+        from hedwig.callback import _callbacks
         from hedwig.models import _validator
+        from hedwig.validators.base import _decode_schema
 
         for attr in self._defaults:
             try:
                 delattr(self, attr)
             except AttributeError:
                 pass
-        Callback.find_by_message.cache_clear()
+        # callback dispatch table is rebuilt on next use
+        _callbacks.cache_clear()
 
         # since consumer/publisher settings may have changed
         get_publisher_backend.cache_clear()
@@ -214,6 +236,7 @@ class _LazySettings:
 
         # in case a test overrides HEDWIG_DATA_VALIDATOR_CLASS
         _validator.cache_clear()
+        _decode_schema.cache_clear()
 
 
 if HAVE_DJANGO:  # pragma: no cover
@@ -1,16 +1,28 @@
+import asyncio
+import os
 import threading
 import typing
 
 from hedwig.backends.utils import get_consumer_backend
 
 
-def process_messages_for_lambda_consumer(lambda_event: dict) -> None:
-    sns_consumer_backend = get_consumer_backend()
-    sns_consumer_backend.process_messages(lambda_event)
+def process_messages_for_lambda_consumer(lambda_event: dict) -> typing.Optional[dict]:
+    """
+    Processes messages in an event received by a Lambda function, triggered by SNS using ``AWSSNSConsumerBackend``, or
+    by SQS using ``AWSSQSLambdaConsumerBackend``.
+
+    :param lambda_event: Event received by the Lambda function
+    :return: For SQS, the partial batch response with records that failed, to be returned by the Lambda function
+    """
+    consumer_backend = get_consumer_backend()
+    return consumer_backend.process_messages(lambda_event)
 
 
 def listen_for_messages(
-    num_messages: int = 10, visibility_timeout_s: typing.Optional[int] = None, shutdown_event: threading.Event = None
+    num_messages: int = 10,
+    visibility_timeout_s: typing.Optional[int] = None,
+    shutdown_event: threading.Event = None,
+    concurrency: int = 1,
 ) -> None:
     """
     Starts a Hedwig listener for message types provided and calls the callback handlers like so:
@@ -30,11 +42,136 @@ def listen_for_messages(
         Defaults to None, which is queue default
     :param shutdown_event: An event to signal that the process should shut down. This prevents more messages from
         being de-queued and function exits after the current messages have been processed.
+    :param concurrency: Number of messages to process concurrently using a pool of threads. Defaults to 1, which
+        processes messages one at a time on the calling thread. If set higher, callbacks must be thread-safe.
     """
     if not shutdown_event:
         shutdown_event = threading.Event()
 
     consumer_backend = get_consumer_backend()
     consumer_backend.fetch_and_process_messages(
-        num_messages=num_messages, visibility_timeout=visibility_timeout_s, shutdown_event=shutdown_event
+        num_messages=num_messages,
+        visibility_timeout=visibility_timeout_s,
+        shutdown_event=shutdown_event,
+        concurrency=concurrency,
+    )
+
+
+def listen_for_dead_letter_messages(
+    num_messages: int = 10,
+    visibility_timeout_s: typing.Optional[int] = None,
+    shutdown_event: typing.Optional[threading.Event] = None,
+    concurrency: int = 1,
+    max_messages_per_s: typing.Optional[float] = None,
+) -> None:
+    """
+    Starts a Hedwig listener on the dead-letter queue, and calls callback handlers same as
+    :meth:`hedwig.consumer.listen_for_messages`. Messages are processed in place, without re-queueing them into the
+    Hedwig queue, so they don't compete with live traffic.
+
+    Messages are deleted from the DLQ only if callback function ran successfully. Messages that fail are nacked and left
+    in the DLQ, same as messages that fail in the Hedwig queue.
+
+    This function is blocking. It may be stopped by passing a shut down event object which can be set to stop the
+    function.
+
+    :param num_messages: Maximum number of messages to fetch in one API call. Defaults to 10
+    :param visibility_timeout_s: The number of seconds the message should remain invisible to other queue readers.
+        Defaults to None, which is queue default
+    :param shutdown_event: An event to signal that the process should shut down. This prevents more messages from
+        being de-queued and function exits after the current messages have been processed.
+    :param concurrency: Number of messages to process concurrently using a pool of threads. Defaults to 1. If set
+        higher, callbacks must be thread-safe.
+    :param max_messages_per_s: Maximum number of messages processed per second. Defaults to None (unlimited).
+    """
+    if not shutdown_event:
+        shutdown_event = threading.Event()
+
+    consumer_backend = get_consumer_backend(dlq=True)
+    consumer_backend.fetch_and_process_messages(
+        num_messages=num_messages,
+        visibility_timeout=visibility_timeout_s,
+        shutdown_event=shutdown_event,
+        concurrency=concurrency,
+        max_messages_per_s=max_messages_per_s,
+    )
+
+
+async def listen_for_messages_async(
+    num_messages: int = 10,
+    visibility_timeout_s: typing.Optional[int] = None,
+    shutdown_event: typing.Optional[asyncio.Event] = None,
+    concurrency: int = 10,
+) -> None:
+    """
+    Starts a Hedwig listener on the running event loop, and calls callback handlers like so:
+
+    .. code-block:: python
+
+        await callback_fn(message)
+
+    Callbacks declared with ``async def`` run on the event loop, and up to ``concurrency`` callbacks run concurrently.
+    Regular callbacks run in the loop's default executor. API calls to pull and ack messages also run in the default
+    executor, so they don't block the event loop.
+
+    Messages are acked and nacked same as :meth:`hedwig.consumer.listen_for_messages`.
+
+    :param num_messages: Maximum number of messages to fetch in one API call. Defaults to 10
+    :param visibility_timeout_s: The number of seconds the message should remain invisible to other queue readers.
+        Defaults to None, which is queue default
+    :param shutdown_event: An asyncio event to signal that the listener should shut down. This prevents more messages
+        from being de-queued and function returns after in-flight messages have been processed.
+    :param concurrency: Maximum number of callbacks in flight. Defaults to 10
+    """
+    consumer_backend = get_consumer_backend()
+    await consumer_backend.fetch_and_process_messages_async(
+        num_messages=num_messages,
+        visibility_timeout=visibility_timeout_s,
+        shutdown_event=shutdown_event,
+        concurrency=concurrency,
+    )
+
+
+def listen_for_messages_multiprocess(
+    num_processes: typing.Optional[int] = None,
+    num_messages: int = 10,
+    visibility_timeout_s: typing.Optional[int] = None,
+    shutdown_event: typing.Optional[threading.Event] = None,
+    concurrency: int = 1,
+    max_messages_per_process: typing.Optional[int] = None,
+    max_rss_bytes: typing.Optional[int] = None,
+    shutdown_grace_period_s: float = 30,
+) -> None:
+    """
+    Starts Hedwig listeners in multiple worker processes, so CPU bound callbacks can use all cores. Settings,
+    validator and callbacks are loaded before worker processes are forked, and each worker then runs
+    :meth:`hedwig.consumer.listen_for_messages`. Workers that crash are restarted, with exponential backoff if they
+    keep crashing on startup, and SIGTERM / SIGINT received by the supervisor are forwarded to all workers.
+
+    This function is blocking and must be called from the main thread. It's only supported on POSIX systems.
+
+    :param num_processes: Number of worker processes. Defaults to number of CPUs
+    :param num_messages: Maximum number of messages to fetch in one API call. Defaults to 10
+    :param visibility_timeout_s: The number of seconds the message should remain invisible to other queue readers.
+        Defaults to None, which is queue default
+    :param shutdown_event: An event to signal that the process should shut down. Workers are stopped after their
+        current messages have been processed.
+    :param concurrency: Number of messages to process concurrently within each worker process. Defaults to 1
+    :param max_messages_per_process: If set, a worker is replaced by a new process after processing these many messages
+    :param max_rss_bytes: If set, a worker is replaced by a new process once its resident memory exceeds this value
+    :param shutdown_grace_period_s: Number of seconds workers are given to finish their current messages on shutdown,
+        after which they're killed. Defaults to 30
+    """
+    from hedwig.supervisor import ConsumerSupervisor
+
+    supervisor = ConsumerSupervisor(
+        num_processes or os.cpu_count() or 1,
+        num_messages=num_messages,
+        visibility_timeout_s=visibility_timeout_s,
+        concurrency=concurrency,
+        max_messages_per_process=max_messages_per_process,
+        max_rss_bytes=max_rss_bytes,
+        shutdown_event=shutdown_event,
+        shutdown_grace_period_s=shutdown_grace_period_s,
     )
+    supervisor.run()
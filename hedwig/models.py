@@ -1,16 +1,18 @@
 import copy
 import dataclasses
+import re
+import sys
 import time
 import uuid
 from concurrent.futures import Future
-from distutils.version import StrictVersion
 from enum import Enum
-from functools import lru_cache
+from functools import lru_cache, total_ordering
 from typing import Union, Any, cast, Tuple, Dict, Optional
 
 from hedwig.backends.utils import get_consumer_backend
 from hedwig.conf import settings
 from hedwig.exceptions import ValidationError, CallbackNotFound
+from hedwig.utils import dataclass_slots
 
 
 @lru_cache(maxsize=1)
@@ -18,6 +20,118 @@ def _validator():
     return settings.HEDWIG_DATA_VALIDATOR_CLASS()
 
 
+def _is_strict_version(value: Any) -> bool:
+    # distutils is only imported by callers that still use StrictVersion
+    module = sys.modules.get('distutils.version')
+    return module is not None and isinstance(value, module.StrictVersion)  # type: ignore
+
+
+@total_ordering
+class Version:
+    """
+    Immutable `major.minor` data schema version. Instances are interned, so versions may be compared by identity, and
+    parsed strings are cached.
+    """
+
+    __slots__ = ('major', 'minor', '_str')
+
+    major: int
+    minor: int
+    _str: str
+
+    _version_re = re.compile(r'^(\d+)\.(\d+)$')
+    _interned: Dict[Tuple[int, int], 'Version'] = {}
+    _parsed: Dict[str, 'Version'] = {}
+    # bounds the parse cache, which is keyed by untrusted strings
+    _max_parsed = 1024
+
+    def __new__(cls, major: int, minor: int = 0) -> 'Version':
+        try:
+            return cls._interned[(major, minor)]
+        except (KeyError, TypeError):
+            pass
+        if not isinstance(major, int) or not isinstance(minor, int) or major < 0 or minor < 0:
+            raise ValueError(f"invalid version number: {major!r}.{minor!r}")
+        version = object.__new__(cls)
+        object.__setattr__(version, 'major', major)
+        object.__setattr__(version, 'minor', minor)
+        object.__setattr__(version, '_str', f'{major}.{minor}')
+        return cls._interned.setdefault((major, minor), version)
+
+    @classmethod
+    def parse(cls, value: str) -> 'Version':
+        """
+        Parses a `major.minor` version string
+        :raise: :class:`ValueError` if the string isn't a valid version
+        """
+        try:
+            return cls._parsed[value]
+        except KeyError:
+            pass
+        m = cls._version_re.match(value) if isinstance(value, str) else None
+        if m is None:
+            raise ValueError(f"invalid version number '{value}'")
+        version = cls(int(m.group(1)), int(m.group(2)))
+        if len(cls._parsed) < cls._max_parsed:
+            cls._parsed[value] = version
+        return version
+
+    @classmethod
+    def coerce(cls, value: Union['Version', str, Any]) -> 'Version':
+        """
+        Converts a version string or a `distutils.version.StrictVersion` to a Version
+        """
+        if isinstance(value, Version):
+            return value
+        if _is_strict_version(value):
+            value = str(value)
+        return cls.parse(value)
+
+    @property
+    def version(self) -> Tuple[int, int, int]:
+        """
+        Version tuple, compatible with `distutils.version.StrictVersion.version`
+        """
+        return self.major, self.minor, 0
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"'{type(self).__name__}' object is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"'{type(self).__name__}' object is immutable")
+
+    def __reduce__(self):
+        return Version, (self.major, self.minor)
+
+    def __copy__(self) -> 'Version':
+        return self
+
+    def __deepcopy__(self, memo: dict) -> 'Version':
+        return self
+
+    def __str__(self) -> str:
+        return self._str
+
+    def __repr__(self) -> str:
+        return f"Version('{self._str}')"
+
+    def __hash__(self) -> int:
+        return hash((self.major, self.minor))
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Version):
+            return self is other
+        if _is_strict_version(other):
+            return other.prerelease is None and self.version == other.version
+        return NotImplemented
+
+    def __lt__(self, other: Any) -> bool:
+        if isinstance(other, Version):
+            return (self.major, self.minor) < (other.major, other.minor)
+        return NotImplemented
+
+
+@dataclass_slots
 @dataclasses.dataclass(frozen=True)
 class Metadata:
     timestamp: int = dataclasses.field(default_factory=lambda: int(time.time() * 1000))
@@ -42,6 +156,7 @@ class Metadata:
     """
 
 
+@dataclass_slots
 @dataclasses.dataclass(frozen=True)
 class Message:
     """
@@ -59,9 +174,9 @@ class Message:
     Message type. May be none if message is invalid
     """
 
-    version: StrictVersion = dataclasses.field()
+    version: Version = dataclasses.field()
     """
-    `StrictVersion` object representing data schema version.
+    :class:`Version` object representing data schema version.
     """
 
     id: str = dataclasses.field(default_factory=lambda: str(uuid.uuid4()))
@@ -74,6 +189,10 @@ class Message:
     Message metadata
     """
 
+    def __post_init__(self) -> None:
+        if type(self.version) is not Version:
+            object.__setattr__(self, 'version', Version.coerce(self.version))
+
     @staticmethod
     def deserialize(payload: Union[str, bytes], attributes: dict, provider_metadata: Any) -> 'Message':
         """
@@ -104,26 +223,35 @@ class Message:
         """
         self.callback.call(self)
 
+    async def exec_callback_async(self) -> None:
+        """
+        Call the callback with this message from an event loop
+        """
+        await self.callback.call_async(self)
+
     @classmethod
     def new(
         cls,
         msg_type: Union[str, Enum],
-        version: StrictVersion,
+        version: Union[Version, str],
         data: Any,
         msg_id: Optional[str] = None,
         headers: Optional[Dict[str, str]] = None,
+        copy_data: bool = True,
     ) -> 'Message':
         """
         Creates Message object given type, data schema version and data. This is typically used by the publisher code.
 
         :param msg_type: message type (could be an enum, it's value will be used)
-        :param version: StrictVersion representing data schema
+        :param version: Data schema version, as a :class:`Version` or a `major.minor` string.
+            `distutils.version.StrictVersion` is also accepted for backwards compatibility.
         :param data: The dict to pass in `data` field of Message.
         :param msg_id: Custom message identifier. If not passed, a randomly generated uuid will be used.
         :param headers: Custom headers (keys must not begin with reserved namespace `hedwig_`)
+        :param copy_data: If False, `data` isn't copied and the message takes ownership of it: the caller must not
+            modify `data` after this call.
         """
         assert isinstance(msg_type, (str, Enum))
-        assert isinstance(version, StrictVersion)
         assert isinstance(msg_id, (type(None), str))
         assert isinstance(headers, (type(None), dict))
 
@@ -133,9 +261,9 @@ class Message:
         return Message(
             id=msg_id or str(uuid.uuid4()),
             type=cast(str, msg_type),
-            version=version,
+            version=Version.coerce(version),
             metadata=Metadata(headers=headers or {}),
-            data=copy.deepcopy(data),
+            data=copy.deepcopy(data) if copy_data else data,
         )
 
     def publish(self) -> Union[str, Future]:
@@ -148,6 +276,15 @@ class Message:
 
         return publish(self)
 
+    async def publish_async(self) -> str:
+        """
+        Publish this message on Hedwig infra from an event loop
+        :returns: the published message id
+        """
+        from hedwig.publisher import publish_async
+
+        return await publish_async(self)
+
     def extend_visibility_timeout(self, visibility_timeout_s: int) -> None:
         """
         Extends visibility timeout of a message for long running tasks.
@@ -166,7 +303,7 @@ class Message:
 
     @property
     def major_version(self) -> int:
-        return self.version.version[0]
+        return self.version.major
 
     @property
     def timestamp(self) -> int:
@@ -191,6 +328,13 @@ class Message:
         """
         return _validator().serialize(self)
 
+    def serialize_bytes(self) -> Tuple[bytes, dict, Optional[str]]:
+        """
+        Serialize a message for transports that require bytes
+        :return: Tuple of message payload, transport attributes, and text encoding if payload is text
+        """
+        return _validator().serialize_bytes(self)
+
     def serialize_containerized(self) -> Union[str, bytes]:
         """
         Serialize a message using containerized format regardless of configured settings. In most cases, you just want
@@ -213,7 +357,10 @@ class Message:
         :param new_headers:
         :return:
         """
-        return dataclasses.replace(self, metadata=dataclasses.replace(self.metadata, headers=new_headers))
+        metadata = self.metadata
+        return self._with_metadata(
+            Metadata(metadata.timestamp, metadata.publisher, new_headers, metadata.provider_metadata)
+        )
 
     def with_provider_metadata(self, new_provider_metadata: Any) -> 'Message':
         """
@@ -221,6 +368,10 @@ class Message:
         :param new_provider_metadata:
         :return:
         """
-        return dataclasses.replace(
-            self, metadata=dataclasses.replace(self.metadata, provider_metadata=new_provider_metadata)
+        metadata = self.metadata
+        return self._with_metadata(
+            Metadata(metadata.timestamp, metadata.publisher, metadata.headers, new_provider_metadata)
         )
+
+    def _with_metadata(self, metadata: Metadata) -> 'Message':
+        return Message(self.data, self.type, self.version, self.id, metadata)
@@ -1,5 +1,7 @@
+import asyncio
 import typing
 from concurrent.futures import Future
+from functools import partial
 
 from hedwig.backends.base import HedwigPublisherBaseBackend
 from hedwig.backends.utils import get_publisher_backend
@@ -14,3 +16,17 @@ def publish(message: Message, backend: HedwigPublisherBaseBackend = None) -> typ
     """
     backend = backend or get_publisher_backend()
     return backend.publish(message)
+
+
+async def publish_async(message: Message, backend: typing.Optional[HedwigPublisherBaseBackend] = None) -> str:
+    """
+    Publishes a message on Hedwig topic from an event loop. The publish API call runs in the loop's default executor,
+    and for async publishers, the returned future is awaited without blocking the event loop.
+    :returns: the published message id
+    """
+    loop = asyncio.get_event_loop()
+    backend = backend or get_publisher_backend()
+    result = await loop.run_in_executor(None, partial(backend.publish, message))
+    if isinstance(result, Future):
+        return await asyncio.wrap_future(result)
+    return result
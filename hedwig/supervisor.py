@@ -0,0 +1,210 @@
+import logging
+import os
+import resource
+import signal
+import sys
+import threading
+import time
+import typing
+
+from hedwig.backends.utils import get_consumer_backend
+from hedwig.conf import settings
+from hedwig.utils import log
+
+
+def _rss_bytes() -> int:
+    """
+    Current resident set size of this process in bytes
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):  # pragma: no cover
+        # not linux: fall back to peak RSS, which macOS reports in bytes and other systems, e.g. BSDs, in kilobytes
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def preload() -> None:
+    """
+    Loads settings, validator, and callbacks so these are shared with worker processes using copy-on-write.
+    Transport clients are NOT created here since gRPC and boto3 clients aren't fork-safe.
+    """
+    from hedwig.callback import _callbacks
+    from hedwig.models import _validator
+
+    _validator()
+    _callbacks()
+    # side-effect: resolves import strings
+    _ = settings.HEDWIG_PRE_PROCESS_HOOK, settings.HEDWIG_POST_PROCESS_HOOK, settings.HEDWIG_CONSUMER_BACKEND
+
+
+class ConsumerSupervisor:
+    """
+    Supervises a fixed number of forked consumer worker processes. Each worker runs the regular consumer loop. Workers
+    that exit are restarted until shutdown, and shutdown signals are forwarded to all workers. Workers that keep
+    crashing on startup are restarted with exponential backoff, and workers that don't exit within the shutdown grace
+    period are killed.
+    """
+
+    CHECK_INTERVAL_S = 1
+    # workers that crash within this many seconds of starting are considered to be crashing on startup
+    MIN_UPTIME_S = 10
+    RESTART_BACKOFF_S = 1
+    MAX_RESTART_BACKOFF_S = 60
+
+    def __init__(
+        self,
+        num_processes: int,
+        num_messages: int = 10,
+        visibility_timeout_s: typing.Optional[int] = None,
+        concurrency: int = 1,
+        max_messages_per_process: typing.Optional[int] = None,
+        max_rss_bytes: typing.Optional[int] = None,
+        shutdown_event: typing.Optional[threading.Event] = None,
+        shutdown_grace_period_s: float = 30,
+    ) -> None:
+        if num_processes < 1:
+            raise ValueError("Invalid num_processes")
+        self.num_processes = num_processes
+        self.num_messages = num_messages
+        self.visibility_timeout_s = visibility_timeout_s
+        self.concurrency = concurrency
+        self.max_messages_per_process = max_messages_per_process
+        self.max_rss_bytes = max_rss_bytes
+        self.shutdown_event = shutdown_event or threading.Event()
+        self.shutdown_grace_period_s = shutdown_grace_period_s
+        # worker pids, with the time they were started
+        self._workers: typing.Dict[int, float] = {}
+        self._startup_crashes = 0
+        self._next_spawn_at = 0.0
+
+    def _should_recycle(self, consumer_backend) -> bool:
+        if self.max_messages_per_process and consumer_backend.messages_processed >= self.max_messages_per_process:
+            log(__name__, logging.INFO, "Recycling worker after max messages")
+            return True
+        if self.max_rss_bytes and _rss_bytes() >= self.max_rss_bytes:
+            log(__name__, logging.INFO, "Recycling worker after reaching max memory")
+            return True
+        return False
+
+    def _monitor(self, consumer_backend, shutdown_event: threading.Event) -> None:
+        while not shutdown_event.wait(self.CHECK_INTERVAL_S):
+            if self._should_recycle(consumer_backend):
+                shutdown_event.set()
+
+    def run_worker(self) -> None:
+        """
+        Runs the consumer loop in the current process until a shutdown signal is received, or the worker needs to be
+        recycled.
+        """
+        shutdown_event = threading.Event()
+
+        def _shutdown(signum, frame):
+            shutdown_event.set()
+
+        signal.signal(signal.SIGTERM, _shutdown)
+        signal.signal(signal.SIGINT, _shutdown)
+
+        consumer_backend = get_consumer_backend()
+        if self.max_messages_per_process or self.max_rss_bytes:
+            threading.Thread(
+                target=self._monitor, args=(consumer_backend, shutdown_event), name='hedwig-monitor', daemon=True
+            ).start()
+        consumer_backend.fetch_and_process_messages(
+            num_messages=self.num_messages,
+            visibility_timeout=self.visibility_timeout_s,
+            shutdown_event=shutdown_event,
+            concurrency=self.concurrency,
+        )
+
+    def _spawn_worker(self) -> None:
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            # child process: never return into the supervisor's stack
+            exit_code = 0
+            try:
+                self.run_worker()
+            except BaseException:
+                log(__name__, logging.ERROR, "Exception in worker process", exc_info=True)
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        log(__name__, logging.INFO, "Started worker process", extra={'pid': pid})
+        self._workers[pid] = time.monotonic()
+
+    def _reap_workers(self) -> None:
+        for pid in list(self._workers):
+            try:
+                waited_pid, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                waited_pid, status = pid, 0
+            if waited_pid == 0:
+                continue
+            uptime = time.monotonic() - self._workers.pop(pid)
+            if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+                log(__name__, logging.INFO, "Worker process exited", extra={'pid': pid})
+                self._startup_crashes = 0
+            elif uptime >= self.MIN_UPTIME_S:
+                log(__name__, logging.ERROR, "Worker process crashed", extra={'pid': pid, 'status': status})
+                self._startup_crashes = 0
+            else:
+                self._startup_crashes += 1
+                backoff = min(self.RESTART_BACKOFF_S * 2 ** (self._startup_crashes - 1), self.MAX_RESTART_BACKOFF_S)
+                self._next_spawn_at = time.monotonic() + backoff
+                log(
+                    __name__,
+                    logging.ERROR,
+                    "Worker process crashed on startup",
+                    extra={'pid': pid, 'status': status, 'restart_backoff_s': backoff},
+                )
+
+    def _signal_workers(self, signum: int) -> None:
+        for pid in self._workers:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        """
+        Starts worker processes and supervises them until shutdown event is set, or a SIGTERM / SIGINT is received.
+        """
+        preload()
+
+        def _shutdown(signum, frame):
+            self.shutdown_event.set()
+
+        original_handlers = {signum: signal.signal(signum, _shutdown) for signum in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            while not self.shutdown_event.is_set():
+                self._reap_workers()
+                while (
+                    len(self._workers) < self.num_processes
+                    and not self.shutdown_event.is_set()
+                    and time.monotonic() >= self._next_spawn_at
+                ):
+                    self._spawn_worker()
+                self.shutdown_event.wait(self.CHECK_INTERVAL_S)
+
+            # let workers finish in-flight messages
+            self._signal_workers(signal.SIGTERM)
+            kill_at = time.monotonic() + self.shutdown_grace_period_s
+            killed = False
+            while self._workers:
+                self._reap_workers()
+                if not self._workers:
+                    break
+                if not killed and time.monotonic() >= kill_at:
+                    log(
+                        __name__,
+                        logging.WARNING,
+                        "Killing worker processes that didn't exit within shutdown grace period",
+                        extra={'pids': list(self._workers)},
+                    )
+                    self._signal_workers(signal.SIGKILL)
+                    killed = True
+                time.sleep(0.1)
+        finally:
+            for signum, handler in original_handlers.items():
+                signal.signal(signum, handler)
@@ -1,13 +1,12 @@
 import time
 import typing
 import uuid
-from distutils.version import StrictVersion
 from enum import Enum
 
 import factory
 
 from hedwig.conf import settings
-from hedwig.models import Message, Metadata
+from hedwig.models import Message, Metadata, Version
 
 
 class HeadersFactory(factory.DictFactory):
@@ -40,7 +39,7 @@ class BaseMessageFactory(factory.Factory):
         addition_version = 0
         msg_type = None  # required
 
-    version = factory.LazyAttribute(lambda obj: StrictVersion(f'{obj.model_version}.{obj.addition_version}'))
+    version = factory.LazyAttribute(lambda obj: Version(obj.model_version, obj.addition_version))
     type = factory.LazyAttribute(lambda obj: obj.msg_type.value if isinstance(obj.msg_type, Enum) else obj.msg_type)
     id = factory.LazyFunction(lambda: str(uuid.uuid4()))
     metadata = factory.SubFactory(MetadataFactory)
@@ -1,12 +1,14 @@
 import pprint
 from contextlib import ExitStack
-from distutils.version import StrictVersion
 from enum import Enum
-from typing import Optional, Union, Generator, Any
+from typing import Optional, Union, Generator, Any, TYPE_CHECKING
 from unittest import mock
 
 import pytest
 
+if TYPE_CHECKING:  # pragma: no cover
+    from hedwig.models import Version
+
 
 __all__ = ['mock_hedwig_publish']
 
@@ -16,9 +18,7 @@ class HedwigPublishMock(mock.MagicMock):
     Custom mock class used by :meth:`hedwig.testing.pytest_plugin.mock_hedwig_publish` to mock the publisher.
     """
 
-    def _message_published(
-        self, msg_type: Union[str, Enum], data: Optional[Any], version: Union[str, StrictVersion]
-    ) -> bool:
+    def _message_published(self, msg_type: Union[str, Enum], data: Optional[Any], version: 'Version') -> bool:
         if isinstance(msg_type, Enum):
             msg_type = msg_type.value
         return any(
@@ -30,26 +30,28 @@ class HedwigPublishMock(mock.MagicMock):
         return pprint.pformat([(msg.type, msg.data, msg.version) for (msg,), _ in self.call_args_list])
 
     def assert_message_published(
-        self, msg_type: Union[str, Enum], data: Any = None, version: Union[str, StrictVersion] = StrictVersion('1.0')
+        self, msg_type: Union[str, Enum], data: Any = None, version: Union[str, 'Version'] = '1.0'
     ) -> None:
         """
         Helper function to check if a Hedwig message with given type, data
         and schema version was sent.
         """
-        if not isinstance(version, StrictVersion):
-            version = StrictVersion(version)
+        from hedwig.models import Version
+
+        version = Version.coerce(version)
 
         assert self._message_published(msg_type, data, version), self._error_message()
 
     def assert_message_not_published(
-        self, msg_type: Union[str, Enum], data: Any = None, version: Union[str, StrictVersion] = StrictVersion('1.0')
+        self, msg_type: Union[str, Enum], data: Any = None, version: Union[str, 'Version'] = '1.0'
     ) -> None:
         """
         Helper function to check that a Hedwig message of given type, data
         and schema was NOT sent.
         """
-        if not isinstance(version, StrictVersion):
-            version = StrictVersion(version)
+        from hedwig.models import Version
+
+        version = Version.coerce(version)
 
         assert not self._message_published(msg_type, data, version), self._error_message()
 
@@ -1,21 +1,71 @@
+import dataclasses
+import importlib
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Type, TypeVar, cast
 
-try:
-    import structlog
-except ImportError:  # pragma: no cover
-    structlog = None  # type: ignore
+# structlog is slow to import, so it's only imported when the first message is logged
+_NOT_IMPORTED: Any = object()
+structlog: Any = _NOT_IMPORTED
+
+T = TypeVar('T')
+
+
+def _dataclass_getstate(self) -> list:
+    return [getattr(self, field.name) for field in dataclasses.fields(self)]
+
+
+def _dataclass_setstate(self, state: list) -> None:
+    # frozen dataclasses can't use setattr
+    for field, value in zip(dataclasses.fields(self), state):
+        object.__setattr__(self, field.name, value)
+
+
+def dataclass_slots(cls: Type[T]) -> Type[T]:
+    """
+    Recreates a dataclass with `__slots__` for its fields. This is what `dataclasses.dataclass(slots=True)` does, which
+    is only supported from Python 3.10.
+    """
+    cls_dict = dict(cls.__dict__)
+    field_names = tuple(field.name for field in dataclasses.fields(cast(Any, cls)))
+    cls_dict['__slots__'] = field_names
+    for name in field_names:
+        # remove class attributes for defaults, which would conflict with slots
+        cls_dict.pop(name, None)
+    cls_dict.pop('__dict__', None)
+    cls_dict.pop('__weakref__', None)
+    metaclass: Any = type(cls)
+    slotted_cls = metaclass(cls.__name__, cls.__bases__, cls_dict)
+    slotted_cls.__qualname__ = cls.__qualname__
+    if cls.__dataclass_params__.frozen:  # type: ignore
+        # pickle and copy set slots with setattr by default
+        slotted_cls.__getstate__ = _dataclass_getstate
+        slotted_cls.__setstate__ = _dataclass_setstate
+    return slotted_cls
+
+
+def _import_structlog() -> Any:
+    """
+    :return: structlog module, or None if it's not installed
+    """
+    global structlog
+    if structlog is _NOT_IMPORTED:
+        try:
+            structlog = importlib.import_module('structlog')
+        except ImportError:  # pragma: no cover
+            structlog = None
+    return structlog
 
 
 def log(module: str, level: int, message: str, exc_info: Optional[bool] = None, extra: Optional[Dict[Any, Any]] = None):
     kwargs: Dict[Any, Any] = {}
     if exc_info is not None:
         kwargs["exc_info"] = True
-    if structlog:
+    structlog_module = _import_structlog()
+    if structlog_module:
         method_name = logging.getLevelName(level).lower()
         if extra:
             kwargs.update(extra)
-        logger = structlog.getLogger(module)
+        logger = structlog_module.getLogger(module)
         method = getattr(logger, method_name)
         method(message, **kwargs)
     else:
@@ -1,15 +1,35 @@
 import abc
-from collections import namedtuple
-from distutils.version import StrictVersion
-from typing import Any, Tuple, Union, Dict, Pattern
+import random
+from collections import Counter, namedtuple
+from functools import lru_cache
+import typing
+from typing import Any, Tuple, Union, Dict, Optional, Pattern
 
 from hedwig.conf import settings
-from hedwig.exceptions import ValidationError
-from hedwig.models import Message, Metadata
+from hedwig.exceptions import ConfigurationError, ValidationError
+from hedwig.models import Message, Metadata, Version
 
 MetaAttributes = namedtuple('MetaAttributes', ['timestamp', 'publisher', 'headers', 'id', 'schema', 'format_version'])
 
 
+@lru_cache(maxsize=128)
+def _decode_schema(schema_re: Pattern, schema: str) -> Tuple[str, Version]:
+    """
+    Decodes message type and version from an encoded schema. Cached by schema regex rather than validator, so
+    validators aren't kept alive.
+    """
+    try:
+        m = schema_re.search(schema)
+        if m is None:
+            raise ValueError
+        schema_groups = m.groups()
+        message_type = schema_groups[0]
+        full_version = Version.parse(schema_groups[1])
+    except (AttributeError, ValueError):
+        raise ValidationError(f'Invalid schema found: {schema}')
+    return message_type, full_version
+
+
 class HedwigBaseValidator:
     """
     Base class responsible for serializing / encoding and deserializing / decoding messages into / from format on the
@@ -26,12 +46,19 @@ class HedwigBaseValidator:
     A f-string that is used to encode schema that contains two placeholders: message_type, message_version
     """
 
-    _current_format_version: StrictVersion
+    _current_format_version: Version
 
-    def __init__(self, schema_fmt: str, schema_re: Pattern, current_format_version: StrictVersion):
+    publish_validations: typing.Counter[str]
+    """
+    Number of serialized messages by validation performed: `full`, `data` or `trusted`. This value is approximate when
+    messages are serialized concurrently.
+    """
+
+    def __init__(self, schema_fmt: str, schema_re: Pattern, current_format_version: Version):
         self._schema_fmt = schema_fmt
         self._schema_re = schema_re
         self._current_format_version = current_format_version
+        self.publish_validations = Counter()
 
     @abc.abstractmethod
     def _extract_data(
@@ -47,40 +74,37 @@ class HedwigBaseValidator:
         Extracts data from firehose line
         """
 
+    def _validate_data(self, message_type: str, full_version: Version, data: Any) -> None:
+        """
+        Validates data of an outgoing message without decoding a payload
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def _decode_data(
         self,
         meta_attrs: MetaAttributes,
         message_type: str,
-        full_version: StrictVersion,
+        full_version: Version,
         data: Any,
     ) -> Any:
         """
         Validates decoded data
         """
 
-    def _encode_message_type(self, message_type: str, version: StrictVersion) -> str:
+    def _encode_message_type(self, message_type: str, version: Version) -> str:
         """
         Encodes message type in outgoing message attribute
         """
         return self._schema_fmt.format(message_type=message_type, message_version=version)
 
-    def _decode_message_type(self, schema: str) -> Tuple[str, StrictVersion]:
+    def _decode_message_type(self, schema: str) -> Tuple[str, Version]:
         """
         Decode message type from meta attributes
         """
-        try:
-            m = self._schema_re.search(schema)
-            if m is None:
-                raise ValueError
-            schema_groups = m.groups()
-            message_type = schema_groups[0]
-            full_version = StrictVersion(schema_groups[1])
-        except (AttributeError, ValueError):
-            raise ValidationError(f'Invalid schema found: {schema}')
-        return message_type, full_version
+        return _decode_schema(self._schema_re, schema)
 
-    def _verify_known_minor_version(self, message_type: str, full_version: StrictVersion):
+    def _verify_known_minor_version(self, message_type: str, full_version: Version):
         """
         Validate that minor version is known
         """
@@ -142,6 +166,16 @@ class HedwigBaseValidator:
             message_payload, attributes, provider_metadata, settings.HEDWIG_USE_TRANSPORT_MESSAGE_ATTRIBUTES
         )
 
+    def _deserialize_meta_attributes(self, message_payload: Union[str, bytes], attributes: dict) -> MetaAttributes:
+        """
+        Deserialize only the meta attributes of a message. The payload isn't decoded if transport message attributes
+        are used, and the data isn't validated.
+        :raise: :class:`hedwig.ValidationError` if meta attributes are invalid.
+        """
+        if settings.HEDWIG_USE_TRANSPORT_MESSAGE_ATTRIBUTES:
+            return self._decode_meta_attributes(attributes)
+        return self._extract_data(message_payload, attributes, False)[0]
+
     def deserialize_containerized(self, message_payload: Union[str, bytes]) -> Message:
         """
         Deserialize a message assuming containerized format regardless of configured setting.
@@ -188,19 +222,30 @@ class HedwigBaseValidator:
         """
         raise NotImplementedError
 
+    def _encode_payload_bytes(
+        self, meta_attrs: MetaAttributes, data: Any, use_transport_attributes: bool
+    ) -> Tuple[bytes, dict, Optional[str]]:
+        """
+        Encodes on-the-wire payload as bytes, along with the text encoding used if the payload is text
+        """
+        message_payload, msg_attrs = self._encode_payload(meta_attrs, data, use_transport_attributes)
+        if isinstance(message_payload, str):
+            return message_payload.encode('utf8'), msg_attrs, 'utf8'
+        return message_payload, msg_attrs, None
+
     def _encode_payload_firehose(
-        self, message_type: str, version: StrictVersion, meta_attrs: MetaAttributes, data: Any
+        self, message_type: str, version: Version, meta_attrs: MetaAttributes, data: Any
     ) -> str:
         """
         Encodes firehose line
         """
         raise NotImplementedError
 
-    def _serialize(self, message: Message, use_transport_attributes: bool) -> Tuple[Union[str, bytes], dict]:
+    def _serialize_meta_attributes(self, message: Message) -> MetaAttributes:
         self._verify_known_minor_version(message.type, message.version)
         self._verify_headers(message.headers)
         schema = self._encode_message_type(message.type, message.version)
-        meta_attrs = MetaAttributes(
+        return MetaAttributes(
             message.timestamp,
             message.publisher,
             message.headers,
@@ -208,9 +253,29 @@ class HedwigBaseValidator:
             schema,
             self._current_format_version,
         )
+
+    def _publish_validation(self, message: Message) -> str:
+        """
+        Validates outgoing message data as configured by `HEDWIG_PUBLISHER_VALIDATION`.
+        :return: Validation still required on the encoded payload: `full`, or `data` / `trusted` if nothing else is
+        required
+        """
+        mode = settings.HEDWIG_PUBLISHER_VALIDATION
+        if mode == 'sampled':
+            mode = 'full' if random.random() < settings.HEDWIG_PUBLISHER_VALIDATION_SAMPLE_RATE else 'trusted'
+        elif mode not in ('full', 'data', 'trusted'):
+            raise ConfigurationError(f"Invalid publisher validation: {mode}")
+        if mode == 'data':
+            self._validate_data(message.type, message.version, message.data)
+        self.publish_validations[mode] += 1
+        return mode
+
+    def _serialize(self, message: Message, use_transport_attributes: bool) -> Tuple[Union[str, bytes], dict]:
+        meta_attrs = self._serialize_meta_attributes(message)
         message_payload, msg_attrs = self._encode_payload(meta_attrs, message.data, use_transport_attributes)
-        # validate payload from scratch before publishing
-        self._deserialize(message_payload, msg_attrs, None, use_transport_attributes)
+        if self._publish_validation(message) == 'full':
+            # validate payload from scratch before publishing
+            self._deserialize(message_payload, msg_attrs, None, use_transport_attributes)
         return message_payload, msg_attrs
 
     def serialize(self, message: Message) -> Tuple[Union[str, bytes], dict]:
@@ -220,6 +285,22 @@ class HedwigBaseValidator:
         """
         return self._serialize(message, settings.HEDWIG_USE_TRANSPORT_MESSAGE_ATTRIBUTES)
 
+    def serialize_bytes(self, message: Message) -> Tuple[bytes, dict, Optional[str]]:
+        """
+        Serialize a message for transports that require bytes. Text payloads are encoded without an intermediate
+        string where the validator supports it.
+        :return: Tuple of message payload, transport attributes, and text encoding if payload is text
+        """
+        use_transport_attributes = settings.HEDWIG_USE_TRANSPORT_MESSAGE_ATTRIBUTES
+        meta_attrs = self._serialize_meta_attributes(message)
+        message_payload, msg_attrs, encoding = self._encode_payload_bytes(
+            meta_attrs, message.data, use_transport_attributes
+        )
+        if self._publish_validation(message) == 'full':
+            # validate payload from scratch before publishing
+            self._deserialize(message_payload, msg_attrs, None, use_transport_attributes)
+        return message_payload, msg_attrs, encoding
+
     def serialize_containerized(self, message: Message) -> Union[str, bytes]:
         """
         Serialize a message using containerized format regardless of configured settings. In most cases, you just want
@@ -244,8 +325,9 @@ class HedwigBaseValidator:
             self._current_format_version,
         )
         message_payload = self._encode_payload_firehose(message.type, message.version, meta_attrs, message.data)
-        # validate payload from scratch
-        self.deserialize_firehose(message_payload)
+        if self._publish_validation(message) == 'full':
+            # validate payload from scratch
+            self.deserialize_firehose(message_payload)
         return message_payload
 
     def _decode_meta_attributes(self, attributes: Dict[str, str]) -> MetaAttributes:
@@ -274,7 +356,7 @@ class HedwigBaseValidator:
             headers,
             attributes['hedwig_id'],
             attributes['hedwig_schema'],
-            StrictVersion(attributes['hedwig_format_version']),
+            Version.parse(attributes['hedwig_format_version']),
         )
 
     def _encode_meta_attributes(self, meta_attrs: MetaAttributes) -> Dict[str, str]:
@@ -0,0 +1,247 @@
+import itertools
+import re
+from numbers import Number
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urldefrag, urljoin
+
+from jsonschema import FormatChecker
+
+
+class _Unsupported(Exception):
+    """
+    Schema uses a feature that the compiler can't express
+    """
+
+
+_TYPE_CHECKS = {
+    'array': 'isinstance(x, list)',
+    'boolean': 'isinstance(x, bool)',
+    'integer': '(isinstance(x, int) and not isinstance(x, bool))',
+    'null': 'x is None',
+    'number': '(isinstance(x, Number) and not isinstance(x, bool))',
+    'object': 'isinstance(x, dict)',
+    'string': 'isinstance(x, str)',
+}
+
+# keywords that need a specific type, and keywords that may apply to any instance
+_GUARDS = {
+    'string': 'isinstance(x, str)',
+    'number': 'isinstance(x, Number) and not isinstance(x, bool)',
+    'object': 'isinstance(x, dict)',
+    'array': 'isinstance(x, list)',
+}
+
+
+def _equal(one: Any, two: Any) -> bool:
+    # same semantics as jsonschema: booleans are never equal to numbers
+    if isinstance(one, bool) or isinstance(two, bool):
+        return type(one) is type(two) and one == two
+    return one == two
+
+
+def _never_valid(instance: Any) -> bool:
+    return False
+
+
+class _Compiler:
+    def __init__(self, resolver, format_checker: Optional[FormatChecker]) -> None:
+        self._resolver = resolver
+        self._format_checker = format_checker
+        self._names = (f'_v{i}' for i in itertools.count())
+        self._namespace: Dict[str, Any] = {'Number': Number, '_equal': _equal}
+        self._functions: List[str] = []
+        # resolved ref url -> function name
+        self._refs: Dict[str, str] = {}
+
+    def compile(self, schema: dict) -> Callable[[Any], bool]:
+        scope = self._resolver.resolution_scope
+        if isinstance(schema, dict) and 'id' in schema and urljoin(scope, schema['id']) != scope:
+            raise _Unsupported('id')
+        name = self._function(schema, scope, root=True)
+        exec(compile('\n\n'.join(self._functions), '<hedwig-jsonschema>', 'exec'), self._namespace)
+        return self._namespace[name]
+
+    def _constant(self, value: Any) -> str:
+        name = f'_c{len(self._namespace)}'
+        self._namespace[name] = value
+        return name
+
+    def _ref(self, ref: str, scope: str) -> str:
+        url = urljoin(scope, ref).rstrip('/')
+        if url in self._refs:
+            return self._refs[url]
+        try:
+            _, resolved = self._resolver.resolve(url)
+        except Exception:
+            raise _Unsupported('$ref')
+        name = next(self._names)
+        # registered before compiling so recursive refs reuse this function
+        self._refs[url] = name
+        self._function(resolved, urldefrag(url)[0], name=name)
+        return name
+
+    def _function(self, schema: Any, scope: str, root: bool = False, name: Optional[str] = None) -> str:
+        if not isinstance(schema, dict):
+            raise _Unsupported('schema')
+        if '$ref' in schema:
+            # draft 4 ignores all other keywords
+            ref_name = self._ref(schema['$ref'], scope)
+            if name is None:
+                return ref_name
+            self._functions.append(f'def {name}(x):\n    return {ref_name}(x)')
+            return name
+        if 'id' in schema and not root:
+            raise _Unsupported('id')
+
+        name = name or next(self._names)
+        checks: Dict[Optional[str], List[str]] = {None: [], **{guard: [] for guard in _GUARDS}}
+        for keyword, value in schema.items():
+            handler = getattr(self, f'_keyword_{keyword}', None)
+            if handler is not None:
+                handler(value, schema, scope, checks)
+            elif keyword in ('dependencies', 'multipleOf') or (keyword == 'uniqueItems' and value):
+                raise _Unsupported(keyword)
+
+        lines = [f'def {name}(x):']
+        for guard, guarded in checks.items():
+            if not guarded:
+                continue
+            indent = '    '
+            if guard is not None:
+                lines.append(f'    if {_GUARDS[guard]}:')
+                indent = '        '
+            for check in guarded:
+                lines.extend(f'{indent}{line}' for line in check.splitlines())
+        lines.append('    return True')
+        self._functions.append('\n'.join(lines))
+        return name
+
+    def _keyword_type(self, value, schema, scope, checks) -> None:
+        types = [value] if isinstance(value, str) else value
+        try:
+            expr = ' or '.join(_TYPE_CHECKS[t] for t in types)
+        except (KeyError, TypeError):
+            raise _Unsupported('type')
+        checks[None].append(f'if not ({expr}):\n    return False')
+
+    def _keyword_enum(self, value, schema, scope, checks) -> None:
+        if any(isinstance(v, (dict, list)) for v in value):
+            raise _Unsupported('enum')
+        if all(isinstance(v, str) for v in value):
+            checks[None].append(
+                f'if not (isinstance(x, str) and x in {self._constant(frozenset(value))}):\n    return False'
+            )
+        else:
+            values = self._constant(tuple(value))
+            checks[None].append(f'if not any(_equal(x, v) for v in {values}):\n    return False')
+
+    def _keyword_format(self, value, schema, scope, checks) -> None:
+        if self._format_checker is None:
+            return
+        conforms = self._constant(self._format_checker.conforms)
+        checks[None].append(f'if not {conforms}(x, {value!r}):\n    return False')
+
+    def _keyword_minLength(self, value, schema, scope, checks) -> None:
+        checks['string'].append(f'if len(x) < {value!r}:\n    return False')
+
+    def _keyword_maxLength(self, value, schema, scope, checks) -> None:
+        checks['string'].append(f'if len(x) > {value!r}:\n    return False')
+
+    def _keyword_pattern(self, value, schema, scope, checks) -> None:
+        checks['string'].append(f'if not {self._constant(re.compile(value))}.search(x):\n    return False')
+
+    def _keyword_minimum(self, value, schema, scope, checks) -> None:
+        op = '<=' if schema.get('exclusiveMinimum', False) else '<'
+        checks['number'].append(f'if x {op} {self._constant(value)}:\n    return False')
+
+    def _keyword_maximum(self, value, schema, scope, checks) -> None:
+        op = '>=' if schema.get('exclusiveMaximum', False) else '>'
+        checks['number'].append(f'if x {op} {self._constant(value)}:\n    return False')
+
+    def _keyword_required(self, value, schema, scope, checks) -> None:
+        expr = ' and '.join(f'{k!r} in x' for k in value) or 'True'
+        checks['object'].append(f'if not ({expr}):\n    return False')
+
+    def _keyword_minProperties(self, value, schema, scope, checks) -> None:
+        checks['object'].append(f'if len(x) < {value!r}:\n    return False')
+
+    def _keyword_maxProperties(self, value, schema, scope, checks) -> None:
+        checks['object'].append(f'if len(x) > {value!r}:\n    return False')
+
+    def _keyword_properties(self, value, schema, scope, checks) -> None:
+        for prop, subschema in value.items():
+            fn = self._function(subschema, scope)
+            checks['object'].append(f'if {prop!r} in x and not {fn}(x[{prop!r}]):\n    return False')
+
+    def _keyword_patternProperties(self, value, schema, scope, checks) -> None:
+        for pattern, subschema in value.items():
+            fn = self._function(subschema, scope)
+            regex = self._constant(re.compile(pattern))
+            checks['object'].append(
+                f'for k, v in x.items():\n    if {regex}.search(k) and not {fn}(v):\n        return False'
+            )
+
+    def _keyword_additionalProperties(self, value, schema, scope, checks) -> None:
+        if value is True or value == {}:
+            return
+        known = self._constant(frozenset(schema.get('properties', {})))
+        patterns = self._constant(tuple(re.compile(p) for p in schema.get('patternProperties', {})))
+        check = 'False' if value is False else f'{self._function(value, scope)}(v)'
+        checks['object'].append(
+            f'for k, v in x.items():\n'
+            f'    if k not in {known} and not any(p.search(k) for p in {patterns}) and not {check}:\n'
+            f'        return False'
+        )
+
+    def _keyword_items(self, value, schema, scope, checks) -> None:
+        if isinstance(value, dict):
+            fn = self._function(value, scope)
+            checks['array'].append(f'for v in x:\n    if not {fn}(v):\n        return False')
+            return
+        for i, subschema in enumerate(value):
+            fn = self._function(subschema, scope)
+            checks['array'].append(f'if len(x) > {i} and not {fn}(x[{i}]):\n    return False')
+        additional = schema.get('additionalItems', True)
+        if additional is False:
+            checks['array'].append(f'if len(x) > {len(value)}:\n    return False')
+        elif additional is not True:
+            fn = self._function(additional, scope)
+            checks['array'].append(f'for v in x[{len(value)}:]:\n    if not {fn}(v):\n        return False')
+
+    def _keyword_minItems(self, value, schema, scope, checks) -> None:
+        checks['array'].append(f'if len(x) < {value!r}:\n    return False')
+
+    def _keyword_maxItems(self, value, schema, scope, checks) -> None:
+        checks['array'].append(f'if len(x) > {value!r}:\n    return False')
+
+    def _keyword_allOf(self, value, schema, scope, checks) -> None:
+        for subschema in value:
+            checks[None].append(f'if not {self._function(subschema, scope)}(x):\n    return False')
+
+    def _keyword_anyOf(self, value, schema, scope, checks) -> None:
+        expr = ' or '.join(f'{self._function(subschema, scope)}(x)' for subschema in value)
+        checks[None].append(f'if not ({expr}):\n    return False')
+
+    def _keyword_oneOf(self, value, schema, scope, checks) -> None:
+        calls = ', '.join(f'{self._function(subschema, scope)}(x)' for subschema in value)
+        checks[None].append(f'if [{calls}].count(True) != 1:\n    return False')
+
+    def _keyword_not(self, value, schema, scope, checks) -> None:
+        checks[None].append(f'if {self._function(value, scope)}(x):\n    return False')
+
+
+def compile_schema(schema: dict, resolver, format_checker: Optional[FormatChecker] = None) -> Callable[[Any], bool]:
+    """
+    Compiles a draft 4 JSON schema into a Python function that returns True if an instance is valid. Errors aren't
+    reported, so when the function returns False, the instance should be validated with a regular validator to get
+    error details. Schemas that use keywords not supported by the compiler compile to a function that always returns
+    False.
+
+    :param schema: The schema
+    :param resolver: Resolver for `$ref`s in the schema
+    :param format_checker: Checker for the `format` keyword. If None, formats aren't checked.
+    """
+    try:
+        return _Compiler(resolver, format_checker).compile(schema)
+    except _Unsupported:
+        return _never_valid
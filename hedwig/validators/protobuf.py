@@ -2,8 +2,8 @@ import base64
 import re
 import typing
 from copy import deepcopy
-from distutils.version import StrictVersion
-from typing import Tuple, Union, TypeVar, Type, List, Optional, MutableMapping, cast
+from types import MappingProxyType
+from typing import Tuple, Union, TypeVar, Type, List, Optional, Mapping, MutableMapping, NamedTuple, cast
 
 import funcy
 from google.protobuf import json_format
@@ -13,10 +13,11 @@ from google.protobuf.struct_pb2 import Value
 
 from hedwig.conf import settings
 from hedwig.exceptions import ValidationError
+from hedwig.models import Version
 from hedwig.protobuf import options_pb2
 from hedwig.protobuf.container_pb2 import PayloadV1
-from hedwig.protobuf.options_pb2 import MessageOptions
 from hedwig.validators.base import HedwigBaseValidator, MetaAttributes
+from hedwig.validators.protobuf_container import PackedData, TYPE_URL_PREFIX, decode_container, encode_container
 
 
 class SchemaError(Exception):
@@ -26,6 +27,13 @@ class SchemaError(Exception):
 ProtoMessageT = TypeVar("ProtoMessageT", bound=ProtoMessage)
 
 
+class _MessageInfo(NamedTuple):
+    msg_class: Type[ProtoMessage]
+    minor_version: int
+    type_name: str
+    type_url: str
+
+
 def decode_proto_json(msg_class: typing.Any, value: Union[str, bytes]) -> ProtoMessageT:
     assert isinstance(value, str)
 
@@ -52,13 +60,19 @@ class ProtobufValidator(HedwigBaseValidator):
 
     _message_name_re = re.compile(r"^(.*)V(\d+)$")
 
+    # (message type, major version) -> message info, built from proto_messages
+    _messages: Mapping[Tuple[str, int], _MessageInfo]
+
+    # message class -> Any type url
+    _type_urls: Mapping[Type[ProtoMessage], str]
+
     def __init__(self, proto_messages: Optional[List[Type[ProtoMessage]]] = None) -> None:
         # schema encoding, eg: hedwig.automatic.com/schema#/schemas/trip.created/1.0
         schema_fmt = '{message_type}/{message_version}'
         schema_re = re.compile(r'([^/]+)/([^/]+)$')
         self.proto_messages = {}
 
-        super().__init__(schema_fmt, schema_re, StrictVersion('1.0'))
+        super().__init__(schema_fmt, schema_re, Version(1, 0))
 
         if proto_messages is None:
             proto_messages = settings.HEDWIG_PROTOBUF_MESSAGES
@@ -81,38 +95,29 @@ class ProtobufValidator(HedwigBaseValidator):
         """
         return msg.SerializeToString()
 
-    def _verify_known_minor_version(self, message_type: str, full_version: StrictVersion):
-        msg_class = self.proto_messages.get((message_type, full_version.version[0]))
-        if not msg_class:
-            raise ValidationError(f"Protobuf message class not found for '{message_type}/{full_version.version[0]}'")
+    def _message_info(self, message_type: str, major_version: int) -> _MessageInfo:
+        try:
+            return self._messages[(message_type, major_version)]
+        except KeyError:
+            raise ValidationError(f"Protobuf message class not found for '{message_type}/{major_version}'")
 
-        options: MessageOptions = msg_class.DESCRIPTOR.GetOptions().Extensions[options_pb2.message_options]
-        if options.minor_version < full_version.version[1]:
+    def _verify_known_minor_version(self, message_type: str, full_version: Version):
+        minor_version = self._message_info(message_type, full_version.major).minor_version
+        if minor_version < full_version.minor:
             raise ValidationError(
-                f'Unknown minor version: {full_version.version[1]}, last known minor version: '
-                f'{options.minor_version}'
+                f'Unknown minor version: {full_version.minor}, last known minor version: {minor_version}'
             )
 
     def _extract_data(
         self, message_payload: Union[bytes, str], attributes: dict, use_transport_attributes: bool
-    ) -> Tuple[MetaAttributes, bytes]:
+    ) -> Tuple[MetaAttributes, Union[PackedData, Any, bytes]]:
         assert isinstance(message_payload, (bytes, str))
 
         if not use_transport_attributes:
             try:
-                msg_payload = self._decode_proto(PayloadV1, message_payload)  # type: ignore
+                meta_attrs, data = self._decode_container(message_payload)
             except (DecodeError, RuntimeError, AssertionError, json_format.ParseError) as e:
                 raise ValidationError(f"Invalid data for message: PayloadV1: {e}")
-
-            data = msg_payload.data
-            meta_attrs = MetaAttributes(
-                msg_payload.metadata.timestamp.ToMilliseconds(),
-                msg_payload.metadata.publisher,
-                dict(msg_payload.metadata.headers),
-                msg_payload.id,
-                msg_payload.schema,
-                msg_payload.format_version,
-            )
         else:
             data = message_payload
             meta_attrs = self._decode_meta_attributes(attributes)
@@ -136,31 +141,92 @@ class ProtobufValidator(HedwigBaseValidator):
             assert value_msg.WhichOneof("kind") == "string_value"
             data = base64.decodebytes(value_msg.string_value.encode("utf8"))
 
-        meta_attrs = MetaAttributes(
-            msg_payload.metadata.timestamp.ToMilliseconds(),
-            msg_payload.metadata.publisher,
-            dict(msg_payload.metadata.headers),
+        return self._container_meta_attributes(msg_payload), data
+
+    @staticmethod
+    def _container_meta_attributes(msg_payload: PayloadV1) -> MetaAttributes:
+        metadata = msg_payload.metadata
+        return MetaAttributes(
+            metadata.timestamp.ToMilliseconds(),
+            metadata.publisher,
+            dict(metadata.headers),
             msg_payload.id,
             msg_payload.schema,
             msg_payload.format_version,
         )
-        return meta_attrs, data
+
+    def _container_message(self, meta_attrs: MetaAttributes) -> PayloadV1:
+        """
+        Build the container message, without data
+        """
+        msg = PayloadV1()
+        msg.format_version = str(self._current_format_version)
+        msg.id = str(meta_attrs.id)
+        msg.metadata.publisher = meta_attrs.publisher
+        msg.metadata.timestamp.FromMilliseconds(meta_attrs.timestamp)
+        for k, v in meta_attrs.headers.items():
+            msg.metadata.headers[k] = v
+        msg.schema = meta_attrs.schema
+        return msg
+
+    def _decode_container(self, payload: Union[bytes, str]) -> Tuple[MetaAttributes, Union[PackedData, Any]]:
+        """
+        Decode the container, leaving data serialized until its message class is known
+        """
+        assert isinstance(payload, bytes)
+
+        container = decode_container(payload)
+        meta_attrs = MetaAttributes(
+            container.timestamp,
+            container.publisher,
+            container.headers,
+            container.id,
+            container.schema,
+            container.format_version,
+        )
+        return meta_attrs, container.data
+
+    def _encode_container(self, meta_attrs: MetaAttributes, data: ProtoMessage) -> Union[bytes, str]:
+        """
+        Encode the container by writing its wire format directly around serialized data
+        """
+        return encode_container(
+            str(self._current_format_version),
+            str(meta_attrs.id),
+            meta_attrs.publisher,
+            meta_attrs.timestamp,
+            meta_attrs.headers,
+            meta_attrs.schema,
+            self._type_urls.get(type(data)) or TYPE_URL_PREFIX + data.DESCRIPTOR.full_name,
+            cast(bytes, self._encode_proto(data)),
+        )
+
+    def _validate_data(self, message_type: str, full_version: Version, data: ProtoMessage) -> None:
+        msg_class = self._message_info(message_type, full_version.major).msg_class
+        if isinstance(data, msg_class):
+            return
+        # same leniency as decoding: other message classes are fine so long as they're wire compatible
+        try:
+            msg_class.FromString(data.SerializeToString())
+        except DecodeError as e:
+            raise ValidationError(f"Invalid data for message: {msg_class.__name__}: {e}")
 
     def _decode_data(
         self,
         meta_attrs: MetaAttributes,
         message_type: str,
-        full_version: StrictVersion,
-        data: Union[Any, bytes, str],
+        full_version: Version,
+        data: Union[Any, PackedData, bytes, str],
     ) -> ProtoMessage:
-        assert isinstance(data, (Any, bytes, str))
+        assert isinstance(data, (Any, PackedData, bytes, str))
 
-        msg_class = self.proto_messages.get((message_type, full_version.version[0]))
-        if not msg_class:
-            raise ValidationError(f"Protobuf message class not found for '{message_type}/{full_version.version[0]}'")
+        msg_class, _, type_name, _ = self._message_info(message_type, full_version.major)
 
         try:
-            if isinstance(data, Any):
+            if isinstance(data, PackedData):
+                assert data.type_name == type_name
+                data_msg = msg_class.FromString(data.value)
+            elif isinstance(data, Any):
                 assert data.Is(msg_class.DESCRIPTOR)
                 data_msg = msg_class()
                 data.Unpack(data_msg)
@@ -176,16 +242,7 @@ class ProtobufValidator(HedwigBaseValidator):
         assert isinstance(data, ProtoMessage)
 
         if not use_transport_attributes:
-            msg = PayloadV1()
-            msg.format_version = str(self._current_format_version)
-            msg.id = str(meta_attrs.id)
-            msg.metadata.publisher = meta_attrs.publisher
-            msg.metadata.timestamp.FromMilliseconds(meta_attrs.timestamp)
-            for k, v in meta_attrs.headers.items():
-                msg.metadata.headers[k] = v
-            msg.schema = meta_attrs.schema
-            msg.data.Pack(data)
-            payload = self._encode_proto(msg)
+            payload = self._encode_container(meta_attrs, data)
             msg_attrs = deepcopy(meta_attrs.headers)
         else:
             payload = self._encode_proto(data)
@@ -193,18 +250,11 @@ class ProtobufValidator(HedwigBaseValidator):
         return payload, msg_attrs
 
     def _encode_payload_firehose(
-        self, message_type: str, version: StrictVersion, meta_attrs: MetaAttributes, data: ProtoMessage
+        self, message_type: str, version: Version, meta_attrs: MetaAttributes, data: ProtoMessage
     ) -> str:
         assert isinstance(data, ProtoMessage)
 
-        msg = PayloadV1()
-        msg.format_version = str(self._current_format_version)
-        msg.id = str(meta_attrs.id)
-        msg.metadata.publisher = meta_attrs.publisher
-        msg.metadata.timestamp.FromMilliseconds(meta_attrs.timestamp)
-        for k, v in meta_attrs.headers.items():
-            msg.metadata.headers[k] = v
-        msg.schema = meta_attrs.schema
+        msg = self._container_message(meta_attrs)
         try:
             self._verify_known_minor_version(message_type, version)
             msg.data.Pack(data)
@@ -272,6 +322,19 @@ class ProtobufValidator(HedwigBaseValidator):
         if errors:
             raise SchemaError(str(errors))
 
+        self._messages = MappingProxyType(
+            {
+                key: _MessageInfo(
+                    msg_class,
+                    msg_class.DESCRIPTOR.GetOptions().Extensions[options_pb2.message_options].minor_version,
+                    msg_class.DESCRIPTOR.full_name,
+                    TYPE_URL_PREFIX + msg_class.DESCRIPTOR.full_name,
+                )
+                for key, msg_class in self.proto_messages.items()
+            }
+        )
+        self._type_urls = MappingProxyType({info.msg_class: info.type_url for info in self._messages.values()})
+
 
 class ProtobufJSONValidator(ProtobufValidator):
     """
@@ -284,3 +347,12 @@ class ProtobufJSONValidator(ProtobufValidator):
 
     def _encode_proto(self, msg: ProtoMessage) -> Union[str, bytes]:
         return encode_proto_json(msg)
+
+    def _decode_container(self, payload: Union[bytes, str]) -> Tuple[MetaAttributes, Union[PackedData, Any]]:
+        msg_payload: PayloadV1 = self._decode_proto(PayloadV1, payload)
+        return self._container_meta_attributes(msg_payload), msg_payload.data
+
+    def _encode_container(self, meta_attrs: MetaAttributes, data: ProtoMessage) -> Union[bytes, str]:
+        msg = self._container_message(meta_attrs)
+        msg.data.Pack(data)
+        return self._encode_proto(msg)
@@ -0,0 +1,264 @@
+"""
+Direct wire format encoding and decoding of the `hedwig.PayloadV1` container (see `container_pb2`), so message data is
+only serialized once when publishing, and isn't parsed along with the container when consuming.
+
+Encoded bytes are identical to `PayloadV1.SerializeToString(deterministic=True)`.
+"""
+
+from functools import lru_cache
+from typing import List, Mapping, NamedTuple, Tuple
+
+from google.protobuf.internal import api_implementation
+from google.protobuf.message import DecodeError
+
+from hedwig.protobuf.container_pb2 import PayloadV1
+
+TYPE_URL_PREFIX = 'type.googleapis.com/'
+
+_WIRETYPE_VARINT = 0
+_WIRETYPE_FIXED64 = 1
+_WIRETYPE_LENGTH_DELIMITED = 2
+_WIRETYPE_FIXED32 = 5
+
+_UINT64_MASK = (1 << 64) - 1
+
+
+class PackedData(NamedTuple):
+    """
+    Contents of the `google.protobuf.Any` data field
+    """
+
+    type_url: str
+    value: bytes
+
+    @property
+    def type_name(self) -> str:
+        return self.type_url.split('/')[-1]
+
+
+class Container(NamedTuple):
+    format_version: str
+    id: str
+    publisher: str
+    timestamp: int
+    headers: dict
+    schema: str
+    data: PackedData
+
+
+def _varint(value: int) -> bytes:
+    # negative int64 values are encoded as 10 byte two's complement
+    value &= _UINT64_MASK
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _length_delimited(number: int, value: bytes) -> bytes:
+    return bytes(((number << 3) | _WIRETYPE_LENGTH_DELIMITED,)) + _varint(len(value)) + value
+
+
+def _string_field(number: int, value: str) -> bytes:
+    # proto3 omits fields with default values
+    if not value:
+        return b''
+    return _length_delimited(number, value.encode('utf8'))
+
+
+# for fields that are the same across messages
+_constant_string_field = lru_cache(maxsize=256)(_string_field)
+
+
+def _timestamp(timestamp_ms: int) -> bytes:
+    seconds, millis = divmod(timestamp_ms, 1000)
+    return (b'\x08' + _varint(seconds) if seconds else b'') + (b'\x10' + _varint(millis * 1000000) if millis else b'')
+
+
+def encode_container(
+    format_version: str,
+    msg_id: str,
+    publisher: str,
+    timestamp_ms: int,
+    headers: Mapping[str, str],
+    schema: str,
+    type_url: str,
+    data: bytes,
+) -> bytes:
+    """
+    Encodes a `PayloadV1` container around already serialized data. Format version, publisher, schema and type url
+    fields are cached pre-encoded.
+    """
+    metadata = [_constant_string_field(1, publisher), _length_delimited(2, _timestamp(timestamp_ms))]
+    for key in sorted(headers):
+        entry = _length_delimited(1, key.encode('utf8')) + _length_delimited(2, headers[key].encode('utf8'))
+        metadata.append(_length_delimited(3, entry))
+
+    type_url_field = _constant_string_field(1, type_url)
+    # data is written as is, without copying it into an intermediate Any
+    data_header = b'\x12' + _varint(len(data)) if data else b''
+    parts: List[bytes] = [
+        _constant_string_field(1, format_version),
+        _string_field(2, msg_id),
+        _length_delimited(3, b''.join(metadata)),
+        _constant_string_field(4, schema),
+        b'*' + _varint(len(type_url_field) + len(data_header) + len(data)),
+        type_url_field,
+        data_header,
+        data,
+    ]
+    return b''.join(parts)
+
+
+def _read_varint(buffer: memoryview, pos: int, end: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        if pos >= end:
+            raise DecodeError('Truncated message.')
+        byte = buffer[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 64:
+            raise DecodeError('Too many bytes when decoding varint.')
+
+
+def _fields(buffer: memoryview, pos: int, end: int):
+    """
+    Iterates over (field number, wire type, value) in buffer[pos:end]. Value is an int for varints and a (start, end)
+    tuple for length delimited fields. Fixed width fields are skipped.
+    """
+    while pos < end:
+        tag, pos = _read_varint(buffer, pos, end)
+        number, wire_type = tag >> 3, tag & 0x7
+        if number == 0:
+            raise DecodeError('Invalid tag.')
+        if wire_type == _WIRETYPE_LENGTH_DELIMITED:
+            length, pos = _read_varint(buffer, pos, end)
+            if pos + length > end:
+                raise DecodeError('Truncated message.')
+            yield number, wire_type, (pos, pos + length)
+            pos += length
+        elif wire_type == _WIRETYPE_VARINT:
+            value, pos = _read_varint(buffer, pos, end)
+            yield number, wire_type, value
+        elif wire_type == _WIRETYPE_FIXED64:
+            pos += 8
+        elif wire_type == _WIRETYPE_FIXED32:
+            pos += 4
+        else:
+            raise DecodeError('Wrong wire type in tag.')
+    if pos != end:
+        raise DecodeError('Truncated message.')
+
+
+def _string(buffer: memoryview, span: Tuple[int, int]) -> str:
+    start, end = span
+    try:
+        return str(buffer[start:end], 'utf8')
+    except UnicodeDecodeError as e:
+        raise DecodeError(f'Invalid UTF-8 string: {e}')
+
+
+def _signed(value: int) -> int:
+    return value - (1 << 64) if value >> 63 else value
+
+
+def _decode_container_python(payload: bytes) -> Container:
+    buffer = memoryview(payload)
+    format_version = msg_id = publisher = schema = type_url = ''
+    seconds = nanos = 0
+    headers = {}
+    value_start = value_end = 0
+
+    def expect(wire_type: int, expected: int) -> None:
+        if wire_type != expected:
+            raise DecodeError('Wrong wire type in tag.')
+
+    for number, wire_type, field in _fields(buffer, 0, len(buffer)):
+        if number == 1:
+            expect(wire_type, _WIRETYPE_LENGTH_DELIMITED)
+            format_version = _string(buffer, field)
+        elif number == 2:
+            expect(wire_type, _WIRETYPE_LENGTH_DELIMITED)
+            msg_id = _string(buffer, field)
+        elif number == 3:
+            expect(wire_type, _WIRETYPE_LENGTH_DELIMITED)
+            for meta_number, meta_wire_type, meta_field in _fields(buffer, *field):
+                if meta_number == 1:
+                    expect(meta_wire_type, _WIRETYPE_LENGTH_DELIMITED)
+                    publisher = _string(buffer, meta_field)
+                elif meta_number == 2:
+                    expect(meta_wire_type, _WIRETYPE_LENGTH_DELIMITED)
+                    for ts_number, ts_wire_type, ts_field in _fields(buffer, *meta_field):
+                        if ts_number == 1:
+                            expect(ts_wire_type, _WIRETYPE_VARINT)
+                            seconds = _signed(ts_field)
+                        elif ts_number == 2:
+                            expect(ts_wire_type, _WIRETYPE_VARINT)
+                            nanos = _signed(ts_field)
+                elif meta_number == 3:
+                    expect(meta_wire_type, _WIRETYPE_LENGTH_DELIMITED)
+                    key = header_value = ''
+                    for entry_number, entry_wire_type, entry_field in _fields(buffer, *meta_field):
+                        if entry_number == 1:
+                            expect(entry_wire_type, _WIRETYPE_LENGTH_DELIMITED)
+                            key = _string(buffer, entry_field)
+                        elif entry_number == 2:
+                            expect(entry_wire_type, _WIRETYPE_LENGTH_DELIMITED)
+                            header_value = _string(buffer, entry_field)
+                    headers[key] = header_value
+        elif number == 4:
+            expect(wire_type, _WIRETYPE_LENGTH_DELIMITED)
+            schema = _string(buffer, field)
+        elif number == 5:
+            expect(wire_type, _WIRETYPE_LENGTH_DELIMITED)
+            for any_number, any_wire_type, any_field in _fields(buffer, *field):
+                if any_number == 1:
+                    expect(any_wire_type, _WIRETYPE_LENGTH_DELIMITED)
+                    type_url = _string(buffer, any_field)
+                elif any_number == 2:
+                    expect(any_wire_type, _WIRETYPE_LENGTH_DELIMITED)
+                    value_start, value_end = any_field
+
+    return Container(
+        format_version,
+        msg_id,
+        publisher,
+        seconds * 1000 + nanos // 1000000,
+        headers,
+        schema,
+        PackedData(type_url, bytes(buffer[value_start:value_end])),
+    )
+
+
+def _decode_container_native(payload: bytes) -> Container:
+    msg = PayloadV1.FromString(payload)
+    metadata = msg.metadata
+    return Container(
+        msg.format_version,
+        msg.id,
+        metadata.publisher,
+        metadata.timestamp.ToMilliseconds(),
+        dict(metadata.headers),
+        msg.schema,
+        PackedData(msg.data.type_url, msg.data.value),
+    )
+
+
+# native protobuf runtimes parse faster than Python code can walk the wire format
+_decode = _decode_container_python if api_implementation.Type() == 'python' else _decode_container_native
+
+
+def decode_container(payload: bytes) -> Container:
+    """
+    Decodes a `PayloadV1` container in a single pass. The data is returned as its type url and serialized bytes,
+    without parsing it.
+    :raise: :class:`google.protobuf.message.DecodeError` if the payload isn't a valid container
+    """
+    return _decode(payload)
@@ -33,6 +33,7 @@ tests_require = [
     'moto[sqs,sns]',
     'mypy',
     'opentelemetry-sdk',
+    'orjson',
     'protobuf',
     'pytest',
     'pytest-cov',
@@ -91,6 +92,7 @@ setup(
             'types-protobuf',
         ],
         'jsonschema': ['jsonpointer', 'jsonschema'],
+        'orjson': ['orjson'],
         'protobuf': ['protobuf'],
         'test': tests_require,
         'publish': ['bumpversion', 'twine'],
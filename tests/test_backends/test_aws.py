@@ -1,22 +1,35 @@
+import asyncio
 import base64
-import json
+import collections
+import logging
+import pickle
 import threading
+import time
+import tracemalloc
 import uuid
 from datetime import datetime, timezone
 from unittest import mock
 
+import boto3
 import freezegun
 import pytest
+from botocore.exceptions import ClientError
+from botocore.awsrequest import AWSResponse
 
 try:
     from hedwig.backends.aws import AWSMetadata
 except ImportError:
     pass
 from hedwig.backends.exceptions import PartialFailure
+from hedwig.backends.redrive import RedriveFilter, RedriveSettings
+from hedwig.callback import Callback
 from hedwig.conf import settings as hedwig_settings
-from hedwig.exceptions import ValidationError, CallbackNotFound
+from hedwig.models import _validator
+from hedwig.exceptions import ValidationError, CallbackNotFound, RetryException
+from hedwig.publisher import publish_async
 
 from tests.models import MessageType
+from tests.utils.aio import run_async
 from tests.utils.mock import mock_return_once
 
 aws = pytest.importorskip('hedwig.backends.aws')
@@ -89,6 +102,93 @@ class TestSNSPublisher:
         assert isinstance(exc_info.value.__context__, CallbackNotFound)
 
 
+class TestSNSAsyncPublisher:
+    def test_publish_success(self, mock_boto3, message, settings):
+        settings.HEDWIG_PUBLISHER_AWS_BATCH_SETTINGS = aws.BatchSettings(max_latency=60)
+        sns_publisher = aws.AWSSNSAsyncPublisherBackend()
+        sns_publisher.sns_client.publish_batch.return_value = {
+            'Successful': [{'Id': '0', 'MessageId': 'message-id-0'}, {'Id': '1', 'MessageId': 'message-id-1'}],
+            'Failed': [],
+        }
+
+        futures = [sns_publisher.publish(message), sns_publisher.publish(message)]
+        sns_publisher.flush()
+
+        assert [f.result() for f in futures] == ['message-id-0', 'message-id-1']
+        sns_publisher.sns_client.publish.assert_not_called()
+        sns_publisher.sns_client.publish_batch.assert_called_once_with(
+            TopicArn=sns_publisher._get_sns_topic(message), PublishBatchRequestEntries=mock.ANY
+        )
+        entries = sns_publisher.sns_client.publish_batch.call_args[1]['PublishBatchRequestEntries']
+        assert [e['Id'] for e in entries] == ['0', '1']
+
+    def test_publish_full_batch(self, mock_boto3, message, settings):
+        settings.HEDWIG_PUBLISHER_AWS_BATCH_SETTINGS = aws.BatchSettings(max_messages=2, max_latency=60)
+        sns_publisher = aws.AWSSNSAsyncPublisherBackend()
+        sns_publisher.sns_client.publish_batch.return_value = {
+            'Successful': [{'Id': '0', 'MessageId': 'message-id-0'}, {'Id': '1', 'MessageId': 'message-id-1'}],
+            'Failed': [],
+        }
+
+        futures = [sns_publisher.publish(message), sns_publisher.publish(message)]
+
+        # flushed by background thread without waiting for max latency
+        assert [f.result(timeout=5) for f in futures] == ['message-id-0', 'message-id-1']
+
+    def test_publish_partial_failure(self, mock_boto3, message, settings):
+        settings.HEDWIG_PUBLISHER_AWS_BATCH_SETTINGS = aws.BatchSettings(max_latency=60)
+        sns_publisher = aws.AWSSNSAsyncPublisherBackend()
+        sns_publisher.sns_client.publish_batch.return_value = {
+            'Successful': [{'Id': '0', 'MessageId': 'message-id-0'}],
+            'Failed': [{'Id': '1', 'Code': 'InternalError', 'Message': 'oops', 'SenderFault': False}],
+        }
+
+        futures = [sns_publisher.publish(message), sns_publisher.publish(message)]
+        sns_publisher.flush()
+
+        assert futures[0].result() == 'message-id-0'
+        with pytest.raises(aws.PublishBatchEntryFailure) as exc_info:
+            futures[1].result()
+        assert exc_info.value.code == 'InternalError'
+
+    def test_publish_cancelled(self, mock_boto3, message, settings):
+        settings.HEDWIG_PUBLISHER_AWS_BATCH_SETTINGS = aws.BatchSettings(max_latency=0.05)
+        sns_publisher = aws.AWSSNSAsyncPublisherBackend()
+        sns_publisher.sns_client.publish_batch.return_value = {
+            'Successful': [{'Id': '0', 'MessageId': 'message-id-0'}],
+            'Failed': [],
+        }
+
+        cancelled = sns_publisher.publish(message)
+        assert cancelled.cancel()
+        future = sns_publisher.publish(message)
+
+        # publisher thread is still alive after skipping the cancelled message
+        assert future.result(timeout=5) == 'message-id-0'
+        assert sns_publisher._flush_thread.is_alive()
+        for call in sns_publisher.sns_client.publish_batch.call_args_list:
+            assert len(call[1]['PublishBatchRequestEntries']) == 1
+
+        # messages published after a cancelled batch are still published
+        cancelled = sns_publisher.publish(message)
+        assert cancelled.cancel()
+        time.sleep(0.1)
+        assert sns_publisher.publish(message).result(timeout=5) == 'message-id-0'
+
+    def test_publisher_thread_survives_exception(self, mock_boto3, message, settings):
+        settings.HEDWIG_PUBLISHER_AWS_BATCH_SETTINGS = aws.BatchSettings(max_latency=0.01)
+        sns_publisher = aws.AWSSNSAsyncPublisherBackend()
+        sns_publisher.sns_client.publish_batch.return_value = {
+            'Successful': [{'Id': '0', 'MessageId': 'message-id-0'}],
+            'Failed': [],
+        }
+
+        with mock.patch.object(sns_publisher, '_commit', side_effect=RuntimeError):
+            with pytest.raises(RuntimeError):
+                sns_publisher.publish(message).result(timeout=5)
+        assert sns_publisher.publish(message).result(timeout=5) == 'message-id-0'
+
+
 pre_process_hook = mock.MagicMock()
 post_process_hook = mock.MagicMock()
 
@@ -113,18 +213,9 @@ def _prepost_process_hooks(settings):
 
 
 class TestSQSConsumer:
-    def test_client_and_resource_instantiation(self, sqs_consumer, mock_boto3):
-        # make sure client and resource are initialized
+    def test_client_instantiation(self, sqs_consumer, mock_boto3):
+        # make sure client is initialized
         sqs_consumer.sqs_client
-        sqs_consumer.sqs_resource
-        mock_boto3.resource.assert_called_once_with(
-            'sqs',
-            region_name=hedwig_settings.AWS_REGION,
-            aws_access_key_id=hedwig_settings.AWS_ACCESS_KEY,
-            aws_secret_access_key=hedwig_settings.AWS_SECRET_KEY,
-            aws_session_token=hedwig_settings.AWS_SESSION_TOKEN,
-            endpoint_url=hedwig_settings.AWS_ENDPOINT_SQS,
-        )
         mock_boto3.client.assert_called_once_with(
             'sqs',
             region_name=hedwig_settings.AWS_REGION,
@@ -137,20 +228,67 @@ class TestSQSConsumer:
     def test_pull_messages(self, sqs_consumer):
         num_messages = 1
         visibility_timeout = 10
-        queue = mock.MagicMock()
-        sqs_consumer.sqs_resource.get_queue_by_name = mock.MagicMock(return_value=queue)
+        sqs_consumer.sqs_client.get_queue_url = mock.MagicMock(return_value={"QueueUrl": "DummyQueueUrl"})
+        sqs_consumer.sqs_client.receive_message.return_value = {
+            'Messages': [
+                {
+                    'MessageId': 'message-id',
+                    'ReceiptHandle': 'receipt',
+                    'MD5OfBody': 'md5',
+                    'Body': 'body',
+                    'Attributes': {'ApproximateReceiveCount': '1'},
+                }
+            ]
+        }
 
-        sqs_consumer.pull_messages(num_messages, visibility_timeout)
+        queue_messages = sqs_consumer.pull_messages(num_messages, visibility_timeout)
 
-        sqs_consumer.sqs_resource.get_queue_by_name.assert_called_once_with(QueueName=sqs_consumer.queue_name)
-        queue.receive_messages.assert_called_once_with(
+        assert queue_messages == [
+            aws.SQSMessage('DummyQueueUrl', 'message-id', 'receipt', 'body', {'ApproximateReceiveCount': '1'}, {})
+        ]
+        sqs_consumer.sqs_client.get_queue_url.assert_called_once_with(QueueName=sqs_consumer.queue_name)
+        sqs_consumer.sqs_client.receive_message.assert_called_once_with(
+            QueueUrl='DummyQueueUrl',
             MaxNumberOfMessages=num_messages,
             MessageAttributeNames=['All'],
-            AttributeNames=['All'],
+            AttributeNames=['ApproximateFirstReceiveTimestamp', 'SentTimestamp', 'ApproximateReceiveCount'],
             VisibilityTimeout=visibility_timeout,
             WaitTimeSeconds=sqs_consumer.WAIT_TIME_SECONDS,
         )
 
+    def test_pull_messages_pending_batch(self, sqs_consumer):
+        sqs_consumer.sqs_client.get_queue_url = mock.MagicMock(return_value={"QueueUrl": "DummyQueueUrl"})
+        sqs_consumer.sqs_client.receive_message.return_value = {}
+        sqs_consumer._start_batching()
+        sqs_consumer._batches[mock.sentinel.fn] = [mock.MagicMock()]
+        sqs_consumer._batch_deadlines[mock.sentinel.fn] = time.monotonic() + 2.5
+
+        assert sqs_consumer.pull_messages() == []
+
+        # returns in time for the pending batch to be processed
+        assert sqs_consumer.sqs_client.receive_message.call_args[1]['WaitTimeSeconds'] == 3
+
+    def test_pull_messages_extra_attributes(self, sqs_consumer, settings):
+        settings.HEDWIG_CONSUMER_AWS_ATTRIBUTE_NAMES = ('MessageGroupId', 'SentTimestamp')
+        sqs_consumer = aws.AWSSQSConsumerBackend()
+        sqs_consumer.sqs_client.get_queue_url = mock.MagicMock(return_value={"QueueUrl": "DummyQueueUrl"})
+        sqs_consumer.sqs_client.receive_message.return_value = {}
+
+        assert sqs_consumer.pull_messages() == []
+
+        sqs_consumer.sqs_client.receive_message.assert_called_once_with(
+            QueueUrl='DummyQueueUrl',
+            MaxNumberOfMessages=10,
+            MessageAttributeNames=['All'],
+            AttributeNames=[
+                'ApproximateFirstReceiveTimestamp',
+                'SentTimestamp',
+                'ApproximateReceiveCount',
+                'MessageGroupId',
+            ],
+            WaitTimeSeconds=sqs_consumer.WAIT_TIME_SECONDS,
+        )
+
     def test_extend_visibility_timeout(self, sqs_consumer):
         visibility_timeout_s = 10
         receipt = "receipt"
@@ -169,67 +307,158 @@ class TestSQSConsumer:
             QueueUrl='DummyQueueUrl', ReceiptHandle='receipt', VisibilityTimeout=10
         )
 
+    def test_metadata_times_from_epoch_ms(self):
+        timestamp = datetime(2021, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc)
+        epoch_ms = int(timestamp.timestamp() * 1000)
+
+        metadata = AWSMetadata("receipt", epoch_ms, epoch_ms + 1000, 2)
+
+        assert metadata.first_receive_time == timestamp
+        assert metadata.sent_time == datetime(2021, 1, 2, 3, 4, 6, 678000, tzinfo=timezone.utc)
+        assert metadata == AWSMetadata("receipt", timestamp, metadata.sent_time, 2)
+        assert not hasattr(metadata, '__dict__')
+
+    def test_queue_resolved_once(self, sqs_consumer):
+        sqs_consumer.sqs_client.get_queue_url = mock.MagicMock(return_value={"QueueUrl": "DummyQueueUrl"})
+        metadata = AWSMetadata("receipt", datetime.now(timezone.utc), datetime.now(timezone.utc), 1)
+
+        for _ in range(2):
+            sqs_consumer.pull_messages()
+            sqs_consumer.extend_visibility_timeout(10, metadata)
+
+        sqs_consumer.sqs_client.get_queue_url.assert_called_once_with(QueueName=sqs_consumer.queue_name)
+        assert sqs_consumer.sqs_client.receive_message.call_count == 2
+        assert sqs_consumer.sqs_client.change_message_visibility.call_count == 2
+
+    def test_queue_refreshed_if_not_found(self, sqs_consumer):
+        sqs_consumer.sqs_client.get_queue_url = mock.MagicMock(
+            side_effect=[{"QueueUrl": "StaleQueueUrl"}, {"QueueUrl": "DummyQueueUrl"}]
+        )
+        sqs_consumer.sqs_client.receive_message.side_effect = [
+            ClientError({'Error': {'Code': 'AWS.SimpleQueueService.NonExistentQueue'}}, 'ReceiveMessage'),
+            {'Messages': [{'MessageId': 'message-id', 'ReceiptHandle': 'receipt', 'Body': 'body'}]},
+        ]
+
+        assert [m.queue_url for m in sqs_consumer.pull_messages()] == ['DummyQueueUrl']
+
+        assert sqs_consumer.sqs_client.get_queue_url.call_count == 2
+        assert sqs_consumer.sqs_client.receive_message.call_args[1]['QueueUrl'] == 'DummyQueueUrl'
+
+    def test_queue_not_refreshed_on_other_errors(self, sqs_consumer):
+        sqs_consumer.sqs_client.get_queue_url = mock.MagicMock(return_value={"QueueUrl": "DummyQueueUrl"})
+        sqs_consumer.sqs_client.receive_message.side_effect = ClientError(
+            {'Error': {'Code': 'AccessDenied'}}, 'ReceiveMessage'
+        )
+
+        with pytest.raises(ClientError):
+            sqs_consumer.pull_messages()
+
+        sqs_consumer.sqs_client.get_queue_url.assert_called_once_with(QueueName=sqs_consumer.queue_name)
+
+    def test_api_calls(self, mock_boto3, settings):
+        settings.AWS_REGION = 'us-east-1'
+        with mock.patch('hedwig.backends.aws.boto3', boto3):
+            sqs_consumer = aws.AWSSQSConsumerBackend()
+            queue = boto3.resource('sqs', region_name=settings.AWS_REGION).create_queue(
+                QueueName=sqs_consumer.queue_name
+            )
+            for i in range(4):
+                queue.send_message(MessageBody=str(i))
+
+            for _ in range(2):
+                for queue_message in sqs_consumer.pull_messages(num_messages=2):
+                    sqs_consumer.ack_message(queue_message)
+
+        assert sqs_consumer.api_calls == {'GetQueueUrl': 1, 'ReceiveMessage': 2, 'DeleteMessage': 4}
+
+    @staticmethod
+    def _dlq_message(i, message_attributes=None):
+        return aws.SQSMessage('DummyDLQUrl', f'message-{i}', f'receipt-{i}', f'body-{i}', {}, message_attributes or {})
+
     def test_success_requeue_dead_letter(self, sqs_consumer):
         sqs_consumer = aws.AWSSQSConsumerBackend(dlq=True)
-        num_messages = 3
+        num_messages = 12
         visibility_timeout = 4
 
-        messages = [mock.MagicMock() for _ in range(num_messages)]
+        message_attributes = {'hedwig_id': {'DataType': 'String', 'StringValue': '123'}}
+        messages = [self._dlq_message(i, message_attributes if i % 2 else None) for i in range(num_messages)]
         sqs_consumer.pull_messages = mock.MagicMock(side_effect=iter([messages, []]))
+        sqs_consumer.sqs_client.get_queue_url = mock.MagicMock(return_value={"QueueUrl": "DummyQueueUrl"})
+        sqs_consumer.sqs_client.send_message_batch.return_value = {'Failed': []}
+        sqs_consumer.sqs_client.delete_message_batch.return_value = {'Failed': []}
+        sqs_consumer.sqs_client.get_queue_attributes.return_value = {
+            'Attributes': {'ApproximateNumberOfMessages': '0', 'ApproximateNumberOfMessagesNotVisible': '0'}
+        }
 
-        mock_queue, mock_dlq = mock.MagicMock(), mock.MagicMock()
-        mock_queue.send_messages.return_value = {'Failed': []}
-        sqs_consumer.sqs_resource.get_queue_by_name = mock.MagicMock(side_effect=iter([mock_queue, mock_dlq]))
-        mock_dlq.delete_messages.return_value = {'Failed': []}
-
-        sqs_consumer.requeue_dead_letter(num_messages=num_messages, visibility_timeout=visibility_timeout)
+        progress = sqs_consumer.requeue_dead_letter(num_messages=num_messages, visibility_timeout=visibility_timeout)
 
-        sqs_consumer.sqs_resource.get_queue_by_name.assert_has_calls(
+        assert progress.requeued == num_messages
+        assert progress.failed == 0
+        assert progress.backlog == 0
+        sqs_consumer.sqs_client.get_queue_url.assert_has_calls(
             [
                 mock.call(QueueName=f'HEDWIG-{hedwig_settings.HEDWIG_QUEUE}'),
                 mock.call(QueueName=sqs_consumer.queue_name),
             ]
         )
-
         sqs_consumer.pull_messages.assert_has_calls(
             [
                 mock.call(num_messages=num_messages, visibility_timeout=visibility_timeout),
                 mock.call(num_messages=num_messages, visibility_timeout=visibility_timeout),
             ]
         )
-        mock_queue.send_messages.assert_called_once_with(
-            Entries=[
-                {
-                    'Id': queue_message.message_id,
-                    'MessageBody': queue_message.body,
-                    'MessageAttributes': queue_message.message_attributes,
-                }
-                for queue_message in messages
+        sqs_consumer.sqs_client.send_message_batch.assert_has_calls(
+            [
+                mock.call(
+                    QueueUrl='DummyQueueUrl',
+                    Entries=[
+                        {
+                            'Id': str(i),
+                            'MessageBody': m.body,
+                            **({'MessageAttributes': m.message_attributes} if m.message_attributes else {}),
+                        }
+                        for i, m in enumerate(chunk)
+                    ],
+                )
+                for chunk in (messages[:10], messages[10:])
             ]
         )
-        mock_dlq.delete_messages.assert_called_once_with(
-            Entries=[
-                {'Id': queue_message.message_id, 'ReceiptHandle': queue_message.receipt_handle}
-                for queue_message in messages
+        sqs_consumer.sqs_client.delete_message_batch.assert_has_calls(
+            [
+                mock.call(
+                    QueueUrl='DummyDLQUrl',
+                    Entries=[{'Id': str(i), 'ReceiptHandle': m.receipt_handle} for i, m in enumerate(chunk)],
+                )
+                for chunk in (messages[:10], messages[10:])
             ]
         )
 
     def test_partial_failure_requeue_dead_letter(self, sqs_consumer):
-        num_messages = 1
-        visibility_timeout = 4
-        queue_name = "HEDWIG-DEV-RTEP"
+        messages = [self._dlq_message(i) for i in range(3)]
+        sqs_consumer.pull_messages = mock.MagicMock(side_effect=iter([messages, []]))
+        sqs_consumer.sqs_client.get_queue_url = mock.MagicMock(return_value={"QueueUrl": "DummyQueueUrl"})
+        sqs_consumer.sqs_client.send_message_batch.return_value = {
+            'Successful': [{'Id': '0'}, {'Id': '2'}],
+            'Failed': [{'Id': '1', 'SenderFault': False, 'Code': 'InternalError'}],
+        }
+        sqs_consumer.sqs_client.delete_message_batch.return_value = {'Failed': []}
+        sqs_consumer.sqs_client.get_queue_attributes.return_value = {
+            'Attributes': {'ApproximateNumberOfMessages': '0', 'ApproximateNumberOfMessagesNotVisible': '1'}
+        }
 
-        messages = [mock.MagicMock() for _ in range(num_messages)]
-        sqs_consumer.pull_messages = mock.MagicMock(side_effect=iter([messages, None]))
-        dlq_name = f'{queue_name}-DLQ'
+        progress_callback = mock.MagicMock()
 
-        mock_queue, mock_dlq = mock.MagicMock(), mock.MagicMock()
-        mock_queue.attributes = {'RedrivePolicy': json.dumps({'deadLetterTargetArn': dlq_name})}
-        mock_queue.send_messages.return_value = {'Successful': ['success_id'], 'Failed': ["fail_id"]}
-        sqs_consumer._get_queue_by_name = mock.MagicMock(side_effect=iter([mock_queue, mock_dlq]))
+        with pytest.raises(PartialFailure) as exc_info:
+            sqs_consumer.requeue_dead_letter(num_messages=3, progress_callback=progress_callback)
 
-        with pytest.raises(PartialFailure):
-            sqs_consumer.requeue_dead_letter(num_messages=num_messages, visibility_timeout=visibility_timeout)
+        assert (exc_info.value.success_count, exc_info.value.failure_count) == (2, 1)
+        progress = progress_callback.call_args[0][0]
+        assert (progress.requeued, progress.failed, progress.backlog) == (2, 1, 1)
+        # failed message is left in the DLQ
+        sqs_consumer.sqs_client.delete_message_batch.assert_called_once_with(
+            QueueUrl='DummyDLQUrl',
+            Entries=[{'Id': '0', 'ReceiptHandle': 'receipt-0'}, {'Id': '1', 'ReceiptHandle': 'receipt-2'}],
+        )
 
     def test_fetch_and_process_messages_success(
         self, sqs_consumer, message, prepost_process_hooks, use_transport_message_attrs
@@ -237,44 +466,57 @@ class TestSQSConsumer:
         shutdown_event = threading.Event()
         num_messages = 3
         visibility_timeout = 4
-        queue = mock.MagicMock()
-        sqs_consumer.sqs_resource.get_queue_by_name = mock.MagicMock(return_value=queue)
+        sqs_consumer.sqs_client.get_queue_url = mock.MagicMock(return_value={"QueueUrl": "DummyQueueUrl"})
 
         receipt = "receipt"
         sent_time = datetime.now(timezone.utc)
         first_receive_time = datetime.now(timezone.utc)
         receive_count = 1
 
-        queue_message = mock.MagicMock()
-        queue_message.receipt_handle = receipt
         payload, message_attributes = message.serialize()
         if isinstance(payload, bytes):
-            queue_message.body = base64.encodebytes(payload).decode()
+            body = base64.encodebytes(payload).decode()
             message_attributes['hedwig_encoding'] = 'base64'
         else:
-            queue_message.body = payload
-        queue_message.message_attributes = {
-            k: {'DataType': 'String', 'StringValue': v} for k, v in message_attributes.items()
-        }
-        queue_message.attributes = {
-            'ApproximateReceiveCount': receive_count,
-            'SentTimestamp': int(sent_time.timestamp() * 1000),
-            'ApproximateFirstReceiveTimestamp': int(first_receive_time.timestamp() * 1000),
+            body = payload
+        queue_message = aws.SQSMessage(
+            'DummyQueueUrl',
+            'message-id',
+            receipt,
+            body,
+            {
+                'ApproximateReceiveCount': str(receive_count),
+                'SentTimestamp': str(int(sent_time.timestamp() * 1000)),
+                'ApproximateFirstReceiveTimestamp': str(int(first_receive_time.timestamp() * 1000)),
+            },
+            {k: {'DataType': 'String', 'StringValue': v} for k, v in message_attributes.items()},
+        )
+        response = {
+            'Messages': [
+                {
+                    'MessageId': queue_message.message_id,
+                    'ReceiptHandle': queue_message.receipt_handle,
+                    'Body': queue_message.body,
+                    'Attributes': queue_message.attributes,
+                    'MessageAttributes': queue_message.message_attributes,
+                }
+            ]
         }
 
-        mock_return_once(queue.receive_messages, [queue_message], [], shutdown_event)
-        message_mock = mock.MagicMock()
+        mock_return_once(sqs_consumer.sqs_client.receive_message, response, {}, shutdown_event)
+        message_mock = mock.MagicMock(**{'callback.is_batch': False})
         sqs_consumer._build_message = mock.MagicMock(return_value=message_mock)
         sqs_consumer.process_message = mock.MagicMock(wraps=sqs_consumer.process_message)
         sqs_consumer.message_handler = mock.MagicMock(wraps=sqs_consumer.message_handler)
 
         sqs_consumer.fetch_and_process_messages(num_messages, visibility_timeout, shutdown_event)
 
-        sqs_consumer.sqs_resource.get_queue_by_name.assert_called_with(QueueName=sqs_consumer.queue_name)
-        queue.receive_messages.assert_called_with(
+        sqs_consumer.sqs_client.get_queue_url.assert_called_once_with(QueueName=sqs_consumer.queue_name)
+        sqs_consumer.sqs_client.receive_message.assert_called_with(
+            QueueUrl='DummyQueueUrl',
             MaxNumberOfMessages=num_messages,
             MessageAttributeNames=['All'],
-            AttributeNames=['All'],
+            AttributeNames=['ApproximateFirstReceiveTimestamp', 'SentTimestamp', 'ApproximateReceiveCount'],
             VisibilityTimeout=visibility_timeout,
             WaitTimeSeconds=sqs_consumer.WAIT_TIME_SECONDS,
         )
@@ -291,11 +533,565 @@ class TestSQSConsumer:
             ),
         )
         message_mock.exec_callback.assert_called_once_with()
-        queue_message.delete.assert_called_once_with()
+        sqs_consumer.sqs_client.delete_message.assert_called_once_with(QueueUrl='DummyQueueUrl', ReceiptHandle=receipt)
         pre_process_hook.assert_called_once_with(sqs_queue_message=queue_message)
         post_process_hook.assert_called_once_with(sqs_queue_message=queue_message)
 
 
+class TestSQSConsumerAckBatching:
+    @pytest.fixture(name='sqs_consumer')
+    def _sqs_consumer(self, mock_boto3, settings):
+        settings.HEDWIG_CONSUMER_AWS_ACK_BATCH_SETTINGS = aws.AckBatchSettings(max_messages=3, max_latency=60)
+        return aws.AWSSQSConsumerBackend()
+
+    @staticmethod
+    def _queue_message(receipt):
+        queue_message = mock.MagicMock()
+        queue_message.queue_url = 'DummyQueueUrl'
+        queue_message.receipt_handle = receipt
+        return queue_message
+
+    def test_ack_message_buffers(self, sqs_consumer):
+        queue_message = self._queue_message('receipt-0')
+
+        sqs_consumer.ack_message(queue_message)
+
+        sqs_consumer.sqs_client.delete_message.assert_not_called()
+        sqs_consumer.sqs_client.delete_message_batch.assert_not_called()
+
+        sqs_consumer.flush_acks()
+
+        sqs_consumer.sqs_client.delete_message_batch.assert_called_once_with(
+            QueueUrl='DummyQueueUrl', Entries=[{'Id': '0', 'ReceiptHandle': 'receipt-0'}]
+        )
+        assert sqs_consumer.ack_api_calls_saved == 0
+
+    def test_ack_message_flushes_full_batch(self, sqs_consumer):
+        queue_messages = [self._queue_message(f'receipt-{i}') for i in range(3)]
+        sqs_consumer.sqs_client.delete_message_batch.return_value = {'Successful': [], 'Failed': []}
+
+        for queue_message in queue_messages:
+            sqs_consumer.ack_message(queue_message)
+
+        sqs_consumer.sqs_client.delete_message_batch.assert_called_once_with(
+            QueueUrl='DummyQueueUrl',
+            Entries=[{'Id': str(i), 'ReceiptHandle': f'receipt-{i}'} for i in range(3)],
+        )
+        assert sqs_consumer.ack_api_calls_saved == 2
+
+    def test_ack_message_flushes_after_latency(self, mock_boto3, settings):
+        settings.HEDWIG_CONSUMER_AWS_ACK_BATCH_SETTINGS = aws.AckBatchSettings(max_latency=0.01)
+        sqs_consumer = aws.AWSSQSConsumerBackend()
+        flushed = threading.Event()
+        sqs_consumer.sqs_client.delete_message_batch.side_effect = lambda **kwargs: flushed.set() or {}
+
+        sqs_consumer.ack_message(self._queue_message('receipt-0'))
+
+        assert flushed.wait(5)
+
+    def test_flush_retries_failed_entries(self, sqs_consumer):
+        queue_messages = [self._queue_message(f'receipt-{i}') for i in range(2)]
+        sqs_consumer.sqs_client.delete_message_batch.side_effect = [
+            {
+                'Successful': [{'Id': '0'}],
+                'Failed': [{'Id': '1', 'SenderFault': False, 'Code': 'InternalError'}],
+            },
+            {'Successful': [{'Id': '1'}], 'Failed': []},
+        ]
+        for queue_message in queue_messages:
+            sqs_consumer.ack_message(queue_message)
+
+        sqs_consumer.flush_acks()
+
+        sqs_consumer.sqs_client.delete_message_batch.assert_has_calls(
+            [
+                mock.call(
+                    QueueUrl='DummyQueueUrl',
+                    Entries=[{'Id': '0', 'ReceiptHandle': 'receipt-0'}, {'Id': '1', 'ReceiptHandle': 'receipt-1'}],
+                ),
+                mock.call(QueueUrl='DummyQueueUrl', Entries=[{'Id': '1', 'ReceiptHandle': 'receipt-1'}]),
+            ]
+        )
+        # retries aren't counted as saved calls
+        assert sqs_consumer.ack_api_calls_saved == 1
+
+    def test_flush_failed_not_counted(self, sqs_consumer):
+        queue_messages = [self._queue_message(f'receipt-{i}') for i in range(3)]
+        sqs_consumer.sqs_client.delete_message_batch.return_value = {
+            'Successful': [],
+            'Failed': [{'Id': str(i), 'SenderFault': True, 'Code': 'ReceiptHandleIsInvalid'} for i in range(3)],
+        }
+        for queue_message in queue_messages:
+            sqs_consumer.ack_message(queue_message)
+
+        sqs_consumer.sqs_client.delete_message_batch.assert_called_once()
+        assert sqs_consumer.ack_api_calls_saved == 0
+
+    def test_flush_exception_not_counted(self, sqs_consumer):
+        sqs_consumer.sqs_client.delete_message_batch.side_effect = RuntimeError
+        for i in range(3):
+            sqs_consumer.ack_message(self._queue_message(f'receipt-{i}'))
+
+        sqs_consumer.sqs_client.delete_message_batch.assert_called_once()
+        assert sqs_consumer.ack_api_calls_saved == 0
+
+    def test_flush_logs_sender_fault(self, sqs_consumer):
+        queue_message = self._queue_message('receipt-0')
+        failure = {'Id': '0', 'SenderFault': True, 'Code': 'ReceiptHandleIsInvalid'}
+        sqs_consumer.sqs_client.delete_message_batch.return_value = {'Successful': [], 'Failed': [failure]}
+        sqs_consumer.ack_message(queue_message)
+
+        with mock.patch('hedwig.backends.aws.log') as logging_mock:
+            sqs_consumer.flush_acks()
+
+        sqs_consumer.sqs_client.delete_message_batch.assert_called_once()
+        logging_mock.assert_called_once_with(
+            'hedwig.backends.aws',
+            logging.ERROR,
+            'Failed to delete message',
+            extra={'queue_message': queue_message, 'failure': failure},
+        )
+
+
+class TestSQSConsumerLeases:
+    @pytest.fixture(name='sqs_consumer')
+    def _sqs_consumer(self, mock_boto3, settings):
+        settings.HEDWIG_CONSUMER_AWS_LEASE_SETTINGS = aws.LeaseSettings(extend_after_ratio=60)
+        sqs_consumer = aws.AWSSQSConsumerBackend()
+        sqs_consumer.sqs_client.get_queue_url = mock.MagicMock(return_value={"QueueUrl": "DummyQueueUrl"})
+        sqs_consumer.sqs_client.change_message_visibility_batch.return_value = {'Successful': [], 'Failed': []}
+        yield sqs_consumer
+        sqs_consumer._stop_leasing()
+
+    @staticmethod
+    def _pull(sqs_consumer, receipts, visibility_timeout=30):
+        sqs_consumer.sqs_client.receive_message.return_value = {
+            'Messages': [{'MessageId': receipt, 'ReceiptHandle': receipt, 'Body': ''} for receipt in receipts]
+        }
+        sqs_consumer._refresh_queues()
+        return sqs_consumer.pull_messages(visibility_timeout=visibility_timeout)
+
+    def test_extend_leases(self, sqs_consumer):
+        self._pull(sqs_consumer, [f'receipt-{i}' for i in range(12)])
+
+        sqs_consumer.extend_leases()
+
+        sqs_consumer.sqs_client.change_message_visibility_batch.assert_has_calls(
+            [
+                mock.call(
+                    QueueUrl='DummyQueueUrl',
+                    Entries=[
+                        {'Id': str(i), 'ReceiptHandle': f'receipt-{i}', 'VisibilityTimeout': 30} for i in range(10)
+                    ],
+                ),
+                mock.call(
+                    QueueUrl='DummyQueueUrl',
+                    Entries=[
+                        {'Id': str(i), 'ReceiptHandle': f'receipt-{10 + i}', 'VisibilityTimeout': 30} for i in range(2)
+                    ],
+                ),
+            ]
+        )
+
+    def test_default_visibility_timeout(self, sqs_consumer):
+        sqs_consumer.sqs_client.get_queue_attributes.return_value = {'Attributes': {'VisibilityTimeout': '45'}}
+
+        self._pull(sqs_consumer, ['receipt-0'], visibility_timeout=None)
+        sqs_consumer.pull_messages()
+
+        assert sqs_consumer._lease_visibility_timeout_s == 45
+        sqs_consumer.sqs_client.get_queue_attributes.assert_called_once_with(
+            QueueUrl='DummyQueueUrl', AttributeNames=['VisibilityTimeout']
+        )
+
+    def test_ack_and_nack_release_lease(self, sqs_consumer):
+        queue_messages = self._pull(sqs_consumer, ['receipt-0', 'receipt-1', 'receipt-2'])
+
+        sqs_consumer.ack_message(queue_messages[0])
+        sqs_consumer.nack_message(queue_messages[1])
+        sqs_consumer.extend_leases()
+
+        sqs_consumer.sqs_client.change_message_visibility_batch.assert_called_once_with(
+            QueueUrl='DummyQueueUrl',
+            Entries=[{'Id': '0', 'ReceiptHandle': 'receipt-2', 'VisibilityTimeout': 30}],
+        )
+
+    def test_failed_lease_is_released(self, sqs_consumer):
+        self._pull(sqs_consumer, ['receipt-0'])
+        sqs_consumer.sqs_client.change_message_visibility_batch.return_value = {
+            'Successful': [],
+            'Failed': [{'Id': '0', 'SenderFault': True, 'Code': 'ReceiptHandleIsInvalid'}],
+        }
+
+        sqs_consumer.extend_leases()
+        sqs_consumer.extend_leases()
+
+        sqs_consumer.sqs_client.change_message_visibility_batch.assert_called_once()
+
+    def test_max_lease(self, sqs_consumer):
+        sqs_consumer.lease_settings = aws.LeaseSettings(max_lease_s=60)
+        with freezegun.freeze_time() as frozen_time:
+            self._pull(sqs_consumer, ['receipt-0'])
+            frozen_time.tick(61)
+
+            sqs_consumer.extend_leases()
+
+        sqs_consumer.sqs_client.change_message_visibility_batch.assert_not_called()
+
+    @pytest.mark.parametrize('use_async', [False, True])
+    def test_lease_thread_stopped_on_shutdown(self, sqs_consumer, use_async):
+        self._pull(sqs_consumer, ['receipt-0'])
+        lease_thread = sqs_consumer._lease_thread
+        assert lease_thread.is_alive()
+
+        if use_async:
+            shutdown_event = asyncio.Event()
+            shutdown_event.set()
+            run_async(sqs_consumer.fetch_and_process_messages_async(shutdown_event=shutdown_event))
+        else:
+            shutdown_event = threading.Event()
+            shutdown_event.set()
+            sqs_consumer.fetch_and_process_messages(shutdown_event=shutdown_event)
+
+        assert not lease_thread.is_alive()
+        assert sqs_consumer._leases == {}
+        # leasing restarts with the next pull
+        self._pull(sqs_consumer, ['receipt-1'])
+        assert sqs_consumer._lease_thread.is_alive()
+
+    def test_leases_extended_in_background(self, sqs_consumer):
+        extended = threading.Event()
+        sqs_consumer.sqs_client.change_message_visibility_batch.side_effect = lambda **kwargs: extended.set() or {}
+        sqs_consumer.lease_settings = aws.LeaseSettings(extend_after_ratio=0)
+
+        self._pull(sqs_consumer, ['receipt-0'])
+
+        assert extended.wait(5)
+
+
+class TestAsyncAPIs:
+    @pytest.fixture(autouse=True)
+    def _moto_settings(self, mock_boto3, settings):
+        settings.AWS_REGION = 'us-east-1'
+        settings.AWS_ACCOUNT_ID = '123456789012'
+        with mock.patch('hedwig.backends.aws.boto3', boto3):
+            yield
+
+    def test_fetch_and_process_messages_async(self, message):
+        received = []
+        sqs_consumer = aws.AWSSQSConsumerBackend()
+        sqs_consumer.WAIT_TIME_SECONDS = 0
+        queue = boto3.resource('sqs', region_name=hedwig_settings.AWS_REGION).create_queue(
+            QueueName=sqs_consumer.queue_name
+        )
+        queue_message = aws.AWSSNSPublisherBackend()._mock_queue_message(message)
+        queue.send_message(MessageBody=queue_message.body, MessageAttributes=queue_message.message_attributes)
+
+        async def run():
+            shutdown_event = asyncio.Event()
+
+            async def handler(message):
+                await asyncio.sleep(0)
+                received.append(message)
+                shutdown_event.set()
+
+            with mock.patch('hedwig.models.Message.callback', new=Callback(handler)):
+                await sqs_consumer.fetch_and_process_messages_async(shutdown_event=shutdown_event)
+
+        run_async(run())
+
+        assert [m.id for m in received] == [message.id]
+        assert received[0].data == message.data
+        assert sqs_consumer.api_calls['DeleteMessage'] == 1
+
+    def test_publish_async(self, message):
+        sns_publisher = aws.AWSSNSPublisherBackend()
+        boto3.client('sns', region_name=hedwig_settings.AWS_REGION).create_topic(
+            Name=sns_publisher._get_sns_topic(message).split(':')[-1]
+        )
+
+        message_id = run_async(publish_async(message, sns_publisher))
+
+        assert message_id
+
+
+class TestSQSReceive:
+    @pytest.fixture(autouse=True)
+    def _moto_settings(self, mock_boto3, settings):
+        settings.AWS_REGION = 'us-east-1'
+        settings.AWS_ACCOUNT_ID = '123456789012'
+        with mock.patch('hedwig.backends.aws.boto3', boto3):
+            yield
+
+    @staticmethod
+    def _create_queue(sqs_consumer, message, num_messages):
+        queue = boto3.resource('sqs', region_name=hedwig_settings.AWS_REGION).create_queue(
+            QueueName=sqs_consumer.queue_name
+        )
+        queue_message = aws.AWSSNSPublisherBackend()._mock_queue_message(message)
+        queue.send_messages(
+            Entries=[
+                {'Id': str(i), 'MessageBody': queue_message.body, 'MessageAttributes': queue_message.message_attributes}
+                for i in range(num_messages)
+            ]
+        )
+        return queue
+
+    def test_extra_attributes(self, message, settings):
+        settings.HEDWIG_CONSUMER_AWS_ATTRIBUTE_NAMES = ('SenderId',)
+        sqs_consumer = aws.AWSSQSConsumerBackend()
+        sqs_consumer.WAIT_TIME_SECONDS = 0
+        self._create_queue(sqs_consumer, message, 1)
+
+        (queue_message,) = sqs_consumer.pull_messages()
+
+        assert set(queue_message.attributes) == {
+            'ApproximateFirstReceiveTimestamp',
+            'SentTimestamp',
+            'ApproximateReceiveCount',
+            'SenderId',
+        }
+        assert queue_message.message_attributes['hedwig_id']['StringValue'] == message.id
+        sqs_consumer.ack_message(queue_message)
+        assert sqs_consumer.pull_messages(visibility_timeout=0) == []
+
+    def test_requeue_dead_letter(self, message):
+        sqs_consumer = aws.AWSSQSConsumerBackend()
+        sqs_consumer.WAIT_TIME_SECONDS = 0
+        dlq_consumer = aws.AWSSQSConsumerBackend(dlq=True)
+        dlq_consumer.WAIT_TIME_SECONDS = 0
+        boto3.resource('sqs', region_name=hedwig_settings.AWS_REGION).create_queue(QueueName=sqs_consumer.queue_name)
+        for _ in range(3):
+            self._create_queue(dlq_consumer, message, 10)
+        reports = []
+
+        progress = dlq_consumer.requeue_dead_letter(
+            redrive_settings=RedriveSettings(concurrency=3, max_messages_per_s=1000, progress_interval_s=0.01),
+            progress_callback=reports.append,
+        )
+
+        assert (progress.requeued, progress.failed, progress.backlog) == (30, 0, 0)
+        assert reports[-1] == progress
+        assert progress.messages_per_s > 0
+        requeued = []
+        while True:
+            queue_messages = sqs_consumer.pull_messages()
+            if not queue_messages:
+                break
+            requeued.extend(queue_messages)
+        assert len(requeued) == 30
+        assert {sqs_consumer._message_handler_args(m)[1]['hedwig_id'] for m in requeued} == {message.id}
+
+    def test_requeue_dead_letter_filter(self, message_factory, use_transport_message_attrs):
+        sqs_consumer = aws.AWSSQSConsumerBackend()
+        sqs_consumer.WAIT_TIME_SECONDS = 0
+        dlq_consumer = aws.AWSSQSConsumerBackend(dlq=True)
+        dlq_consumer.WAIT_TIME_SECONDS = 0
+        boto3.resource('sqs', region_name=hedwig_settings.AWS_REGION).create_queue(QueueName=sqs_consumer.queue_name)
+        self._create_queue(dlq_consumer, message_factory(msg_type=MessageType.trip_created), 5)
+        self._create_queue(dlq_consumer, message_factory(msg_type=MessageType.device_created), 5)
+        validator = _validator()
+
+        with mock.patch.object(validator, '_extract_data', wraps=validator._extract_data) as mock_extract_data:
+            progress = dlq_consumer.requeue_dead_letter(
+                visibility_timeout=60,
+                redrive_filter=RedriveFilter(message_type='device.created', release_non_matching=True),
+            )
+
+        assert (progress.requeued, progress.failed, progress.skipped) == (5, 0, 5)
+        # payloads aren't decoded if transport attributes are enough
+        assert mock_extract_data.called is not use_transport_message_attrs
+        requeued = sqs_consumer.pull_messages()
+        assert len(requeued) == 5
+        schemas = {
+            validator._deserialize_meta_attributes(*sqs_consumer._message_handler_args(m)[:2]).schema for m in requeued
+        }
+        assert {validator._decode_message_type(schema)[0] for schema in schemas} == {'device.created'}
+        # non-matching messages are visible again despite the visibility timeout
+        assert len(dlq_consumer.pull_messages()) == 5
+
+    def test_requeue_dead_letter_releases_leases(self, message_factory, settings):
+        settings.HEDWIG_CONSUMER_AWS_LEASE_SETTINGS = aws.LeaseSettings()
+        dlq_consumer = aws.AWSSQSConsumerBackend(dlq=True)
+        dlq_consumer.WAIT_TIME_SECONDS = 0
+        boto3.resource('sqs', region_name=hedwig_settings.AWS_REGION).create_queue(
+            QueueName=aws.AWSSQSConsumerBackend().queue_name
+        )
+        self._create_queue(dlq_consumer, message_factory(msg_type=MessageType.trip_created), 2)
+        self._create_queue(dlq_consumer, message_factory(msg_type=MessageType.device_created), 2)
+
+        with mock.patch.object(dlq_consumer, '_stop_leasing'):
+            progress = dlq_consumer.requeue_dead_letter(redrive_filter=RedriveFilter(message_type='device.created'))
+
+        assert (progress.requeued, progress.skipped, progress.backlog) == (2, 2, 2)
+        # visibility timeout of skipped messages isn't extended
+        assert dlq_consumer._leases == {}
+        dlq_consumer._stop_leasing()
+
+    def test_listen_for_dead_letter_messages(self, message):
+        dlq_consumer = aws.AWSSQSConsumerBackend(dlq=True)
+        dlq_consumer.WAIT_TIME_SECONDS = 0
+        queue = self._create_queue(dlq_consumer, message, 10)
+        shutdown_event = threading.Event()
+        pull_messages = dlq_consumer.pull_messages
+
+        def pull_until_empty(**kwargs):
+            queue_messages = pull_messages(**kwargs)
+            if not queue_messages:
+                shutdown_event.set()
+            return queue_messages
+
+        failed = []
+
+        def process_message(queue_message):
+            if not failed:
+                failed.append(queue_message.message_id)
+                raise RetryException
+
+        dlq_consumer.pull_messages = pull_until_empty
+        dlq_consumer.process_message = process_message
+
+        dlq_consumer.fetch_and_process_messages(
+            num_messages=3, shutdown_event=shutdown_event, concurrency=2, max_messages_per_s=1000
+        )
+
+        queue.reload()
+        # failed message is left in the DLQ, invisible until its visibility timeout expires
+        assert queue.attributes['ApproximateNumberOfMessages'] == '0'
+        assert queue.attributes['ApproximateNumberOfMessagesNotVisible'] == '1'
+        assert dlq_consumer.messages_processed == 10
+
+    def test_receive_memory(self, message):
+        """
+        Client side memory retained by 10k received messages, using boto3 resources vs SQS client. Responses are recorded from
+        moto once, and replayed, so that the cost of moto itself isn't measured.
+        """
+        sqs_consumer = aws.AWSSQSConsumerBackend()
+        queue = self._create_queue(sqs_consumer, message, 10)
+        resource_params = {'MaxNumberOfMessages': 10, 'AttributeNames': ['All'], 'MessageAttributeNames': ['All']}
+        resource_response = queue.meta.client.receive_message(
+            QueueUrl=queue.url, VisibilityTimeout=0, **resource_params
+        )
+        response = sqs_consumer.sqs_client.receive_message(
+            QueueUrl=queue.url,
+            VisibilityTimeout=0,
+            MaxNumberOfMessages=10,
+            AttributeNames=sqs_consumer._attribute_names,
+            MessageAttributeNames=['All'],
+        )
+        assert len(resource_response['Messages']) == len(response['Messages']) == 10
+        # resolved before stubbing
+        assert sqs_consumer._get_queue_url() == queue.url
+
+        def measure(client, response, receive):
+            del response['ResponseMetadata']
+            serialized = pickle.dumps(response)
+            responses: collections.deque = collections.deque()
+            # short-circuits the HTTP request, like botocore Stubber without validation
+            client.meta.events.register_first('before-call.sqs.ReceiveMessage', lambda **kwargs: responses.popleft())
+
+            tracemalloc.start()
+            # parsed responses aren't shared between calls, and are referenced by received messages
+            for _ in range(1000):
+                responses.append((AWSResponse(None, 200, {}, None), pickle.loads(serialized)))
+            messages = [m for _ in range(1000) for m in receive()]
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            assert len(messages) == 10_000
+            return memory
+
+        resource_memory = measure(
+            queue.meta.client, resource_response, lambda: queue.receive_messages(**resource_params)
+        )
+        memory = measure(sqs_consumer.sqs_client, response, sqs_consumer.pull_messages)
+
+        assert memory * 1.5 < resource_memory
+
+
+def _sqs_lambda_record(message) -> dict:
+    queue_message = aws.AWSSNSPublisherBackend()._mock_queue_message(message)
+    # format from https://docs.aws.amazon.com/lambda/latest/dg/with-sqs.html
+    return {
+        "messageId": message.id,
+        "receiptHandle": f"receipt-{message.id}",
+        "body": queue_message.body,
+        "attributes": {k: str(v) for k, v in queue_message.attributes.items()},
+        "messageAttributes": {
+            k: {"stringValue": o["StringValue"], "stringListValues": [], "binaryListValues": [], "dataType": "String"}
+            for k, o in queue_message.message_attributes.items()
+        },
+        "md5OfBody": "EXAMPLE",
+        "eventSource": "aws:sqs",
+        "eventSourceARN": "arn:aws:sqs:us-east-2:123456789012:HEDWIG-DEV-MYAPP",
+        "awsRegion": "us-east-2",
+    }
+
+
+class TestSQSLambdaConsumer:
+    @pytest.fixture(name='sqs_lambda_consumer')
+    def _sqs_lambda_consumer(self, mock_boto3):
+        return aws.AWSSQSLambdaConsumerBackend()
+
+    def test_from_lambda_record(self, message):
+        record = _sqs_lambda_record(message)
+
+        queue_message = aws.SQSMessage._from_lambda_record(record)
+
+        assert queue_message.queue_url == 'https://sqs.us-east-2.amazonaws.com/123456789012/HEDWIG-DEV-MYAPP'
+        assert (queue_message.message_id, queue_message.receipt_handle) == (message.id, f'receipt-{message.id}')
+        assert queue_message.body == record['body']
+        assert queue_message.attributes == record['attributes']
+        assert queue_message.message_attributes['hedwig_id'] == {'DataType': 'String', 'StringValue': message.id}
+
+    @mock.patch('tests.handlers._trip_created_handler', autospec=True)
+    def test_process_messages(
+        self, mock_handler, sqs_lambda_consumer, message_factory, prepost_process_hooks, use_transport_message_attrs
+    ):
+        messages = [message_factory(msg_type=MessageType.trip_created) for _ in range(3)]
+        records = [_sqs_lambda_record(m) for m in messages]
+        mock_handler.side_effect = lambda m: m.id == messages[1].id and 1 / 0
+
+        response = sqs_lambda_consumer.process_messages({'Records': records})
+
+        # only failed records are retried
+        assert response == {'batchItemFailures': [{'itemIdentifier': messages[1].id}]}
+        assert [c[0][0].id for c in mock_handler.call_args_list] == [m.id for m in messages]
+        assert mock_handler.call_args_list[0][0][0].provider_metadata == AWSMetadata(
+            f'receipt-{messages[0].id}',
+            int(records[0]['attributes']['ApproximateFirstReceiveTimestamp']),
+            int(records[0]['attributes']['SentTimestamp']),
+            1,
+        )
+        pre_process_hook.assert_has_calls(
+            [mock.call(sqs_queue_message=aws.SQSMessage._from_lambda_record(r)) for r in records]
+        )
+        assert post_process_hook.call_count == 2
+        assert sqs_lambda_consumer.messages_processed == 3
+        sqs_lambda_consumer.sqs_client.delete_message.assert_not_called()
+
+    @mock.patch('tests.handlers._trip_created_handler', autospec=True)
+    def test_process_messages_concurrency(self, mock_handler, settings, message_factory):
+        settings.HEDWIG_CONSUMER_AWS_LAMBDA_CONCURRENCY = 4
+        sqs_lambda_consumer = aws.AWSSQSLambdaConsumerBackend()
+        messages = [message_factory(msg_type=MessageType.trip_created) for _ in range(10)]
+        failed = {messages[2].id, messages[7].id}
+        threads = set()
+
+        def handler(message):
+            threads.add(threading.current_thread().name)
+            time.sleep(0.01)
+            if message.id in failed:
+                raise RetryException
+
+        mock_handler.side_effect = handler
+
+        response = sqs_lambda_consumer.process_messages({'Records': [_sqs_lambda_record(m) for m in messages]})
+
+        assert {f['itemIdentifier'] for f in response['batchItemFailures']} == failed
+        assert mock_handler.call_count == 10
+        assert 1 < len(threads) <= 4
+
+
 class TestSNSConsumer:
     @mock.patch('hedwig.backends.aws.AWSSNSConsumerBackend.process_message')
     def test_process_messages(self, mock_process_message, sns_consumer):
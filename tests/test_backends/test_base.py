@@ -1,15 +1,20 @@
+import asyncio
 import json
 import logging
 import threading
+import time
 from unittest import mock
 
 import pytest
 
 from hedwig.backends.base import HedwigConsumerBaseBackend, HedwigPublisherBaseBackend
 from hedwig.backends.utils import get_consumer_backend, get_publisher_backend
+from hedwig.callback import Callback, batch_callback
 from hedwig.conf import settings
-from hedwig.models import ValidationError
+from hedwig.models import Message, ValidationError
 from hedwig.exceptions import LoggingException, RetryException, IgnoreException
+from tests.models import MessageType
+from tests.utils.aio import run_async
 from tests.utils.mock import mock_return_once
 
 
@@ -96,6 +101,208 @@ class TestFetchAndProcessMessages:
             [mock.call(x) for x in consumer_backend.pull_messages.return_value]
         )
 
+    def test_success_concurrency(self, consumer_backend):
+        shutdown_event = threading.Event()
+        concurrency = 3
+        lock = threading.Lock()
+        in_flight = []
+        max_in_flight = []
+
+        def process_message(queue_message):
+            with lock:
+                in_flight.append(queue_message)
+                max_in_flight.append(len(in_flight))
+            time.sleep(0.01)
+            with lock:
+                in_flight.remove(queue_message)
+
+        queue_messages = [mock.MagicMock() for _ in range(10)]
+        consumer_backend.pull_messages = mock.MagicMock()
+        mock_return_once(consumer_backend.pull_messages, queue_messages, [], shutdown_event)
+        consumer_backend.process_message = mock.MagicMock(side_effect=process_message)
+        consumer_backend.ack_message = mock.MagicMock()
+        consumer_backend.nack_message = mock.MagicMock()
+
+        consumer_backend.fetch_and_process_messages(shutdown_event=shutdown_event, concurrency=concurrency)
+
+        # all messages processed before returning
+        assert consumer_backend.process_message.call_count == len(queue_messages)
+        consumer_backend.ack_message.assert_has_calls([mock.call(x) for x in queue_messages], any_order=True)
+        consumer_backend.nack_message.assert_not_called()
+        assert max(max_in_flight) <= concurrency
+
+    def test_concurrency_counts_messages_processed(self, consumer_backend):
+        shutdown_event = threading.Event()
+        queue_messages = [mock.MagicMock() for _ in range(50)]
+        consumer_backend.pull_messages = mock.MagicMock()
+        mock_return_once(consumer_backend.pull_messages, queue_messages, [], shutdown_event)
+        consumer_backend.process_message = mock.MagicMock()
+        consumer_backend.ack_message = mock.MagicMock()
+        count = [0]
+
+        def get_count(_):
+            value = count[0]
+            # yield to other workers between reading and writing the counter, so unsynchronized increments are lost
+            time.sleep(0.001)
+            return value
+
+        def set_count(_, value):
+            count[0] = value
+
+        with mock.patch.object(type(consumer_backend), '_messages_processed', property(get_count, set_count)):
+            consumer_backend.fetch_and_process_messages(shutdown_event=shutdown_event, concurrency=8)
+
+            assert consumer_backend.messages_processed == len(queue_messages)
+
+    def test_concurrency_nacks_failed_messages(self, consumer_backend):
+        shutdown_event = threading.Event()
+        queue_messages = [mock.MagicMock(), mock.MagicMock()]
+        consumer_backend.pull_messages = mock.MagicMock()
+        mock_return_once(consumer_backend.pull_messages, queue_messages, [], shutdown_event)
+        consumer_backend.process_message = mock.MagicMock(
+            side_effect=lambda queue_message: queue_message is queue_messages[1] and 1 / 0
+        )
+        consumer_backend.ack_message = mock.MagicMock()
+        consumer_backend.nack_message = mock.MagicMock()
+
+        consumer_backend.fetch_and_process_messages(shutdown_event=shutdown_event, concurrency=2)
+
+        consumer_backend.ack_message.assert_called_once_with(queue_messages[0])
+        consumer_backend.nack_message.assert_called_once_with(queue_messages[1])
+
+    @pytest.mark.parametrize('concurrency', [1, 2])
+    def test_rate_limit(self, consumer_backend, concurrency):
+        shutdown_event = threading.Event()
+        queue_messages = [mock.MagicMock() for _ in range(6)]
+        consumer_backend.pull_messages = mock.MagicMock()
+        mock_return_once(consumer_backend.pull_messages, queue_messages, [], shutdown_event)
+        consumer_backend.process_message = mock.MagicMock()
+        consumer_backend.ack_message = mock.MagicMock()
+
+        start = time.monotonic()
+        consumer_backend.fetch_and_process_messages(
+            shutdown_event=shutdown_event, concurrency=concurrency, max_messages_per_s=50
+        )
+
+        # first message isn't delayed
+        assert time.monotonic() - start >= 0.1
+        assert consumer_backend.ack_message.call_count == len(queue_messages)
+
+    @staticmethod
+    def _process_messages_with(consumer_backend, queue_messages, messages):
+        def process_message(queue_message):
+            message = messages[queue_messages.index(queue_message)]
+            consumer_backend.message_handler(*message.serialize(), None)
+
+        consumer_backend.process_message = mock.MagicMock(side_effect=process_message)
+        consumer_backend.ack_message = mock.MagicMock()
+        consumer_backend.nack_message = mock.MagicMock()
+
+    def test_batch_callback(self, consumer_backend, message_factory):
+        shutdown_event = threading.Event()
+        queue_messages = [mock.MagicMock() for _ in range(3)]
+        messages = [message_factory(msg_type=MessageType.trip_created) for _ in range(3)]
+        batches = []
+
+        @batch_callback(max_messages=2, max_latency_s=60)
+        def handler(messages):
+            batches.append([m.id for m in messages])
+            return {messages[1].id: RetryException()} if len(messages) == 2 else None
+
+        consumer_backend.pull_messages = mock.MagicMock()
+        mock_return_once(consumer_backend.pull_messages, queue_messages, [], shutdown_event)
+        self._process_messages_with(consumer_backend, queue_messages, messages)
+
+        with mock.patch('hedwig.models.Message.callback', new=Callback(handler)):
+            consumer_backend.fetch_and_process_messages(shutdown_event=shutdown_event)
+
+        # last batch is flushed on shutdown
+        assert batches == [[messages[0].id, messages[1].id], [messages[2].id]]
+        consumer_backend.ack_message.assert_has_calls([mock.call(queue_messages[0]), mock.call(queue_messages[2])])
+        assert consumer_backend.ack_message.call_count == 2
+        consumer_backend.nack_message.assert_called_once_with(queue_messages[1])
+        assert consumer_backend.messages_processed == 3
+
+    @pytest.mark.parametrize('concurrency', [1, 2])
+    def test_batch_callback_max_latency(self, consumer_backend, message_factory, concurrency):
+        shutdown_event = threading.Event()
+        called = threading.Event()
+        queue_messages = [mock.MagicMock()]
+        messages = [message_factory(msg_type=MessageType.trip_created)]
+        threads = []
+
+        @batch_callback(max_messages=10, max_latency_s=0.01)
+        def handler(messages):
+            assert not shutdown_event.is_set()
+            threads.append(threading.current_thread())
+            called.set()
+
+        def pull_messages(**kwargs):
+            if not consumer_backend.pull_messages.call_count > 1:
+                return queue_messages
+            if consumer_backend.pull_messages.call_count == 2:
+                # pending batch is due after this pull returns
+                assert not called.is_set()
+                time.sleep(0.02)
+                return []
+            assert called.wait(5)
+            shutdown_event.set()
+            return []
+
+        consumer_backend.pull_messages = mock.MagicMock(side_effect=pull_messages)
+        self._process_messages_with(consumer_backend, queue_messages, messages)
+
+        with mock.patch('hedwig.models.Message.callback', new=Callback(handler)):
+            consumer_backend.fetch_and_process_messages(shutdown_event=shutdown_event, concurrency=concurrency)
+
+        consumer_backend.ack_message.assert_called_once_with(queue_messages[0])
+        consumer_backend.nack_message.assert_not_called()
+        # called from the consumer loop rather than a timer thread
+        if concurrency == 1:
+            assert threads == [threading.current_thread()]
+        else:
+            assert threads[0].name.startswith('hedwig-consumer')
+
+    def test_batch_stopped_before_flush(self, consumer_backend, message_factory):
+        message = message_factory(msg_type=MessageType.trip_created)
+        queue_message = mock.MagicMock()
+        consumer_backend.ack_message = mock.MagicMock()
+        batches = []
+
+        @batch_callback(max_latency_s=0)
+        def handler(messages):
+            batches.append(messages)
+
+        with mock.patch('hedwig.models.Message.callback', new=Callback(handler)):
+            consumer_backend._start_batching()
+            consumer_backend._add_to_batch(message, queue_message)
+            consumer_backend._stop_batching()
+            # e.g. a due batch flushed after batching was stopped
+            consumer_backend._flush_batch(handler)
+            consumer_backend.flush_due_batches()
+
+        # processed once, when batching stopped
+        assert batches == [[message]]
+        consumer_backend.ack_message.assert_called_once_with(queue_message)
+
+    def test_batch_callback_failure_nacks_batch(self, consumer_backend, message_factory):
+        shutdown_event = threading.Event()
+        queue_messages = [mock.MagicMock() for _ in range(2)]
+        messages = [message_factory(msg_type=MessageType.trip_created) for _ in range(2)]
+
+        def handler(messages):
+            raise ValueError
+
+        consumer_backend.pull_messages = mock.MagicMock()
+        mock_return_once(consumer_backend.pull_messages, queue_messages, [], shutdown_event)
+        self._process_messages_with(consumer_backend, queue_messages, messages)
+
+        with mock.patch('hedwig.models.Message.callback', new=Callback(handler)):
+            consumer_backend.fetch_and_process_messages(shutdown_event=shutdown_event)
+
+        consumer_backend.ack_message.assert_not_called()
+        consumer_backend.nack_message.assert_has_calls([mock.call(x) for x in queue_messages])
+
     def test_preserves_messages(self, consumer_backend):
         consumer_backend.pull_messages = mock.MagicMock()
         shutdown_event = threading.Event()
@@ -247,6 +454,90 @@ class TestFetchAndProcessMessages:
             logging_mock.assert_called_once_with('hedwig.backends.base', logging.INFO, mock.ANY, extra=mock.ANY)
 
 
+class TestFetchAndProcessMessagesAsync:
+    @staticmethod
+    def _pull_once(consumer_backend, queue_messages, shutdown_event):
+        loop = asyncio.get_event_loop()
+        calls = []
+
+        def pull_messages(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                return queue_messages
+            loop.call_soon_threadsafe(shutdown_event.set)
+            return []
+
+        consumer_backend.pull_messages = mock.MagicMock(side_effect=pull_messages)
+
+    def test_success(self, consumer_backend):
+        queue_messages = [mock.MagicMock() for _ in range(10)]
+        in_flight = []
+        max_in_flight = []
+
+        async def process_message_async(queue_message):
+            in_flight.append(queue_message)
+            max_in_flight.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(queue_message)
+
+        async def run():
+            shutdown_event = asyncio.Event()
+            self._pull_once(consumer_backend, queue_messages, shutdown_event)
+            await consumer_backend.fetch_and_process_messages_async(
+                num_messages=3, visibility_timeout=4, shutdown_event=shutdown_event, concurrency=3
+            )
+
+        consumer_backend.process_message_async = mock.MagicMock(side_effect=process_message_async)
+        consumer_backend.ack_message = mock.MagicMock()
+        consumer_backend.nack_message = mock.MagicMock()
+
+        run_async(run())
+
+        consumer_backend.pull_messages.assert_called_with(num_messages=3, visibility_timeout=4, shutdown_event=mock.ANY)
+        consumer_backend.process_message_async.assert_has_calls([mock.call(x) for x in queue_messages])
+        consumer_backend.ack_message.assert_has_calls([mock.call(x) for x in queue_messages], any_order=True)
+        consumer_backend.nack_message.assert_not_called()
+        assert max(max_in_flight) == 3
+        assert consumer_backend.messages_processed == len(queue_messages)
+
+    def test_nacks_failed_messages(self, consumer_backend):
+        queue_messages = [mock.MagicMock(), mock.MagicMock()]
+
+        async def process_message_async(queue_message):
+            if queue_message is queue_messages[1]:
+                raise RetryException
+
+        async def run():
+            shutdown_event = asyncio.Event()
+            self._pull_once(consumer_backend, queue_messages, shutdown_event)
+            await consumer_backend.fetch_and_process_messages_async(shutdown_event=shutdown_event)
+
+        consumer_backend.process_message_async = mock.MagicMock(side_effect=process_message_async)
+        consumer_backend.ack_message = mock.MagicMock()
+        consumer_backend.nack_message = mock.MagicMock()
+
+        run_async(run())
+
+        consumer_backend.ack_message.assert_called_once_with(queue_messages[0])
+        consumer_backend.nack_message.assert_called_once_with(queue_messages[1])
+
+    def test_invalid_concurrency(self, consumer_backend):
+        with pytest.raises(ValueError):
+            run_async(consumer_backend.fetch_and_process_messages_async(concurrency=0))
+
+    def test_message_handler_async(self, message, consumer_backend):
+        callback = mock.MagicMock()
+
+        async def handler(message):
+            await asyncio.sleep(0)
+            callback(message)
+
+        with mock.patch('hedwig.models.Message.callback', new=Callback(handler)):
+            run_async(consumer_backend.message_handler_async(*message.serialize(), None))
+
+        callback.assert_called_once_with(message)
+
+
 default_headers = mock.MagicMock(return_value={'mickey': 'mouse'})
 
 
@@ -268,6 +559,19 @@ class TestPublisher:
 
         mock_publisher_backend._publish.assert_called_once_with(message, *message.serialize())
 
+    def test_publish_copies_message_once(self, message, mock_publisher_backend, default_headers_hook):
+        with mock.patch.object(
+            Message, 'with_headers', autospec=True, side_effect=Message.with_headers
+        ) as with_headers:
+            mock_publisher_backend.publish(message)
+
+        with_headers.assert_called_once_with(message, {**default_headers_hook.return_value, **message.headers})
+
+    def test_publish_without_headers_does_not_copy(self, message, mock_publisher_backend):
+        mock_publisher_backend.publish(message)
+
+        assert mock_publisher_backend._publish.call_args[0][0] is message
+
     def test_default_headers_hook(
         self, message, mock_publisher_backend, default_headers_hook, use_transport_message_attrs
     ):
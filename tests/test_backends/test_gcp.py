@@ -1,3 +1,5 @@
+import asyncio
+import itertools
 import threading
 from datetime import datetime, timezone
 from unittest import mock
@@ -15,11 +17,14 @@ try:
     from tests.utils.gcp import build_gcp_queue_message, build_gcp_received_message
 except ImportError:
     pass
+from hedwig.backends.exceptions import PartialFailure
+from hedwig.backends.redrive import RedriveFilter
+from hedwig.callback import Callback
 from hedwig.conf import settings
 from hedwig.exceptions import ValidationError, CallbackNotFound
 
 from tests.models import MessageType
-
+from tests.utils.aio import run_async
 
 gcp = pytest.importorskip('hedwig.backends.gcp')
 
@@ -236,8 +241,9 @@ class TestGCPConsumer:
         response2.received_messages = []
         gcp_consumer.subscriber.pull.side_effect = iter([response, response2])
 
-        gcp_consumer.requeue_dead_letter(num_messages=num_messages, visibility_timeout=visibility_timeout)
+        progress = gcp_consumer.requeue_dead_letter(num_messages=num_messages, visibility_timeout=visibility_timeout)
 
+        assert (progress.requeued, progress.failed, progress.backlog) == (1, 0, None)
         gcp_consumer.subscriber.modify_ack_deadline.assert_called_once_with(
             subscription=subscription_path, ack_ids=[queue_message.ack_id], ack_deadline_seconds=visibility_timeout
         )
@@ -266,6 +272,98 @@ class TestGCPConsumer:
             subscription=subscription_path, ack_ids=[queue_message.ack_id]
         )
 
+    def test_requeue_dead_letter_publish_failure(self, mock_pubsub_v1, message, use_transport_message_attrs):
+        gcp_consumer = gcp.GooglePubSubConsumerBackend(dlq=True)
+        subscription_path = gcp_consumer._subscription_paths[0]
+
+        queue_messages = [build_gcp_received_message(message) for _ in range(3)]
+        for i, queue_message in enumerate(queue_messages):
+            queue_message.message.message_id = str(i)
+        response = mock.MagicMock()
+        response.received_messages = queue_messages
+        response2 = mock.MagicMock()
+        response2.received_messages = []
+        gcp_consumer.subscriber.pull.side_effect = iter([response, response2])
+        failed = mock.MagicMock()
+        failed.result.side_effect = RuntimeError
+        gcp_consumer.publisher.publish.side_effect = [mock.MagicMock(), failed, ValueError]
+
+        progress_callback = mock.MagicMock()
+
+        with pytest.raises(PartialFailure) as exc_info:
+            gcp_consumer.requeue_dead_letter(num_messages=3, progress_callback=progress_callback)
+
+        assert (exc_info.value.success_count, exc_info.value.failure_count) == (1, 2)
+        progress = progress_callback.call_args[0][0]
+        assert (progress.requeued, progress.failed) == (1, 2)
+        # failed messages are released right away
+        gcp_consumer.subscriber.modify_ack_deadline.assert_called_once_with(
+            subscription=subscription_path,
+            ack_ids=[queue_messages[1].ack_id, queue_messages[2].ack_id],
+            ack_deadline_seconds=0,
+        )
+        # all messages are published before waiting on results
+        assert gcp_consumer.publisher.publish.call_count == 3
+        gcp_consumer.subscriber.acknowledge.assert_called_once_with(
+            subscription=subscription_path, ack_ids=[queue_messages[0].ack_id]
+        )
+
+    def test_requeue_dead_letter_filter(self, mock_pubsub_v1, message_factory, use_transport_message_attrs):
+        gcp_consumer = gcp.GooglePubSubConsumerBackend(dlq=True)
+        subscription_path = gcp_consumer._subscription_paths[0]
+
+        matching = build_gcp_received_message(message_factory(msg_type=MessageType.trip_created))
+        matching.ack_id = 'matching_ack_id'
+        other = build_gcp_received_message(message_factory(msg_type=MessageType.device_created))
+        other.ack_id = 'other_ack_id'
+        response = mock.MagicMock()
+        response.received_messages = [matching, other]
+        response2 = mock.MagicMock()
+        response2.received_messages = []
+        gcp_consumer.subscriber.pull.side_effect = iter([response, response2])
+
+        progress = gcp_consumer.requeue_dead_letter(
+            num_messages=2, redrive_filter=RedriveFilter(message_type='trip_created', release_non_matching=True)
+        )
+
+        assert (progress.requeued, progress.failed, progress.skipped) == (1, 0, 1)
+        gcp_consumer.publisher.publish.assert_called_once_with(
+            mock_pubsub_v1.PublisherClient.topic_path.return_value,
+            data=matching.message.data,
+            **matching.message.attributes,
+        )
+        gcp_consumer.subscriber.acknowledge.assert_called_once_with(
+            subscription=subscription_path, ack_ids=['matching_ack_id']
+        )
+        gcp_consumer.subscriber.modify_ack_deadline.assert_called_once_with(
+            subscription=subscription_path, ack_ids=['other_ack_id'], ack_deadline_seconds=0
+        )
+
+    @pytest.mark.parametrize('release_non_matching', [False, True])
+    def test_requeue_dead_letter_filter_redelivered(
+        self, mock_pubsub_v1, message_factory, use_transport_message_attrs, release_non_matching
+    ):
+        gcp_consumer = gcp.GooglePubSubConsumerBackend(dlq=True)
+
+        matching = build_gcp_received_message(message_factory(msg_type=MessageType.trip_created))
+        other = build_gcp_received_message(message_factory(msg_type=MessageType.device_created))
+        response = mock.MagicMock()
+        response.received_messages = [matching, other]
+        redelivered = mock.MagicMock()
+        redelivered.received_messages = [other]
+        # non-matching message is redelivered forever, since it's never acknowledged
+        responses = iter([response])
+        gcp_consumer.subscriber.pull.side_effect = lambda **kwargs: next(responses, redelivered)
+
+        progress = gcp_consumer.requeue_dead_letter(
+            num_messages=2,
+            redrive_filter=RedriveFilter(message_type='trip_created', release_non_matching=release_non_matching),
+        )
+
+        assert (progress.requeued, progress.failed, progress.skipped) == (1, 0, 1)
+        assert gcp_consumer.subscriber.pull.call_count == 2
+        gcp_consumer.publisher.publish.assert_called_once()
+
     def test_fetch_and_process_messages_success(
         self,
         gcp_consumer,
@@ -323,3 +421,299 @@ class TestGCPConsumer:
         queue_message.ack.assert_called_once_with()
         pre_process_hook.assert_called_once_with(google_pubsub_message=queue_message)
         post_process_hook.assert_called_once_with(google_pubsub_message=queue_message)
+        assert gcp_consumer.callback_durations.percentile(50, message.type) is not None
+
+    def test_fetch_and_process_messages_async(self, gcp_consumer, message, subscription_paths):
+        queue_message = build_gcp_queue_message(message)
+        received = []
+
+        async def run():
+            loop = asyncio.get_event_loop()
+            shutdown_event = asyncio.Event()
+
+            def subscribe_side_effect(subscription_path, callback, flow_control, scheduler):
+                if gcp_consumer.subscriber.subscribe.call_count == 1:
+                    scheduler.schedule(None, message=queue_message)
+                return mock.MagicMock()
+
+            async def handler(message):
+                await asyncio.sleep(0)
+                received.append(message)
+
+            gcp_consumer.subscriber.subscribe.side_effect = subscribe_side_effect
+            queue_message.ack.side_effect = lambda: loop.call_soon_threadsafe(shutdown_event.set)
+
+            with mock.patch('hedwig.models.Message.callback', new=Callback(handler)):
+                await gcp_consumer.fetch_and_process_messages_async(shutdown_event=shutdown_event)
+
+        run_async(run())
+
+        assert [m.id for m in received] == [message.id]
+        queue_message.ack.assert_called_once_with()
+
+    def test_flow_control_defaults(self, gcp_consumer):
+        assert gcp_consumer._flow_control(10, None) == FlowControl(
+            max_messages=10, max_duration_per_lease_extension=gcp.DEFAULT_VISIBILITY_TIMEOUT_S
+        )
+        assert gcp_consumer._flow_control(10, 30) == FlowControl(max_messages=10, max_duration_per_lease_extension=30)
+
+    def test_flow_control_adaptive(self, mock_pubsub_v1, gcp_settings):
+        gcp_settings.HEDWIG_CONSUMER_GCP_FLOW_CONTROL_SETTINGS = gcp.FlowControlSettings(
+            max_bytes=1024, max_messages_limit=100
+        )
+        gcp_consumer = gcp.GooglePubSubConsumerBackend()
+        for _ in range(99):
+            gcp_consumer.callback_durations.add('fast', 0.5)
+        gcp_consumer.callback_durations.add('slow', 45)
+
+        assert gcp_consumer._flow_control(10, None) == FlowControl(
+            max_bytes=1024, max_messages=90, max_duration_per_lease_extension=45
+        )
+
+        # lease extension is bounded by Pub/Sub limits
+        gcp_consumer.callback_durations.add('slow', 3600)
+        assert gcp_consumer._flow_control(10, None).max_duration_per_lease_extension == gcp.MAX_LEASE_EXTENSION_S
+        gcp_consumer.callback_durations = gcp.CallbackDurations()
+        gcp_consumer.callback_durations.add('fast', 0.001)
+        assert gcp_consumer._flow_control(10, None) == FlowControl(
+            max_bytes=1024, max_messages=100, max_duration_per_lease_extension=gcp.MIN_LEASE_EXTENSION_S
+        )
+
+    def test_pull_messages_adjusts_flow_control(self, mock_pubsub_v1, gcp_settings):
+        gcp_settings.HEDWIG_CONSUMER_GCP_FLOW_CONTROL_SETTINGS = gcp.FlowControlSettings(adjust_interval_s=60)
+        gcp_consumer = gcp.GooglePubSubConsumerBackend()
+        shutdown_event = threading.Event()
+        futures = []
+
+        def subscribe_side_effect(subscription_path, callback, flow_control, scheduler):
+            futures.append(mock.MagicMock())
+            return futures[-1]
+
+        gcp_consumer.subscriber.subscribe.side_effect = subscribe_side_effect
+
+        with mock.patch.object(gcp, 'time', side_effect=itertools.count(0, 61)), mock.patch.object(
+            gcp, 'WorkQueue'
+        ) as mock_queue:
+
+            def get(*args, **kwargs):
+                gcp_consumer.callback_durations.add('slow', 45)
+                if len(futures) > 4:
+                    shutdown_event.set()
+                raise gcp.Empty
+
+            mock_queue.return_value.get.side_effect = get
+
+            assert list(gcp_consumer.pull_messages(10, shutdown_event=shutdown_event)) == []
+
+        assert gcp_consumer.subscriber.subscribe.call_count == 8
+        flow_controls = [c[1]['flow_control'] for c in gcp_consumer.subscriber.subscribe.call_args_list]
+        assert [f.max_duration_per_lease_extension for f in flow_controls] == [20] * 4 + [45] * 4
+        for future in futures:
+            future.cancel.assert_called_once_with()
+        gcp_consumer._stop_leasing()
+
+    def test_pull_messages_ignores_small_flow_control_change(self, mock_pubsub_v1, gcp_settings):
+        gcp_settings.HEDWIG_CONSUMER_GCP_FLOW_CONTROL_SETTINGS = gcp.FlowControlSettings(adjust_interval_s=60)
+        gcp_consumer = gcp.GooglePubSubConsumerBackend()
+        shutdown_event = threading.Event()
+        gets = itertools.count()
+
+        with mock.patch.object(gcp, 'time', side_effect=itertools.count(0, 61)), mock.patch.object(
+            gcp, 'WorkQueue'
+        ) as mock_queue:
+
+            def get(*args, **kwargs):
+                n = next(gets)
+                # p99 jitters around the default lease extension of 20 seconds
+                gcp_consumer.callback_durations.add('slow', 22 if n % 2 else 18)
+                if n > 5:
+                    shutdown_event.set()
+                raise gcp.Empty
+
+            mock_queue.return_value.get.side_effect = get
+
+            assert list(gcp_consumer.pull_messages(10, shutdown_event=shutdown_event)) == []
+
+        # not re-subscribed
+        assert gcp_consumer.subscriber.subscribe.call_count == 4
+        gcp_consumer._stop_leasing()
+
+    def test_closed_stream_leases(self, gcp_consumer):
+        stream_closed = threading.Event()
+        stream_closed.set()
+        processing = gcp.MessageWrapper(mock.MagicMock(ack_id='processing'), 'subscriptions/foo', stream_closed)
+        queued = gcp.MessageWrapper(mock.MagicMock(ack_id='queued'), 'subscriptions/bar', stream_closed)
+        stream_open = gcp.MessageWrapper(mock.MagicMock(ack_id='open'), 'subscriptions/foo', threading.Event())
+        acked = gcp.MessageWrapper(mock.MagicMock(ack_id='acked'), 'subscriptions/foo', stream_closed)
+        gcp_consumer.work_queue = gcp.WorkQueue(10, 1024)
+        gcp_consumer.work_queue.put('subscriptions/bar', queued, 1)
+        for queue_message in (processing, stream_open, acked):
+            gcp_consumer._track(queue_message)
+        gcp_consumer.ack_message(acked)
+        gcp_consumer.subscriber.reset_mock()
+
+        gcp_consumer.extend_closed_stream_leases()
+
+        gcp_consumer.subscriber.modify_ack_deadline.assert_has_calls(
+            [
+                mock.call(subscription='subscriptions/foo', ack_ids=['processing'], ack_deadline_seconds=20),
+                mock.call(subscription='subscriptions/bar', ack_ids=['queued'], ack_deadline_seconds=20),
+            ],
+            any_order=True,
+        )
+        assert gcp_consumer.subscriber.modify_ack_deadline.call_count == 2
+
+    def test_leases_extended_after_reopening_streams(self, mock_pubsub_v1, gcp_settings):
+        gcp_settings.HEDWIG_CONSUMER_GCP_FLOW_CONTROL_SETTINGS = gcp.FlowControlSettings(adjust_interval_s=60)
+        gcp_consumer = gcp.GooglePubSubConsumerBackend()
+        shutdown_event = threading.Event()
+        queue_message = None
+
+        def subscribe_side_effect(subscription_path, callback, flow_control, scheduler):
+            nonlocal queue_message
+            if queue_message is None:
+                queue_message = gcp.MessageWrapper(
+                    mock.MagicMock(ack_id='ack-id'), subscription_path, scheduler._closed
+                )
+                scheduler._work_queue.put(subscription_path, queue_message, 1)
+            # cancelling a streaming pull shuts down its scheduler
+            return mock.MagicMock(**{'cancel.side_effect': scheduler.shutdown})
+
+        gcp_consumer.subscriber.subscribe.side_effect = subscribe_side_effect
+        extended = threading.Event()
+        gcp_consumer.subscriber.modify_ack_deadline.side_effect = lambda **kwargs: extended.set()
+
+        with mock.patch.object(gcp, 'time', side_effect=itertools.count(0, 61)):
+            messages = gcp_consumer.pull_messages(10, shutdown_event=shutdown_event)
+            assert next(messages) is queue_message
+            # callback durations change while the message is processed, so streams are re-opened
+            gcp_consumer.callback_durations.add('slow', 45)
+            shutdown_event.set()
+            assert list(messages) == []
+
+        assert queue_message.stream_closed
+        assert extended.wait(5)
+        gcp_consumer.subscriber.modify_ack_deadline.assert_called_with(
+            subscription=queue_message.subscription_path, ack_ids=['ack-id'], ack_deadline_seconds=45
+        )
+        gcp_consumer.ack_message(queue_message)
+        gcp_consumer._stop_leasing()
+        assert gcp_consumer._lease_thread is None
+
+    def test_ack_and_nack_after_stream_closed(self, gcp_consumer):
+        stream_closed = threading.Event()
+        stream_closed.set()
+        queue_message = gcp.MessageWrapper(mock.MagicMock(ack_id='ack-id'), 'subscriptions/foobar', stream_closed)
+
+        gcp_consumer.ack_message(queue_message)
+        gcp_consumer.nack_message(queue_message)
+
+        queue_message.message.ack.assert_not_called()
+        queue_message.message.nack.assert_not_called()
+        gcp_consumer.subscriber.acknowledge.assert_called_once_with(
+            subscription='subscriptions/foobar', ack_ids=['ack-id']
+        )
+        gcp_consumer.subscriber.modify_ack_deadline.assert_called_once_with(
+            subscription='subscriptions/foobar', ack_ids=['ack-id'], ack_deadline_seconds=0
+        )
+
+
+class TestCallbackDurations:
+    def test_percentile(self):
+        callback_durations = gcp.CallbackDurations()
+        assert callback_durations.percentile(50) is None
+        assert callback_durations.max_percentile(99) is None
+
+        for i in range(1, 101):
+            callback_durations.add('fast', i / 100)
+        callback_durations.add('slow', 30)
+
+        assert callback_durations.percentile(50, 'fast') == 0.51
+        assert callback_durations.percentile(99, 'fast') == 1
+        assert callback_durations.percentile(99) == 1
+        assert callback_durations.max_percentile(99) == 30
+
+
+class TestWorkQueue:
+    @staticmethod
+    def _put_in_thread(work_queue, subscription_path, item, size, stop_event=None):
+        thread = threading.Thread(target=work_queue.put, args=(subscription_path, item, size, stop_event))
+        thread.start()
+        thread.join(0.1)
+        return thread
+
+    def test_fifo_per_subscription_and_metrics(self):
+        work_queue = gcp.WorkQueue(max_messages=10, max_bytes=100)
+        work_queue.put('sub1', 'a', 10)
+        work_queue.put('sub1', 'b', 20)
+
+        assert work_queue.depth == 2
+        assert work_queue.bytes == 30
+        assert work_queue.depth_by_subscription() == {'sub1': 2}
+        assert [work_queue.get(), work_queue.get()] == ['a', 'b']
+        assert work_queue.depth == 0
+        assert work_queue.bytes == 0
+        with pytest.raises(gcp.Empty):
+            work_queue.get(block=False)
+        with pytest.raises(gcp.Empty):
+            work_queue.get(timeout=0.01)
+
+    def test_round_robin(self):
+        work_queue = gcp.WorkQueue(max_messages=10, max_bytes=100)
+        for item in ['a1', 'a2', 'a3']:
+            work_queue.put('sub1', item, 1)
+        work_queue.put('sub2', 'b1', 1)
+
+        assert [work_queue.get(block=False) for _ in range(4)] == ['a1', 'b1', 'a2', 'a3']
+
+    @pytest.mark.parametrize('max_messages,max_bytes,size', [(2, 100, 1), (100, 20, 10)])
+    def test_put_blocks_when_full(self, max_messages, max_bytes, size):
+        work_queue = gcp.WorkQueue(max_messages=max_messages, max_bytes=max_bytes)
+        work_queue.put('sub1', 'a', size)
+        work_queue.put('sub1', 'b', size)
+
+        thread = self._put_in_thread(work_queue, 'sub1', 'c', size)
+        assert thread.is_alive()
+
+        assert work_queue.get() == 'a'
+        thread.join(5)
+        assert not thread.is_alive()
+        assert work_queue.depth == 2
+
+    def test_fair_share(self):
+        work_queue = gcp.WorkQueue(max_messages=4, max_bytes=100)
+        work_queue.register('sub1')
+        work_queue.register('sub2')
+        work_queue.put('sub1', 'a1', 1)
+        work_queue.put('sub1', 'a2', 1)
+
+        # sub1 can't use space reserved for sub2
+        thread = self._put_in_thread(work_queue, 'sub1', 'a3', 1)
+        assert thread.is_alive()
+
+        work_queue.put('sub2', 'b1', 1)
+        work_queue.put('sub2', 'b2', 1)
+        assert work_queue.depth == 4
+
+        assert work_queue.get() == 'a1'
+        thread.join(5)
+        assert not thread.is_alive()
+
+    def test_oversized_message_admitted(self):
+        work_queue = gcp.WorkQueue(max_messages=10, max_bytes=10)
+        work_queue.put('sub1', 'a', 100)
+        assert work_queue.bytes == 100
+
+    def test_stop_event_unblocks_put(self):
+        work_queue = gcp.WorkQueue(max_messages=1, max_bytes=100)
+        work_queue.put('sub1', 'a', 1)
+        stop_event = threading.Event()
+        thread = self._put_in_thread(work_queue, 'sub1', 'b', 1, stop_event)
+        assert thread.is_alive()
+
+        stop_event.set()
+        work_queue.wakeup()
+        thread.join(5)
+
+        assert not thread.is_alive()
+        assert work_queue.depth == 2
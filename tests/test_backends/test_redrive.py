@@ -0,0 +1,235 @@
+import threading
+import time
+from datetime import datetime, timezone
+from unittest import mock
+
+import pytest
+
+from hedwig.backends.base import HedwigConsumerBaseBackend
+from hedwig.backends.exceptions import PartialFailure
+from hedwig.backends.redrive import RateLimiter, Redrive, RedriveFilter, RedriveProgress, RedriveSettings
+from hedwig.models import Version
+from hedwig.validators.base import MetaAttributes
+
+
+def _meta_attrs(m: int, schema: str = 'trip_created/1.0') -> MetaAttributes:
+    publisher = 'even' if m % 2 == 0 else 'odd'
+    return MetaAttributes(m * 1000, publisher, {'n': str(m)}, str(m), schema, Version(1, 0))
+
+
+class FakeDLQBackend(HedwigConsumerBaseBackend):
+    def __init__(self, num_messages: int, failing=()) -> None:
+        self.dlq = list(range(num_messages))
+        self.failing = set(failing)
+        self.requeued: list = []
+        self.acked: list = []
+        self.released: list = []
+        self.lock = threading.Lock()
+        self.threads: set = set()
+
+    def _redrive_pull(self, num_messages, visibility_timeout):
+        with self.lock:
+            self.threads.add(threading.current_thread().name)
+            queue_messages, self.dlq = self.dlq[:num_messages], self.dlq[num_messages:]
+        # let other threads pull
+        time.sleep(0.001)
+        return queue_messages
+
+    def _redrive_publish(self, queue_messages):
+        requeued = [m for m in queue_messages if m not in self.failing]
+        with self.lock:
+            self.requeued.extend(requeued)
+        return requeued
+
+    def _redrive_ack(self, queue_messages):
+        with self.lock:
+            self.acked.extend(queue_messages)
+
+    def _redrive_release(self, queue_messages):
+        self.released.extend(queue_messages)
+
+    def _redrive_message_id(self, queue_message):
+        return str(queue_message)
+
+    def _redrive_meta_attributes(self, queue_message):
+        return _meta_attrs(queue_message)
+
+    def _redrive_backlog(self):
+        return len(self.dlq)
+
+
+def test_requeue_dead_letter():
+    backend = FakeDLQBackend(95, failing=[3, 50])
+    progress_callback = mock.MagicMock()
+
+    with pytest.raises(PartialFailure) as exc_info:
+        backend.requeue_dead_letter(
+            num_messages=10, redrive_settings=RedriveSettings(concurrency=4), progress_callback=progress_callback
+        )
+
+    assert sorted(backend.requeued) == sorted(backend.acked) == [m for m in range(95) if m not in (3, 50)]
+    progress = progress_callback.call_args[0][0]
+    assert (progress.requeued, progress.failed, progress.backlog) == (93, 2, 0)
+    assert {f['Id'] for f in exc_info.value.result['Failed']} == {'3', '50'}
+    # failed messages are released right away
+    assert sorted(backend.released) == [3, 50]
+    assert len(backend.threads) > 1
+
+
+def test_requeue_dead_letter_received_again():
+    backend = FakeDLQBackend(0, failing=[1])
+    # e.g. received by another thread before the first copy was removed
+    backend.dlq = [0, 1, 0, 2, 1, 2]
+    published: list = []
+    publish = backend._redrive_publish
+    backend._redrive_publish = lambda queue_messages: publish(published.extend(queue_messages) or queue_messages)
+
+    with pytest.raises(PartialFailure) as exc_info:
+        backend.requeue_dead_letter(num_messages=2)
+
+    # each message is published once, and failures aren't retried or counted again
+    assert published == [0, 1, 2]
+    # copies of re-queued messages are removed too
+    assert backend.acked == [0, 0, 2, 2]
+    assert (exc_info.value.success_count, exc_info.value.failure_count) == (2, 1)
+
+
+def test_requeue_dead_letter_exception():
+    backend = FakeDLQBackend(10)
+    backend._redrive_publish = mock.MagicMock(side_effect=ValueError)
+
+    with pytest.raises(ValueError):
+        backend.requeue_dead_letter(redrive_settings=RedriveSettings(concurrency=2))
+
+    assert backend.acked == []
+
+
+def test_requeue_dead_letter_rate_limit():
+    backend = FakeDLQBackend(20)
+
+    start = time.monotonic()
+    Redrive(backend, 5, redrive_settings=RedriveSettings(concurrency=2, max_messages_per_s=100)).run()
+
+    # last batch is only released after 15 messages worth of permits
+    assert time.monotonic() - start >= 0.15
+
+
+def test_progress_reports():
+    backend = FakeDLQBackend(30)
+    backend._redrive_publish = mock.MagicMock(side_effect=lambda queue_messages: time.sleep(0.01) or queue_messages)
+    reports = []
+
+    Redrive(
+        backend, 1, redrive_settings=RedriveSettings(progress_interval_s=0.05), progress_callback=reports.append
+    ).run()
+
+    assert len(reports) > 1
+    assert reports[0].requeued < reports[-1].requeued == 30
+    assert reports[0].backlog > reports[-1].backlog == 0
+
+
+def test_requeue_dead_letter_filter():
+    backend = FakeDLQBackend(20)
+
+    progress = backend.requeue_dead_letter(
+        num_messages=3,
+        redrive_settings=RedriveSettings(concurrency=2),
+        redrive_filter=RedriveFilter(publisher='even', release_non_matching=True),
+    )
+
+    assert sorted(backend.requeued) == sorted(backend.acked) == list(range(0, 20, 2))
+    assert sorted(backend.released) == list(range(1, 20, 2))
+    assert (progress.requeued, progress.failed, progress.skipped) == (10, 0, 10)
+
+
+def test_requeue_dead_letter_filter_skipped_redelivered():
+    backend = FakeDLQBackend(0)
+    # non-matching messages are received again, e.g. since their visibility timeout expired
+    backend._redrive_pull = mock.MagicMock(return_value=[1, 3])
+    backend._redrive_publish = mock.MagicMock()
+
+    progress = backend.requeue_dead_letter(redrive_filter=RedriveFilter(publisher='even'))
+
+    assert progress.skipped == 2
+    assert backend._redrive_pull.call_count == 2
+    backend._redrive_publish.assert_not_called()
+    assert backend.released == []
+
+
+def test_requeue_dead_letter_filter_skipped_received_again():
+    backend = FakeDLQBackend(0)
+    backend.dlq = [1, 3, 1, 3, 0, 2]
+    # skipped messages are still in the DLQ
+    backend._redrive_backlog = lambda: len(set(backend.dlq) | {1, 3})
+
+    progress = backend.requeue_dead_letter(num_messages=2, redrive_filter=RedriveFilter(publisher='even'))
+
+    # matching messages after a batch of skipped messages are re-queued too
+    assert backend.requeued == [0, 2]
+    assert (progress.requeued, progress.skipped) == (2, 2)
+
+
+def test_requeue_dead_letter_filter_unknown_backlog():
+    backend = FakeDLQBackend(0)
+    backend._redrive_backlog = lambda: None
+    # skipped messages are redelivered, e.g. on Google Pub/Sub
+    pulls = iter([[0, 1, 2, 3], [4, 1, 3]])
+    backend._redrive_pull = mock.MagicMock(side_effect=lambda *args: next(pulls, [1, 3]))
+
+    progress = backend.requeue_dead_letter(num_messages=4, redrive_filter=RedriveFilter(publisher='even'))
+
+    # stops once a pull returns no new messages
+    assert backend._redrive_pull.call_count == 3
+    assert backend.requeued == [0, 2, 4]
+    assert (progress.requeued, progress.skipped) == (3, 2)
+
+
+def test_requeue_dead_letter_filter_invalid():
+    backend = FakeDLQBackend(4)
+    backend._redrive_meta_attributes = lambda m: _meta_attrs(m, 'invalid' if m == 2 else 'trip_created/1.0')
+
+    progress = backend.requeue_dead_letter(redrive_filter=RedriveFilter(message_type='trip_created'))
+
+    assert sorted(backend.requeued) == [0, 1, 3]
+    assert progress.skipped == 1
+
+
+@pytest.mark.parametrize(
+    'redrive_filter,expected',
+    [
+        (RedriveFilter(), True),
+        (RedriveFilter(message_type='trip_created', major_version=1), True),
+        (RedriveFilter(message_type='device.created'), False),
+        (RedriveFilter(major_version=2), False),
+        (RedriveFilter(publisher='odd'), True),
+        (RedriveFilter(publisher='even'), False),
+        (RedriveFilter(headers={'n': '5'}), True),
+        (RedriveFilter(headers={'n': '5', 'other': 'x'}), False),
+        (RedriveFilter(published_after=datetime.fromtimestamp(5, timezone.utc)), True),
+        (RedriveFilter(published_after=datetime.fromtimestamp(6, timezone.utc)), False),
+        (RedriveFilter(published_before=datetime.fromtimestamp(6, timezone.utc)), True),
+        (RedriveFilter(published_before=datetime.fromtimestamp(5, timezone.utc)), False),
+    ],
+)
+def test_redrive_filter_matches(redrive_filter, expected):
+    assert redrive_filter.matches(_meta_attrs(5), 'trip_created', Version(1, 0)) is expected
+
+
+def test_progress():
+    progress = RedriveProgress(requeued=100, failed=1, elapsed_s=2, backlog=500)
+
+    assert progress.messages_per_s == 50
+    assert progress.eta_s == 10
+    assert RedriveProgress(0, 0, 0, 500).eta_s is None
+    assert RedriveProgress(100, 0, 2, None).eta_s is None
+
+
+def test_rate_limiter():
+    rate_limiter = RateLimiter(200)
+
+    start = time.monotonic()
+    for _ in range(5):
+        rate_limiter.acquire(10)
+
+    # first acquire isn't delayed
+    assert time.monotonic() - start >= 0.2
@@ -1,14 +1,19 @@
+import asyncio
 from unittest import mock
+import threading
+import typing
 import uuid
 
 import pytest
 
-from hedwig.callback import Callback
-from hedwig.exceptions import ConfigurationError, CallbackNotFound
+from hedwig.callback import BatchSettings, Callback, batch_callback
+from hedwig.conf import settings as hedwig_settings
+from hedwig.exceptions import ConfigurationError, CallbackNotFound, RetryException
 from hedwig.models import Message
 
 from tests.models import MessageType
 from tests.settings import device_handler
+from tests.utils.aio import run_async
 
 
 def default_headers() -> dict:
@@ -64,6 +69,56 @@ class TestCallback:
         with pytest.raises(ConfigurationError):
             Callback(TestCallback.f_unknown_param)
 
+    def test_constructor_batch(self):
+        def f(messages: typing.List[Message]):
+            pass
+
+        callback = Callback(f)
+        assert callback.is_batch
+        assert callback.batch_settings == BatchSettings()
+        assert not Callback(TestCallback.f).is_batch
+
+    def test_constructor_batch_settings(self):
+        @batch_callback(max_messages=100, max_latency_s=5)
+        def f(messages):
+            pass
+
+        assert Callback(f).batch_settings == BatchSettings(100, 5)
+
+    def test_constructor_batch_and_message(self):
+        def f(message, messages):
+            pass
+
+        with pytest.raises(ConfigurationError):
+            Callback(f)
+
+    def test_constructor_batch_bad_annotation(self):
+        def f(messages: Message):
+            pass
+
+        with pytest.raises(ConfigurationError):
+            Callback(f)
+
+    def test_call_batch(self, message):
+        def f(messages):
+            return {messages[0].id: RetryException()}
+
+        failures = Callback(f).call_batch([message])
+        assert list(failures) == [message.id]
+
+        assert Callback(lambda messages: None).call_batch([message]) == {}
+
+    def test_call_batch_callback_with_message(self, message):
+        _f = mock.MagicMock()
+
+        def f(messages):
+            _f(messages)
+            return {message.id: RetryException()}
+
+        with pytest.raises(RetryException):
+            Callback(f).call(message)
+        _f.assert_called_once_with([message])
+
     def test_call(self, message):
         _f = mock.MagicMock()
 
@@ -73,6 +128,38 @@ class TestCallback:
         Callback(f).call(message)
         _f.assert_called_once_with(message)
 
+    def test_call_coroutine(self, message):
+        _f = mock.MagicMock()
+
+        async def f(message: Message):
+            await asyncio.sleep(0)
+            _f(message)
+
+        callback = Callback(f)
+        assert callback.is_coroutine
+
+        callback.call(message)
+        _f.assert_called_once_with(message)
+
+    def test_call_async(self, message):
+        _f = mock.MagicMock()
+
+        async def f(message: Message):
+            await asyncio.sleep(0)
+            _f(message)
+
+        run_async(Callback(f).call_async(message))
+        _f.assert_called_once_with(message)
+
+    def test_call_async_runs_function_in_executor(self, message):
+        threads = []
+
+        def f(message: Message):
+            threads.append(threading.current_thread())
+
+        run_async(Callback(f).call_async(message))
+        assert threads and threads[0] is not threading.current_thread()
+
     def test_find_by_message(self):
         assert Callback.find_by_message(MessageType.device_created.value, 1)._fn is device_handler
 
@@ -80,5 +167,27 @@ class TestCallback:
         with pytest.raises(CallbackNotFound):
             Callback.find_by_message(MessageType.vehicle_created.value, 1)
 
+    def test_find_by_message_built_once(self, settings):
+        callback = Callback.find_by_message(MessageType.device_created.value, 1)
+        with mock.patch('hedwig.callback.Callback.__init__') as mock_init:
+            assert Callback.find_by_message(MessageType.device_created.value, 1) is callback
+            Callback.find_by_message(MessageType.trip_created.value, 2)
+        mock_init.assert_not_called()
+
+    def test_find_by_message_rebuilt_on_clear_cache(self, settings):
+        Callback.find_by_message(MessageType.device_created.value, 1)
+        settings.HEDWIG_CALLBACKS = {(MessageType.vehicle_created.value, '1.*'): TestCallback.f}
+        hedwig_settings.clear_cache()
+
+        assert Callback.find_by_message(MessageType.vehicle_created.value, 1).fn is TestCallback.f
+        with pytest.raises(CallbackNotFound):
+            Callback.find_by_message(MessageType.device_created.value, 1)
+
+    def test_find_by_message_invalid_version(self, settings):
+        settings.HEDWIG_CALLBACKS = {(MessageType.vehicle_created.value, '1.0'): TestCallback.f}
+
+        with pytest.raises(ConfigurationError):
+            Callback.find_by_message(MessageType.vehicle_created.value, 1)
+
     def test_str(self):
         assert str(Callback(self.f)) == 'Hedwig task: f'
@@ -1,5 +1,7 @@
+from datetime import datetime, timezone
 from unittest import mock
 
+from hedwig.backends.redrive import RedriveFilter, RedriveSettings
 from hedwig.commands import requeue_dead_letter
 
 
@@ -7,4 +9,40 @@ from hedwig.commands import requeue_dead_letter
 def test_requeue_dead_letter(mock_get_consumer_backend):
     requeue_dead_letter()
     mock_get_consumer_backend.assert_called_once_with(dlq=True)
-    mock_get_consumer_backend.return_value.requeue_dead_letter.assert_called_once_with(10, None)
+    mock_get_consumer_backend.return_value.requeue_dead_letter.assert_called_once_with(
+        10, None, RedriveSettings(), None, None
+    )
+
+
+@mock.patch('hedwig.commands.get_consumer_backend', autospec=True)
+def test_requeue_dead_letter_options(mock_get_consumer_backend):
+    progress_callback = mock.MagicMock()
+
+    progress = requeue_dead_letter(
+        num_messages=5,
+        visibility_timeout=30,
+        concurrency=4,
+        max_messages_per_s=100,
+        progress_interval_s=60,
+        progress_callback=progress_callback,
+    )
+
+    assert progress == mock_get_consumer_backend.return_value.requeue_dead_letter.return_value
+    mock_get_consumer_backend.return_value.requeue_dead_letter.assert_called_once_with(
+        5, 30, RedriveSettings(concurrency=4, max_messages_per_s=100, progress_interval_s=60), progress_callback, None
+    )
+
+
+@mock.patch('hedwig.commands.get_consumer_backend', autospec=True)
+def test_requeue_dead_letter_filter(mock_get_consumer_backend):
+    published_after = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    requeue_dead_letter(message_type='trip_created', published_after=published_after, release_non_matching=True)
+
+    mock_get_consumer_backend.return_value.requeue_dead_letter.assert_called_once_with(
+        10,
+        None,
+        RedriveSettings(),
+        None,
+        RedriveFilter(message_type='trip_created', published_after=published_after, release_non_matching=True),
+    )
@@ -1,17 +1,25 @@
+import asyncio
 import threading
 from unittest import mock
 
-from hedwig.consumer import process_messages_for_lambda_consumer, listen_for_messages
+from hedwig.consumer import (
+    process_messages_for_lambda_consumer,
+    listen_for_dead_letter_messages,
+    listen_for_messages,
+    listen_for_messages_async,
+)
+from tests.utils.aio import run_async
 
 
 @mock.patch('hedwig.consumer.get_consumer_backend', autospec=True)
 def test_process_messages_for_lambda_consumer(mock_get_backend):
     event = mock.Mock()
 
-    process_messages_for_lambda_consumer(event)
+    response = process_messages_for_lambda_consumer(event)
 
     mock_get_backend.assert_called_once_with()
     mock_get_backend.return_value.process_messages.assert_called_once_with(event)
+    assert response == mock_get_backend.return_value.process_messages.return_value
 
 
 @mock.patch('hedwig.consumer.get_consumer_backend', autospec=True)
@@ -26,5 +34,43 @@ class TestListenForMessages:
         mock_get_backend.assert_called_once_with()
 
         mock_get_backend.return_value.fetch_and_process_messages.assert_called_once_with(
-            shutdown_event=shutdown_event, num_messages=num_messages, visibility_timeout=visibility_timeout_s
+            shutdown_event=shutdown_event,
+            num_messages=num_messages,
+            visibility_timeout=visibility_timeout_s,
+            concurrency=1,
+        )
+
+    def test_listen_for_messages_concurrency(self, mock_get_backend):
+        shutdown_event = threading.Event()
+
+        listen_for_messages(shutdown_event=shutdown_event, concurrency=4)
+
+        mock_get_backend.return_value.fetch_and_process_messages.assert_called_once_with(
+            shutdown_event=shutdown_event, num_messages=10, visibility_timeout=None, concurrency=4
+        )
+
+    def test_listen_for_dead_letter_messages(self, mock_get_backend):
+        shutdown_event = threading.Event()
+
+        listen_for_dead_letter_messages(3, 4, shutdown_event=shutdown_event, concurrency=4, max_messages_per_s=100)
+
+        mock_get_backend.assert_called_once_with(dlq=True)
+        mock_get_backend.return_value.fetch_and_process_messages.assert_called_once_with(
+            shutdown_event=shutdown_event, num_messages=3, visibility_timeout=4, concurrency=4, max_messages_per_s=100
+        )
+
+    def test_listen_for_messages_async(self, mock_get_backend):
+        shutdown_event = asyncio.Event()
+
+        async def fetch_and_process_messages_async(**kwargs):
+            pass
+
+        mock_get_backend.return_value.fetch_and_process_messages_async = mock.MagicMock(
+            side_effect=fetch_and_process_messages_async
+        )
+
+        run_async(listen_for_messages_async(3, 4, shutdown_event=shutdown_event, concurrency=20))
+
+        mock_get_backend.return_value.fetch_and_process_messages_async.assert_called_once_with(
+            shutdown_event=shutdown_event, num_messages=3, visibility_timeout=4, concurrency=20
         )
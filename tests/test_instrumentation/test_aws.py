@@ -36,29 +36,41 @@ def test_fetch_and_process_message_follows_parent_trace(
     shutdown_event = threading.Event()
     num_messages = 3
     visibility_timeout = 4
-    queue = mock.MagicMock()
-    sqs_consumer.sqs_resource.get_queue_by_name = mock.MagicMock(return_value=queue)
+    sqs_consumer.sqs_client.get_queue_url = mock.MagicMock(return_value={"QueueUrl": "DummyQueueUrl"})
 
     receipt = "receipt"
     sent_time = datetime.now(timezone.utc)
     first_receive_time = datetime.now(timezone.utc)
     receive_count = 1
 
-    queue_message = mock.MagicMock()
-    queue_message.receipt_handle = receipt
     payload, message_attributes = message_with_trace.serialize()
     if isinstance(payload, bytes):
-        queue_message.body = base64.encodebytes(payload).decode()
+        body = base64.encodebytes(payload).decode()
         message_attributes['hedwig_encoding'] = 'base64'
     else:
-        queue_message.body = payload
-    queue_message.message_attributes = {
-        k: {'DataType': 'String', 'StringValue': v} for k, v in message_attributes.items()
-    }
-    queue_message.attributes = {
-        'ApproximateReceiveCount': receive_count,
-        'SentTimestamp': int(sent_time.timestamp() * 1000),
-        'ApproximateFirstReceiveTimestamp': int(first_receive_time.timestamp() * 1000),
+        body = payload
+    queue_message = aws.SQSMessage(
+        'DummyQueueUrl',
+        'message-id',
+        receipt,
+        body,
+        {
+            'ApproximateReceiveCount': str(receive_count),
+            'SentTimestamp': str(int(sent_time.timestamp() * 1000)),
+            'ApproximateFirstReceiveTimestamp': str(int(first_receive_time.timestamp() * 1000)),
+        },
+        {k: {'DataType': 'String', 'StringValue': v} for k, v in message_attributes.items()},
+    )
+    response = {
+        'Messages': [
+            {
+                'MessageId': queue_message.message_id,
+                'ReceiptHandle': queue_message.receipt_handle,
+                'Body': queue_message.body,
+                'Attributes': queue_message.attributes,
+                'MessageAttributes': queue_message.message_attributes,
+            }
+        ]
     }
 
     def verify_span(*args, **kwargs):
@@ -70,19 +82,20 @@ def test_fetch_and_process_message_follows_parent_trace(
         )
         return mock.DEFAULT
 
-    mock_return_once(queue.receive_messages, [queue_message], [], shutdown_event)
-    message_mock = mock.MagicMock()
+    mock_return_once(sqs_consumer.sqs_client.receive_message, response, {}, shutdown_event)
+    message_mock = mock.MagicMock(**{'callback.is_batch': False})
     sqs_consumer._build_message = mock.MagicMock(return_value=message_mock)
     sqs_consumer.process_message = mock.MagicMock(wraps=sqs_consumer.process_message, side_effect=verify_span)
     sqs_consumer.message_handler = mock.MagicMock(wraps=sqs_consumer.message_handler)
 
     sqs_consumer.fetch_and_process_messages(num_messages, visibility_timeout, shutdown_event)
 
-    sqs_consumer.sqs_resource.get_queue_by_name.assert_called_with(QueueName=sqs_consumer.queue_name)
-    queue.receive_messages.assert_called_with(
+    sqs_consumer.sqs_client.get_queue_url.assert_called_once_with(QueueName=sqs_consumer.queue_name)
+    sqs_consumer.sqs_client.receive_message.assert_called_with(
+        QueueUrl='DummyQueueUrl',
         MaxNumberOfMessages=num_messages,
         MessageAttributeNames=['All'],
-        AttributeNames=['All'],
+        AttributeNames=['ApproximateFirstReceiveTimestamp', 'SentTimestamp', 'ApproximateReceiveCount'],
         VisibilityTimeout=visibility_timeout,
         WaitTimeSeconds=sqs_consumer.WAIT_TIME_SECONDS,
     )
@@ -99,7 +112,7 @@ def test_fetch_and_process_message_follows_parent_trace(
         ),
     )
     message_mock.exec_callback.assert_called_once_with()
-    queue_message.delete.assert_called_once_with()
+    sqs_consumer.sqs_client.delete_message.assert_called_once_with(QueueUrl='DummyQueueUrl', ReceiptHandle=receipt)
 
 
 def test_publish_sends_trace_id(mock_boto3, message, use_transport_message_attrs):
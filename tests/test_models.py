@@ -1,11 +1,15 @@
+import copy
+import dataclasses
 from distutils.version import StrictVersion
+import pickle
 import random
+import tracemalloc
 from unittest import mock
 
 import pytest
 
 from hedwig.exceptions import ValidationError, CallbackNotFound
-from hedwig.models import Message
+from hedwig.models import Message, Metadata, Version
 
 from tests.models import MessageType
 
@@ -28,6 +32,24 @@ class TestMessageMethods:
         assert message.type == 'trip_created'
         assert message.data == message_data['data']
 
+    def test_new_copies_data(self, message_data):
+        message = Message.new(MessageType.trip_created, '1.0', message_data['data'])
+
+        assert message.data == message_data['data']
+        assert message.data is not message_data['data']
+
+    def test_new_without_copy(self, message_data):
+        message = Message.new(MessageType.trip_created, '1.0', message_data['data'], copy_data=False)
+
+        assert message.data is message_data['data']
+
+    @pytest.mark.parametrize('version', ['1.0', Version(1, 0), StrictVersion('1.0')])
+    def test_new_version(self, message_data, version):
+        message = Message.new(MessageType.trip_created, version, message_data['data'])
+
+        assert message.version is Version(1, 0)
+        assert message.major_version == 1
+
     @mock.patch('hedwig.callback.Callback.find_by_message', side_effect=CallbackNotFound)
     def test_validate_missing_task(self, _, message):
         with pytest.raises(ValidationError):
@@ -55,3 +77,85 @@ class TestMessageMethods:
 
     def test_getter_publisher(self, message):
         assert message.publisher == message.metadata.publisher
+
+    def test_slots(self):
+        message = Message({'vehicle_id': 'C_1'}, 'trip_created', Version(1, 0), 'id', Metadata(1, 'myapi', {'a': 'b'}))
+
+        assert not hasattr(message, '__dict__') and not hasattr(message.metadata, '__dict__')
+        assert Message.__qualname__ == 'Message'
+        assert copy.deepcopy(message) == message
+        assert pickle.loads(pickle.dumps(message)) == message
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            message.id = 'foo'  # type: ignore
+
+    def test_benchmark_memory(self):
+        @dataclasses.dataclass(frozen=True)
+        class UnslottedMetadata:
+            timestamp: int
+            publisher: str
+            headers: dict
+            provider_metadata: object
+
+        @dataclasses.dataclass(frozen=True)
+        class UnslottedMessage:
+            data: object
+            type: str
+            version: Version
+            id: str
+            metadata: UnslottedMetadata
+
+        def allocated(message_class, metadata_class) -> int:
+            data, headers, version = {'vehicle_id': 'C_1'}, {'foo': 'bar'}, Version(1, 0)
+            tracemalloc.start()
+            messages = [
+                message_class(data, 'trip_created', version, str(i), metadata_class(i, 'myapi', headers, None))
+                for i in range(100_000)
+            ]
+            size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            assert len(messages) == 100_000
+            return size
+
+        assert not hasattr(Message(None, 'trip_created', '1.0', 'id', Metadata(0, 'myapi')), '__dict__')
+        assert allocated(Message, Metadata) < 0.8 * allocated(UnslottedMessage, UnslottedMetadata)
+
+
+class TestVersion:
+    def test_parse(self):
+        version = Version.parse('2.13')
+
+        assert (version.major, version.minor) == (2, 13)
+        assert version.version == (2, 13, 0)
+        assert str(version) == '2.13'
+        assert repr(version) == "Version('2.13')"
+
+    @pytest.mark.parametrize('value', ['1', '1.0.0', '1.0b1', 'a.b', '-1.0', '', None])
+    def test_parse_invalid(self, value):
+        with pytest.raises(ValueError):
+            Version.parse(value)
+
+    def test_interned(self):
+        version = Version.parse('1.0')
+
+        assert version is Version(1, 0)
+        assert version is Version.parse('1.0')
+        assert copy.deepcopy(version) is version
+        assert pickle.loads(pickle.dumps(version)) is version
+
+    def test_immutable(self):
+        with pytest.raises(AttributeError):
+            Version(1, 0).major = 2  # type: ignore
+
+    def test_compare(self):
+        assert Version(1, 0) < Version(1, 1) < Version(2, 0)
+        assert Version(1, 1) != Version(1, 0)
+        assert {Version(1, 0): 1}[Version.parse('1.0')] == 1
+
+    def test_strict_version_compat(self):
+        assert Version(1, 0) == StrictVersion('1.0')
+        assert StrictVersion('1.0') == Version(1, 0)
+        assert Version(1, 0) != StrictVersion('1.1')
+        assert Version.coerce(StrictVersion('1.1')) is Version(1, 1)
+
+        with pytest.raises(ValueError):
+            Version.coerce(StrictVersion('1.0.1'))
@@ -1,6 +1,8 @@
+from concurrent.futures import Future
 from unittest import mock
 
-from hedwig.publisher import publish
+from hedwig.publisher import publish, publish_async
+from tests.utils.aio import run_async
 
 
 @mock.patch('hedwig.publisher.get_publisher_backend', autospec=True)
@@ -9,3 +11,21 @@ def test_publish(mock_get_publisher_backend, message):
 
     mock_get_publisher_backend.assert_called_once_with()
     mock_get_publisher_backend.return_value.publish.assert_called_once_with(message)
+
+
+@mock.patch('hedwig.publisher.get_publisher_backend', autospec=True)
+def test_publish_async(mock_get_publisher_backend, message):
+    mock_get_publisher_backend.return_value.publish.return_value = 'message-id'
+
+    assert run_async(publish_async(message)) == 'message-id'
+
+    mock_get_publisher_backend.return_value.publish.assert_called_once_with(message)
+
+
+def test_publish_async_awaits_future(message):
+    backend = mock.MagicMock()
+    future: Future = Future()
+    backend.publish.return_value = future
+    future.set_result('message-id')
+
+    assert run_async(publish_async(message, backend)) == 'message-id'
@@ -0,0 +1,155 @@
+import logging
+import os
+import signal
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from hedwig.backends.base import HedwigConsumerBaseBackend
+from hedwig.consumer import listen_for_messages_multiprocess
+from hedwig.supervisor import ConsumerSupervisor, _rss_bytes
+
+
+class IdleBackend(HedwigConsumerBaseBackend):
+    def pull_messages(self, num_messages=10, visibility_timeout=None, shutdown_event=None):
+        shutdown_event.wait(0.05)
+        return []
+
+
+class StubbornBackend(IdleBackend):
+    def __init__(self):
+        # never sees the shutdown signal, like a worker stuck in a callback
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+@pytest.fixture(name='idle_backend')
+def _idle_backend(settings):
+    settings.HEDWIG_CONSUMER_BACKEND = 'tests.test_supervisor.IdleBackend'
+
+
+@pytest.mark.parametrize('platform,expected', [('darwin', 2048), ('freebsd13', 2048 * 1024)])
+@mock.patch('hedwig.supervisor.resource.getrusage', autospec=True)
+@mock.patch('builtins.open', side_effect=FileNotFoundError)
+def test_rss_bytes_fallback(mock_open, mock_getrusage, platform, expected):
+    mock_getrusage.return_value.ru_maxrss = 2048
+    with mock.patch('hedwig.supervisor.sys.platform', platform):
+        assert _rss_bytes() == expected
+
+
+class TestConsumerSupervisor:
+    def test_invalid_num_processes(self):
+        with pytest.raises(ValueError):
+            ConsumerSupervisor(0)
+
+    @mock.patch('hedwig.supervisor.get_consumer_backend', autospec=True)
+    def test_run_worker(self, mock_get_consumer_backend):
+        supervisor = ConsumerSupervisor(1, num_messages=3, visibility_timeout_s=4, concurrency=2)
+
+        supervisor.run_worker()
+
+        mock_get_consumer_backend.return_value.fetch_and_process_messages.assert_called_once_with(
+            num_messages=3, visibility_timeout=4, shutdown_event=mock.ANY, concurrency=2
+        )
+
+    def test_should_recycle_max_messages(self):
+        supervisor = ConsumerSupervisor(1, max_messages_per_process=2)
+        consumer_backend = mock.Mock(messages_processed=1)
+        assert not supervisor._should_recycle(consumer_backend)
+        consumer_backend.messages_processed = 2
+        assert supervisor._should_recycle(consumer_backend)
+
+    def test_should_recycle_max_rss(self):
+        consumer_backend = mock.Mock(messages_processed=0)
+        assert ConsumerSupervisor(1, max_rss_bytes=1)._should_recycle(consumer_backend)
+        assert not ConsumerSupervisor(1, max_rss_bytes=2**62)._should_recycle(consumer_backend)
+
+    @mock.patch('hedwig.supervisor.os', autospec=True)
+    def test_restarts_crashed_workers(self, mock_os, idle_backend):
+        shutdown_event = threading.Event()
+        mock_os.fork.side_effect = [101, 102, 103]
+        waitpid_results = iter([(0, 0), (0, 0), (101, 1 << 8), (0, 0)])
+
+        def waitpid(pid, options):
+            try:
+                return next(waitpid_results)
+            except StopIteration:
+                shutdown_event.set()
+                return pid, 0
+
+        mock_os.waitpid.side_effect = waitpid
+        mock_os.WIFEXITED.side_effect = os.WIFEXITED
+        mock_os.WEXITSTATUS.side_effect = os.WEXITSTATUS
+        supervisor = ConsumerSupervisor(2, shutdown_event=shutdown_event)
+        supervisor.CHECK_INTERVAL_S = 0
+        supervisor.RESTART_BACKOFF_S = 0
+
+        supervisor.run()
+
+        assert mock_os.fork.call_count == 3
+        assert not supervisor._workers
+
+    @mock.patch('hedwig.supervisor.os', autospec=True)
+    def test_startup_crash_backoff(self, mock_os):
+        mock_os.waitpid.side_effect = lambda pid, options: (pid, 1 << 8)
+        mock_os.WIFEXITED.side_effect = os.WIFEXITED
+        mock_os.WEXITSTATUS.side_effect = os.WEXITSTATUS
+        supervisor = ConsumerSupervisor(1)
+        supervisor.MAX_RESTART_BACKOFF_S = 4
+
+        backoffs = []
+        for _ in range(4):
+            supervisor._workers = {101: time.monotonic()}
+            supervisor._reap_workers()
+            backoffs.append(round(supervisor._next_spawn_at - time.monotonic()))
+        assert backoffs == [1, 2, 4, 4]
+
+        # a worker that crashes after running for a while resets the backoff
+        supervisor._workers = {101: time.monotonic() - supervisor.MIN_UPTIME_S}
+        supervisor._reap_workers()
+        supervisor._workers = {102: time.monotonic()}
+        supervisor._reap_workers()
+        assert round(supervisor._next_spawn_at - time.monotonic()) == 1
+
+    @mock.patch('hedwig.supervisor.os', autospec=True)
+    def test_no_restart_during_backoff(self, mock_os, idle_backend):
+        shutdown_event = threading.Event()
+        supervisor = ConsumerSupervisor(2, shutdown_event=shutdown_event)
+        supervisor.CHECK_INTERVAL_S = 0.01
+        supervisor._next_spawn_at = time.monotonic() + 60
+        timer = threading.Timer(0.1, shutdown_event.set)
+        timer.start()
+
+        supervisor.run()
+
+        timer.join()
+        mock_os.fork.assert_not_called()
+
+    def test_fork_workers(self, idle_backend):
+        shutdown_event = threading.Event()
+        timer = threading.Timer(0.5, shutdown_event.set)
+        timer.start()
+
+        listen_for_messages_multiprocess(num_processes=2, shutdown_event=shutdown_event)
+
+        timer.join()
+
+    def test_kills_workers_after_grace_period(self, settings):
+        settings.HEDWIG_CONSUMER_BACKEND = 'tests.test_supervisor.StubbornBackend'
+        shutdown_event = threading.Event()
+        supervisor = ConsumerSupervisor(2, shutdown_event=shutdown_event, shutdown_grace_period_s=0.2)
+        timer = threading.Timer(0.5, shutdown_event.set)
+        timer.start()
+
+        with mock.patch('hedwig.supervisor.log') as logging_mock:
+            supervisor.run()
+
+        timer.join()
+        assert not supervisor._workers
+        logging_mock.assert_any_call(
+            'hedwig.supervisor',
+            logging.WARNING,
+            "Killing worker processes that didn't exit within shutdown grace period",
+            extra={'pids': mock.ANY},
+        )
@@ -1,6 +1,11 @@
+import copy
+import enum
+import gc
 import json
 import math
+import weakref
 from decimal import Decimal
+from unittest import mock
 import uuid
 
 import pytest
@@ -9,8 +14,11 @@ pytest.importorskip('jsonschema')
 
 from jsonschema import SchemaError  # noqa
 
-from hedwig.exceptions import ValidationError  # noqa
-from hedwig.validators.jsonschema import JSONSchemaValidator  # noqa
+from hedwig.conf import settings as hedwig_settings  # noqa
+from hedwig.exceptions import ConfigurationError, ValidationError  # noqa
+from hedwig.models import Version  # noqa
+from hedwig.validators.base import _decode_schema  # noqa
+from hedwig.validators.jsonschema import JSONCodec, JSONSchemaValidator, OrjsonCodec  # noqa
 from hedwig.testing.factories.jsonschema import JSONSchemaMessageFactory  # noqa
 
 from tests.models import MessageType  # noqa
@@ -37,6 +45,83 @@ class TestJSONDefault:
             self._validator().serialize(message)
 
 
+class Color(enum.Enum):
+    red = 'red'
+
+
+class Priority(enum.IntEnum):
+    high = 2
+
+
+class UpperCaseKeysCodec(JSONCodec):
+    def dumps(self, obj):
+        return super().dumps(obj).replace('"vehicle_id"', '"VEHICLE_ID"')
+
+
+class TestJSONCodec:
+    @pytest.fixture(params=['json', 'orjson'])
+    def codec(self, request):
+        if request.param == 'orjson':
+            pytest.importorskip('orjson')
+            return OrjsonCodec()
+        return JSONCodec()
+
+    @pytest.mark.parametrize('value', [1469056316326, 1469056316326.123])
+    def test_dumps_decimal(self, codec, value):
+        assert json.loads(codec.dumps({'decimal': Decimal(value)}))['decimal'] == float(value)
+
+    def test_dumps_uuid(self, codec):
+        value = uuid.uuid4()
+        assert json.loads(codec.dumps_bytes({'uuid': value})) == {'uuid': str(value)}
+
+    @pytest.mark.parametrize('value', [math.nan, math.inf, -math.inf])
+    def test_dumps_disallow_nan(self, codec, value):
+        with pytest.raises(ValueError):
+            codec.dumps({'values': [value]})
+
+    @pytest.mark.parametrize('value', ['NaN', 'Infinity', '-Infinity'])
+    def test_dumps_disallow_decimal_nan(self, codec, value):
+        with pytest.raises(ValueError):
+            codec.dumps_bytes({'values': [Decimal(value)]})
+
+    def test_dumps_large_int(self, codec):
+        assert codec.dumps_bytes({'int': 2**70}) == b'{"int":1180591620717411303424}'
+
+    def test_dumps_non_serializable(self, codec):
+        with pytest.raises(TypeError):
+            codec.dumps({'obj': object()})
+
+    @pytest.mark.parametrize('obj', [{'enum': Color.red}, {'values': [1, Color.red]}, {Color.red: 1}])
+    def test_dumps_enum(self, codec, obj):
+        # plain enums aren't JSON serializable
+        with pytest.raises(TypeError):
+            codec.dumps_bytes(obj)
+
+    def test_dumps_int_enum(self, codec):
+        assert codec.dumps_bytes({'enum': Priority.high, Priority.high: 'x'}) == b'{"enum":2,"2":"x"}'
+
+    def test_loads(self, codec):
+        assert codec.loads(b'{"a":[1,"b"]}') == codec.loads('{"a":[1,"b"]}') == {'a': [1, 'b']}
+
+    def test_loads_large_int(self, codec):
+        value = codec.loads(b'1180591620717411303424')
+        if isinstance(codec, OrjsonCodec):
+            # orjson decodes integers outside the 64-bit range as floats
+            assert value == 1180591620717411303424.0 and isinstance(value, float)
+        else:
+            assert value == 2**70
+
+    def test_codec_setting(self, settings):
+        settings.HEDWIG_JSON_CODEC_CLASS = 'tests.test_validators.test_jsonschema.UpperCaseKeysCodec'
+        message = JSONSchemaMessageFactory(msg_type=MessageType.trip_created, model_version=1)
+        validator = JSONSchemaValidator()
+        assert isinstance(validator.codec, UpperCaseKeysCodec)
+
+        # vehicle_id is required
+        with pytest.raises(ValidationError):
+            validator.serialize(message)
+
+
 class TestJSONSchemaValidator:
     def _validator(self):
         return JSONSchemaValidator()
@@ -119,6 +204,12 @@ class TestJSONSchemaValidator:
             serialized = self._validator().serialize(message)
             assert (payload, attributes) == (json.loads(serialized[0]), serialized[1])
 
+    def test_serialize_bytes(self, use_transport_message_attrs):
+        message = JSONSchemaMessageFactory(msg_type=MessageType.trip_created, model_version=1)
+        payload, attributes = self._validator().serialize(message)
+
+        assert self._validator().serialize_bytes(message) == (payload.encode('utf8'), attributes, 'utf8')
+
     def test_serialize_firehose(self, use_transport_message_attrs):
         # use_transport_message_attrs shouldn't affect firehose serialization
         _ = use_transport_message_attrs
@@ -393,9 +484,121 @@ class TestJSONSchemaValidator:
         assert not validator._check_human_uuid('yyyyyyyy-tttt-416a-92ed-420e62b33eb5')
         assert not validator._check_human_uuid(uuid.uuid4())
 
+    def test_decode_message_type_cache(self):
+        validator = self._validator()
+        schema = validator._encode_message_type('trip_created', Version(1, 0))
+        validator_ref = weakref.ref(validator)
+
+        assert validator._decode_message_type(schema) == ('trip_created', Version(1, 0))
+        assert _decode_schema.cache_info().currsize > 0
+        # cache doesn't keep validators alive
+        del validator
+        gc.collect()
+        assert validator_ref() is None
+
+        hedwig_settings.clear_cache()
+        assert _decode_schema.cache_info().currsize == 0
+
 
 def test_custom_validator(settings):
     settings.HEDWIG_DATA_VALIDATOR_CLASS = 'tests.validator.CustomValidator'
 
     with pytest.raises(ValidationError):
         JSONSchemaMessageFactory(msg_type=MessageType.trip_created, addition_version=1, data__vin='o' * 17).serialize()
+
+
+class TestPublisherValidation:
+    def test_full(self, settings):
+        settings.HEDWIG_PUBLISHER_VALIDATION = 'full'
+        validator = JSONSchemaValidator()
+        message = JSONSchemaMessageFactory(msg_type=MessageType.trip_created)
+
+        with mock.patch.object(
+            validator, '_deserialize', wraps=validator._deserialize
+        ) as mock_deserialize, mock.patch.object(
+            validator, 'deserialize_firehose', wraps=validator.deserialize_firehose
+        ) as mock_deserialize_firehose:
+            validator.serialize(message)
+            validator.serialize_bytes(message)
+            validator.serialize_firehose(message)
+
+        assert mock_deserialize.call_count == 2
+        mock_deserialize_firehose.assert_called_once()
+        assert validator.publish_validations == {'full': 3}
+
+    def test_data(self, settings):
+        settings.HEDWIG_PUBLISHER_VALIDATION = 'data'
+        validator = JSONSchemaValidator()
+        message = JSONSchemaMessageFactory(msg_type=MessageType.trip_created)
+
+        with mock.patch.object(validator, '_deserialize') as mock_deserialize:
+            validator.serialize(message)
+            with pytest.raises(ValidationError):
+                validator.serialize(JSONSchemaMessageFactory(msg_type=MessageType.trip_created, data={}))
+
+        mock_deserialize.assert_not_called()
+        assert validator.publish_validations == {'data': 1}
+
+    @pytest.mark.parametrize('mode', ['full', 'data'])
+    def test_codec_conversions(self, mode, settings):
+        settings.HEDWIG_PUBLISHER_VALIDATION = mode
+        schema = copy.deepcopy(JSONSchemaValidator().schema)
+        schema['definitions']['DeviceId']['1.0'] = {'type': 'string', 'format': 'human-uuid'}
+        schema['schemas']['device.created']['1.*']['properties'].update(
+            {'count': {'type': 'integer'}, 'tags': {'type': 'array'}}
+        )
+        validator = JSONSchemaValidator(schema)
+        device_id = uuid.uuid4()
+        message = JSONSchemaMessageFactory(
+            msg_type=MessageType.device_created,
+            data={'device_id': device_id, 'user_id': 'U_1234567890123456', 'count': Decimal(2), 'tags': ('a',)},
+        )
+
+        payload, _ = validator.serialize(message)
+
+        assert json.loads(payload)['device_id'] == str(device_id)
+        with pytest.raises(ValidationError):
+            validator.serialize(JSONSchemaMessageFactory(msg_type=MessageType.device_created, data={'device_id': 1}))
+        assert validator.publish_validations[mode] > 0
+
+    def test_trusted(self, settings):
+        settings.HEDWIG_PUBLISHER_VALIDATION = 'trusted'
+        validator = JSONSchemaValidator()
+
+        payload, _ = validator.serialize(JSONSchemaMessageFactory(msg_type=MessageType.trip_created, data={}))
+
+        assert json.loads(payload) == {}
+        assert validator.publish_validations == {'trusted': 1}
+
+    @mock.patch('hedwig.validators.base.random.random', return_value=0.5)
+    def test_sampled(self, mock_random, settings):
+        settings.HEDWIG_PUBLISHER_VALIDATION = 'sampled'
+        validator = JSONSchemaValidator()
+        message = JSONSchemaMessageFactory(msg_type=MessageType.trip_created, data={})
+
+        settings.HEDWIG_PUBLISHER_VALIDATION_SAMPLE_RATE = 0.4
+        validator.serialize(message)
+
+        settings.HEDWIG_PUBLISHER_VALIDATION_SAMPLE_RATE = 0.6
+        hedwig_settings.clear_cache()
+        with pytest.raises(ValidationError):
+            validator.serialize(message)
+
+        assert validator.publish_validations == {'trusted': 1, 'full': 1}
+
+    def test_invalid(self, settings):
+        settings.HEDWIG_PUBLISHER_VALIDATION = 'foobar'
+        with pytest.raises(ConfigurationError):
+            JSONSchemaValidator().serialize(JSONSchemaMessageFactory(msg_type=MessageType.trip_created))
+
+    def test_publish_validations_by_mode(self, settings):
+        validator = JSONSchemaValidator()
+        messages = [JSONSchemaMessageFactory(msg_type=MessageType.trip_created) for _ in range(200)]
+        for mode in ('full', 'sampled', 'data', 'trusted'):
+            settings.HEDWIG_PUBLISHER_VALIDATION = mode
+            hedwig_settings.clear_cache()
+            for message in messages:
+                validator.serialize(message)
+
+        # every message is either fully validated or trusted, except in data mode
+        assert validator.publish_validations['full'] + validator.publish_validations['trusted'] == 3 * len(messages)
@@ -0,0 +1,118 @@
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('jsonschema')
+
+from jsonschema import FormatChecker  # noqa
+from jsonschema.validators import Draft4Validator  # noqa
+
+from hedwig.validators.jsonschema import JSONSchemaValidator  # noqa
+from hedwig.validators.jsonschema_compiler import compile_schema, _never_valid  # noqa
+from hedwig.testing.factories.jsonschema import JSONSchemaMessageFactory  # noqa
+
+from tests.models import MessageType  # noqa
+
+
+def _compile(schema: dict):
+    validator = Draft4Validator(schema, format_checker=FormatChecker())
+    return compile_schema(schema, validator.resolver, validator.format_checker), validator
+
+
+@pytest.mark.parametrize(
+    'schema,instances',
+    [
+        [{'type': 'string'}, ['a', 1, None, True]],
+        [{'type': ['integer', 'null']}, [1, 1.0, True, None, 'a']],
+        [{'type': 'number'}, [1, 1.5, True, '1']],
+        [{'type': 'boolean'}, [True, 0]],
+        [{'type': 'array'}, [[], {}, ()]],
+        [{'enum': ['a', 'b']}, ['a', 'c', 1, ['a']]],
+        [{'enum': [1, None]}, [1, 1.0, True, None, 'a']],
+        [{'minLength': 2, 'maxLength': 3}, ['a', 'ab', 'abcd', 1]],
+        [{'pattern': '^U_'}, ['U_1', 'C_1', 1]],
+        [{'format': 'email'}, ['a@b.com', 'ab', 1]],
+        [{'minimum': 1, 'maximum': 3}, [0, 1, 3, 4, 'a']],
+        [{'minimum': 1, 'maximum': 3, 'exclusiveMinimum': True, 'exclusiveMaximum': True}, [1, 2, 3]],
+        [
+            {'type': 'object', 'required': ['a'], 'properties': {'a': {'type': 'string'}, 'b': {'type': 'integer'}}},
+            [{'a': 'x'}, {'a': 1}, {'b': 1}, {'a': 'x', 'b': 'y'}, {'a': 'x', 'c': 1}, []],
+        ],
+        [
+            {'properties': {'a': {}}, 'patternProperties': {'^x-': {'type': 'string'}}, 'additionalProperties': False},
+            [{'a': 1}, {'x-a': 'a'}, {'x-a': 1}, {'b': 1}],
+        ],
+        [{'additionalProperties': {'type': 'integer'}}, [{'a': 1}, {'a': 'b'}]],
+        [{'minProperties': 1, 'maxProperties': 1}, [{}, {'a': 1}, {'a': 1, 'b': 2}]],
+        [{'items': {'type': 'integer'}, 'minItems': 1, 'maxItems': 2}, [[], [1], [1, 'a'], [1, 2, 3]]],
+        [{'items': [{'type': 'integer'}, {'type': 'string'}]}, [[1, 'a'], ['a'], [1, 'a', None]]],
+        [{'items': [{'type': 'integer'}], 'additionalItems': False}, [[1], [1, 2]]],
+        [{'items': [{'type': 'integer'}], 'additionalItems': {'type': 'string'}}, [[1, 'a'], [1, 2]]],
+        [{'allOf': [{'type': 'integer'}, {'minimum': 2}]}, [1, 2, 'a']],
+        [{'anyOf': [{'type': 'integer'}, {'type': 'string'}]}, [1, 'a', None]],
+        [{'oneOf': [{'type': 'integer'}, {'minimum': 2}]}, [1, 2, 2.5, 'a']],
+        [{'not': {'type': 'integer'}}, [1, 'a']],
+        [
+            {'definitions': {'id': {'type': 'string'}}, 'properties': {'a': {'$ref': '#/definitions/id'}}},
+            [{'a': 'x'}, {'a': 1}],
+        ],
+        [
+            {
+                'definitions': {'node': {'type': 'array', 'items': {'$ref': '#/definitions/node'}}},
+                '$ref': '#/definitions/node',
+            },
+            [[], [[[]]], [[1]]],
+        ],
+    ],
+)
+def test_compile_schema(schema, instances):
+    is_valid, validator = _compile(schema)
+    assert is_valid is not _never_valid
+    for instance in instances:
+        assert is_valid(instance) == validator.is_valid(instance), instance
+
+
+@pytest.mark.parametrize(
+    'schema',
+    [
+        {'multipleOf': 2},
+        {'uniqueItems': True},
+        {'dependencies': {'a': ['b']}},
+        {'properties': {'a': {'id': 'other', 'type': 'string'}}},
+        {'$ref': 'https://example.com/unknown#/definitions/a'},
+        {'type': 'unknown'},
+        {'enum': [[1]]},
+    ],
+)
+def test_compile_schema_unsupported(schema):
+    is_valid, _ = _compile(schema)
+    assert is_valid is _never_valid
+
+
+@pytest.mark.parametrize('msg_type', [MessageType.trip_created, MessageType.device_created])
+def test_compiled_message_schemas(msg_type):
+    validator = JSONSchemaValidator()
+    is_valid = validator._compiled_schemas[(msg_type.value, 1)]
+    assert is_valid is not _never_valid
+    assert validator._container_is_valid is not _never_valid
+
+    message = JSONSchemaMessageFactory(msg_type=msg_type)
+    assert is_valid(message.data)
+    assert not is_valid({})
+
+
+def test_schemas_compiled_once():
+    validator = JSONSchemaValidator()
+    keys = {
+        (msg_type, int(version_pattern.split('.')[0]))
+        for msg_type, versions in validator.schema['schemas'].items()
+        for version_pattern in versions
+    }
+    assert validator._schemas.keys() == validator._compiled_schemas.keys() == keys
+
+    with mock.patch('hedwig.validators.jsonschema.compile_schema') as mock_compile_schema:
+        for msg_type in (MessageType.trip_created, MessageType.device_created):
+            message = JSONSchemaMessageFactory(msg_type=msg_type)
+            validator._validate_data(message.type, message.version, message.data)
+
+    mock_compile_schema.assert_not_called()
@@ -346,6 +346,19 @@ class TestProtobufValidator:
         # invalid data is ignored so long as its a valid protobuf class
         self._validator().serialize(message)
 
+    def test_serialize_validate_data_only(self, settings):
+        settings.HEDWIG_PUBLISHER_VALIDATION = 'data'
+        validator = self._validator()
+        message = ProtobufMessageFactory(
+            msg_type='device.created',
+            data=protobuf_bad_pb2.DeviceCreated(foobar=1),
+            protobuf_schema_module=protobuf_pb2,
+        )
+        # same leniency as full validation
+        validator.serialize(message)
+
+        assert validator.publish_validations == {'data': 1}
+
     def test_serialize_raises_error_invalid_message_type(self):
         message = ProtobufMessageFactory(
             msg_type='invalid',
@@ -376,3 +389,14 @@ class TestProtobufValidator:
         with pytest.raises(ValidationError) as e:
             self._validator().serialize(message)
         assert e.value.args[0] == "Invalid header key: 'hedwig_foo' - can't begin with reserved namespace 'hedwig_'"
+
+    def test_message_tables(self):
+        validator = self._validator()
+        info = validator._messages[('device.created', 1)]
+
+        assert info.msg_class is protobuf_pb2.DeviceCreatedV1
+        assert info.minor_version == 0
+        assert info.type_url == 'type.googleapis.com/tests.DeviceCreatedV1'
+        assert validator._type_urls[protobuf_pb2.DeviceCreatedV1] == info.type_url
+        with pytest.raises(TypeError):
+            validator._messages[('device.created', 1)] = info  # type: ignore
@@ -0,0 +1,111 @@
+import pytest
+
+pytest.importorskip('google.protobuf')
+
+from google.protobuf.message import DecodeError  # noqa
+
+from hedwig.protobuf.container_pb2 import PayloadV1  # noqa
+from hedwig.validators.protobuf_container import (  # noqa
+    TYPE_URL_PREFIX,
+    _decode_container_native,
+    _decode_container_python,
+    decode_container,
+    encode_container,
+)
+from tests.schemas.protos import protobuf_pb2  # noqa
+
+
+def _payload(msg_id, publisher, timestamp, headers, schema, data) -> PayloadV1:
+    msg = PayloadV1()
+    msg.format_version = '1.0'
+    msg.id = msg_id
+    msg.metadata.publisher = publisher
+    msg.metadata.timestamp.FromMilliseconds(timestamp)
+    for k, v in headers.items():
+        msg.metadata.headers[k] = v
+    msg.schema = schema
+    msg.data.Pack(data)
+    return msg
+
+
+CASES = [
+    [
+        'id',
+        'myapi',
+        1600000000123,
+        {'b': '2', 'a': '1'},
+        'trip_created/1.0',
+        protobuf_pb2.TripCreatedV1(vehicle_id='C_1', user_id='U_1'),
+    ],
+    ['', '', 0, {}, '', protobuf_pb2.TripCreatedV1(vehicle_id='', user_id='')],
+    [
+        'ïd',
+        'püblisher',
+        1000,
+        {'': '', 'ключ': 'значение'},
+        'trip_created/1.0',
+        protobuf_pb2.TripCreatedV1(vehicle_id='', user_id=''),
+    ],
+    ['id', 'myapi', 999, {'k': ''}, 'trip_created/2.0', protobuf_pb2.TripCreatedV2(vehicle_id='C_1', vin='1' * 300)],
+    ['id', 'myapi', -1500, {}, 'trip_created/1.0', protobuf_pb2.TripCreatedV1(vehicle_id='C_1', user_id='U_1')],
+]
+
+
+@pytest.mark.parametrize('msg_id,publisher,timestamp,headers,schema,data', CASES)
+def test_encode_container(msg_id, publisher, timestamp, headers, schema, data):
+    payload = encode_container(
+        '1.0',
+        msg_id,
+        publisher,
+        timestamp,
+        headers,
+        schema,
+        TYPE_URL_PREFIX + data.DESCRIPTOR.full_name,
+        data.SerializeToString(),
+    )
+
+    expected = _payload(msg_id, publisher, timestamp, headers, schema, data)
+    assert payload == expected.SerializeToString(deterministic=True)
+
+
+@pytest.mark.parametrize('decode', [_decode_container_python, _decode_container_native], ids=['python', 'native'])
+@pytest.mark.parametrize('msg_id,publisher,timestamp,headers,schema,data', CASES)
+def test_decode_container(decode, msg_id, publisher, timestamp, headers, schema, data):
+    container = decode(_payload(msg_id, publisher, timestamp, headers, schema, data).SerializeToString())
+
+    assert container.format_version == '1.0'
+    assert container.id == msg_id
+    assert container.publisher == publisher
+    assert container.timestamp == timestamp
+    assert container.headers == headers
+    assert container.schema == schema
+    assert container.data.type_name == data.DESCRIPTOR.full_name
+    assert type(data).FromString(container.data.value) == data
+
+
+def test_decode_container_skips_unknown_fields():
+    payload = _payload(
+        'id', 'myapi', 1, {}, 'trip_created/1.0', protobuf_pb2.TripCreatedV1(vehicle_id='C_1', user_id='U_1')
+    ).SerializeToString()
+    # varint, fixed64, length delimited and fixed32 fields with numbers not in PayloadV1
+    unknown = b'\x30\x01' + b'\x39' + b'\x00' * 8 + b'\x42\x01x' + b'\x4d' + b'\x00' * 4
+
+    assert _decode_container_python(unknown + payload) == _decode_container_python(payload)
+
+
+@pytest.mark.parametrize(
+    'payload',
+    [
+        b'\x0a\x05abc',  # truncated string
+        b'\x0a',  # truncated length
+        b'\x08\x01',  # wrong wire type for format_version
+        b'\x0b',  # groups aren't supported
+        b'\x00\x01',  # field number 0
+        b'\x0a\x02\xff\xfe',  # invalid utf-8
+        b'\x1a\x02\x12\x05',  # truncated timestamp inside metadata
+        b'\x30' + b'\xff' * 10,  # varint too long
+    ],
+)
+def test_decode_container_invalid(payload):
+    with pytest.raises(DecodeError):
+        _decode_container_python(payload)
@@ -0,0 +1,114 @@
+import subprocess
+import sys
+from typing import Dict, Tuple
+from unittest import mock
+
+import pytest
+
+import hedwig
+from hedwig.backends.utils import get_consumer_backend, get_publisher_backend
+from hedwig.callback import _callbacks
+from hedwig.models import _validator
+
+# slow to import, and only imported when needed
+HEAVY_MODULES = {'boto3', 'botocore.config', 'google.cloud.pubsub_v1', 'jsonschema', 'opentelemetry', 'structlog'}
+
+
+def _import_times(statement: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Self and cumulative import time in microseconds of every module imported by statement, from `python -X importtime`
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement], capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def test_warmup(mock_boto3, settings):
+    settings.HEDWIG_PUBLISHER_BACKEND = 'hedwig.backends.aws.AWSSNSPublisherBackend'
+    settings.HEDWIG_CONSUMER_BACKEND = 'hedwig.backends.aws.AWSSQSConsumerBackend'
+
+    hedwig.warmup()
+
+    assert _validator.cache_info().currsize == 1
+    assert _callbacks.cache_info().currsize == 1
+    assert get_publisher_backend()._sns_client is mock_boto3.client.return_value
+    assert get_consumer_backend()._sqs_client is mock_boto3.client.return_value
+    assert [c[0][0] for c in mock_boto3.client.call_args_list] == ['sns', 'sqs']
+
+
+def test_warmup_lambda(mock_boto3, settings):
+    settings.HEDWIG_CONSUMER_BACKEND = 'hedwig.backends.aws.AWSSQSLambdaConsumerBackend'
+
+    hedwig.warmup()
+
+    assert _validator.cache_info().currsize == 1
+    # publisher isn't configured, and Lambda consumer doesn't need a client
+    mock_boto3.client.assert_not_called()
+
+
+def test_warmup_gcp(settings):
+    pytest.importorskip('google.cloud.pubsub_v1')
+    settings.HEDWIG_PUBLISHER_BACKEND = 'hedwig.backends.gcp.GooglePubSubPublisherBackend'
+    settings.GOOGLE_CLOUD_PROJECT = None
+
+    with mock.patch('hedwig.backends.gcp.pubsub_v1', autospec=True) as mock_pubsub_v1, mock.patch(
+        'hedwig.backends.gcp.google_auth_default', return_value=(None, 'DISCOVERED')
+    ):
+        hedwig.warmup()
+
+        assert get_publisher_backend()._publisher is mock_pubsub_v1.PublisherClient.return_value
+    assert hedwig.conf.settings.GOOGLE_CLOUD_PROJECT == 'DISCOVERED'
+
+
+def test_warmup_sync(settings):
+    settings.HEDWIG_SYNC = True
+    settings.HEDWIG_PUBLISHER_BACKEND = 'hedwig.backends.aws.AWSSNSPublisherBackend'
+
+    with mock.patch('hedwig.backends.aws.AWSSNSPublisherBackend.warmup') as mock_warmup:
+        hedwig.warmup()
+
+    mock_warmup.assert_not_called()
+    assert _validator.cache_info().currsize == 1
+
+
+@pytest.mark.parametrize(
+    'module,needed',
+    [
+        ('hedwig', set()),
+        ('hedwig.models', set()),
+        ('hedwig.publisher', set()),
+        ('hedwig.consumer', set()),
+        ('hedwig.backends.aws', set()),
+        ('hedwig.backends.gcp', {'google.cloud.pubsub_v1'}),
+        ('hedwig.validators.jsonschema', {'jsonschema'}),
+        ('hedwig.validators.protobuf', set()),
+    ],
+)
+def test_benchmark_import_time(module, needed):
+    pytest.importorskip(module)
+    times = _import_times(f'import {module}')
+
+    # heavy dependencies aren't imported until a backend or validator needs them
+    assert HEAVY_MODULES & times.keys() == needed
+
+
+def test_import_aws_defers_boto3():
+    pytest.importorskip('boto3')
+    statement = (
+        'import sys, hedwig.backends.aws as aws; '
+        'before = "boto3" in sys.modules; '
+        'aws.boto3.client; '
+        'print(before, "boto3" in sys.modules)'
+    )
+
+    result = subprocess.run([sys.executable, '-c', statement], capture_output=True, text=True, check=True)
+
+    # only imported once it's used
+    assert result.stdout.split() == ['False', 'True']
@@ -0,0 +1,13 @@
+import asyncio
+from typing import Any, Coroutine
+
+
+def run_async(coro: Coroutine) -> Any:
+    """
+    Runs a coroutine to completion on a new event loop
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()